@@ -1,440 +1,648 @@
+import hashlib
+import os
+import time
+import tracemalloc
+import uuid
+
 import streamlit as st
 import pandas as pd
+import numpy as np
+
+from cache import ResultCache
+from custom_roles import (
+    definitions_key,
+    load_role_definitions,
+    merged_role_attributes,
+    single_role_definitions,
+    validate_role_definitions,
+)
+from exports import export_bytes, export_formats
+from instrumentation import configure_stage_logging, stage, start_stage_log
+from jobs import cancel_session_job, session_job
+from lineup import assign_slots, formations
+from loading import player_positions, prepare_attributes, read_upload, upload_chunks
+from robustness import ATTRIBUTE_NOISE, SIMULATION_DRAWS, column_weights, robustness_results, simulate_top_n
+from roles import (
+    all_attributes,
+    area_order,
+    positions,
+    role_area_groups,
+    role_attributes,
+    role_definition_version,
+    role_positions,
+)
+from scoring import (
+    highlight_row_max,
+    long_results,
+    merge_role_columns,
+    ordered_role_columns,
+    players_in_score_range,
+    players_outside_top_n,
+    role_percentiles,
+    role_table,
+    role_weights,
+    score_role_columns,
+    sorted_page,
+)
+from similarity import build_similarity_index, similar_players, similarity_columns
+from snapshots import progression, score_snapshot
+from squad_coverage import DEFAULT_COVER_SCORE, area_coverage, build_coverage_index, role_coverage, visible_groups
+from store import (
+    find_players,
+    names_at,
+    open_store,
+    prune_stores,
+    scan_score_range,
+    score_store,
+    store_directory,
+    store_percentiles,
+    store_ranks,
+    store_score_range,
+    write_store,
+)
+
+# Total memory the shared upload/results cache may hold, in MB.
+CACHE_MAX_MB = int(os.environ.get("FM_ROLE_CACHE_MB", "512"))
+
+# Row choices for the paginated All Role Scores table.
+PAGE_SIZES = [25, 50, 100, 250]
+DEFAULT_PAGE_SIZE = int(os.environ.get("FM_ROLE_PAGE_SIZE", "50"))
+if DEFAULT_PAGE_SIZE not in PAGE_SIZES:
+    PAGE_SIZES = sorted(PAGE_SIZES + [DEFAULT_PAGE_SIZE])
+
+# Streamlit refuses to render a Styler over more cells than this (pandas'
+# styler.render.max_elements), so larger tables are only shown a page at a time.
+STYLER_MAX_CELLS = 262_144
+
+# How often the page refreshes while a background parse/scoring job runs.
+JOB_POLL_SECONDS = 0.5
+
+# Uploads at least this large (in MB) default to out-of-core mode.
+OUT_OF_CORE_MB = int(os.environ.get("FM_ROLE_OUT_OF_CORE_MB", "100"))
 
-# Clear all Streamlit caches
-st.cache_data.clear()
-st.cache_resource.clear()
+# Per-stage timings are written to stderr as JSON lines unless this is "0".
+if os.environ.get("FM_ROLE_STAGE_LOG", "1") != "0":
+    configure_stage_logging()
+
+# Per-stage peak memory needs tracemalloc, which slows down every session in
+# the process, so it is only on when the deployment sets this to "1".
+if os.environ.get("FM_ROLE_TRACE_MEMORY", "0") == "1" and not tracemalloc.is_tracing():
+    tracemalloc.start()
 
 st.set_page_config(layout="wide")
 st.title("Smart Player Role Tool")
 
+if "session_id" not in st.session_state:
+    st.session_state["session_id"] = uuid.uuid4().hex[:8]
+stage_records = start_stage_log(st.session_state["session_id"])
+# Stages of reruns cut short to poll a background job are carried over, so
+# the panel shows everything since the last interaction.
+stage_records.extend(st.session_state.pop("polled_records", []))
+
+show_stage_panel = st.sidebar.checkbox("Show performance panel", value=False)
+
+# Custom roles and weight overrides, in the role_attributes layout. They are
+# scored one role at a time on top of the built-in scores.
+custom_roles = st.session_state.setdefault("custom_roles", {})
+custom_panel = st.sidebar.expander("Custom roles and weights", expanded=False)
+
+roles_file = custom_panel.file_uploader("Load definitions (JSON or YAML)", type=["json", "yaml", "yml"])
+if roles_file is not None and custom_panel.button("Apply definitions file"):
+    try:
+        # Validated again together with the roles already defined, whose
+        # names the file's roles must not reuse in the other phase.
+        loaded = load_role_definitions(roles_file.getvalue(), roles_file.name)
+        custom_roles.update(validate_role_definitions({
+            phase: {**custom_roles.get(phase, {}), **loaded.get(phase, {})}
+            for phase in set(custom_roles) | set(loaded)
+        }))
+    except ValueError as e:
+        custom_panel.error(str(e))
+
+edit_phase = custom_panel.selectbox("Phase:", list(role_attributes), key="custom_phase")
+phase_roles = sorted(set(role_attributes[edit_phase]) | set(custom_roles.get(edit_phase, {})))
+edit_role = custom_panel.selectbox("Role:", ["New role..."] + phase_roles, key="custom_role")
+if edit_role == "New role...":
+    edit_role = custom_panel.text_input("New role name:", key="custom_role_name").strip()
+
+current_def = custom_roles.get(edit_phase, {}).get(edit_role) or role_attributes[edit_phase].get(edit_role, {})
+edit_key = f"{edit_phase}_{edit_role}"
+role_key_attrs = custom_panel.multiselect(
+    "Key attributes:", all_attributes, default=current_def.get("key", []), key=f"custom_key_{edit_key}"
+)
+role_preferred_attrs = custom_panel.multiselect(
+    "Preferred attributes:", all_attributes, default=current_def.get("preferred", []), key=f"custom_preferred_{edit_key}"
+)
+role_area = custom_panel.selectbox(
+    "Area:",
+    area_order,
+    index=area_order.index(current_def.get("area", role_area_groups.get(edit_role, "Midfield"))),
+    key=f"custom_area_{edit_key}"
+)
+role_key_weight = custom_panel.slider(
+    "Key attribute weight:", 0.0, 1.0, float(current_def.get("key_weight", 0.8)), 0.05, key=f"custom_weight_{edit_key}"
+)
+role_allowed_positions = custom_panel.multiselect(
+    "Positions (none = any):",
+    positions,
+    default=current_def.get("positions", role_positions.get(edit_role, [])),
+    key=f"custom_positions_{edit_key}"
+)
+
+save_col, reset_col = custom_panel.columns(2)
+if save_col.button("Save role", disabled=not edit_role):
+    try:
+        custom_roles.update(validate_role_definitions({
+            **custom_roles,
+            edit_phase: {
+                **custom_roles.get(edit_phase, {}),
+                edit_role: {
+                    "key": role_key_attrs,
+                    "preferred": role_preferred_attrs,
+                    "area": role_area,
+                    "key_weight": round(role_key_weight, 2),
+                    "positions": role_allowed_positions,
+                },
+            },
+        }))
+    except ValueError as e:
+        custom_panel.error(str(e))
+if reset_col.button("Clear custom roles"):
+    custom_roles.clear()
+
+if custom_roles:
+    custom_panel.caption(
+        "Custom roles: " + ", ".join(role for roles in custom_roles.values() for role in roles)
+    )
+    custom_panel.download_button(
+        "Download definitions (JSON)",
+        definitions_key(custom_roles),
+        file_name="custom_roles.json",
+        mime="application/json"
+    )
+
 uploaded_file = st.file_uploader(
     "Upload your Football Manager data file",
-    type=["xlsx", "xls", "csv"]
+    type=["xlsx", "xls", "csv", "html", "htm"]
 )
 
-column_map = {
-    "Player": "Name",
-    "Decisions": "Dec",
-    "Long Throws": "L Th",
-    "Passing": "Pas",
-    "Technique": "Tec",
-    "Tackling": "Tck",
-    "Penalty Taking": "Pen",
-    "Marking": "Mar",
-    "Long Shots": "Lon",
-    "Heading": "Hea",
-    "Crossing": "Cro",
-    "First Touch": "Fir",
-    "Free Kick Taking": "Fre",
-    "Finishing": "Fin",
-    "Dribbling": "Dri",
-    "Corners": "Cor",
-    "Acceleration": "Acc",
-    "Work Rate": "Wor",
-    "Vision": "Vis",
-    "Team Work": "Tea",
-    "Teamwork": "Tea",
-    "Positioning": "Pos",
-    "Off The Ball": "OtB",
-    "Off the Ball": "OtB",
-    "Leadership": "Ldr",
-    "Flair": "Fla",
-    "Determination": "Det",
-    "Concentration": "Cnt",
-    "Composure": "Cmp",
-    "Bravery": "Bra",
-    "Anticipation": "Ant",
-    "Aggression": "Agg",
-    "Agility": "Agi",
-    "Balance": "Bal",
-    "Jumping Reach": "Jum",
-    "Jumping": "Jum",
-    "Natural Fitness": "Nat",
-    "Pace": "Pac",
-    "Stamina": "Sta",
-    "Strength": "Str"
-}
-
-# Role attributes are split into In Possession and Out of Possession.
-# Scoring uses 80% Key attributes and 20% Preferred attributes.
-# Roles with no Preferred attributes are scored from Key attributes only.
-role_attributes = {
-    "In Possession": {
-        # Centre-Backs
-        "Centre-Back": {
-            "key": ["Hea", "Mar", "Tck", "Ant", "Pos", "Jum", "Str"],
-            "preferred": ["Agg", "Bra", "Cmp", "Cnt", "Dec", "Pac"]
-        },
-        "Ball-Playing Centre-Back": {
-            "key": ["Hea", "Mar", "Pas", "Tck", "Ant", "Cmp", "Pos", "Jum", "Str"],
-            "preferred": ["Fir", "Tec", "Agg", "Bra", "Cnt", "Dec", "Vis", "Pac"]
-        },
-        "No-Nonsense Centre-Back": {
-            "key": ["Hea", "Mar", "Tck", "Ant", "Pos", "Jum", "Str"],
-            "preferred": ["Agg", "Bra", "Cnt", "Pac"]
-        },
-        "Wide Centre-Back": {
-            "key": ["Hea", "Mar", "Tck", "Ant", "Pos", "Jum", "Str"],
-            "preferred": ["Dri", "Agg", "Bra", "Cmp", "Cnt", "Dec", "Wor", "Acc", "Agi", "Pac", "Sta"]
-        },
-        "Advanced Centre-Back": {
-            "key": ["Hea", "Mar", "Pas", "Tck", "Tec", "Ant", "Cmp", "Dec", "Pos", "Tea", "Jum", "Str"],
-            "preferred": ["Dri", "Fir", "Agg", "Bra", "Cnt", "Vis", "Pac", "Sta"]
-        },
-        "Overlapping Centre-Back": {
-            "key": ["Cro", "Hea", "Mar", "Tck", "Ant", "Wor", "Jum", "Pac", "Sta", "Str"],
-            "preferred": ["Dri", "Tec", "Agg", "Bra", "Cmp", "Cnt", "Dec", "OtB", "Pos", "Acc", "Agi"]
-        },
-
-        # Full-Backs and Wing-Backs
-        "Full-Back": {
-            "key": ["Mar", "Tck", "Ant", "Cnt", "Pos", "Tea", "Acc"],
-            "preferred": ["Cro", "Dri", "Pas", "Tec", "Dec", "Wor", "Agi", "Pac", "Sta"]
-        },
-        "Inside Full-Back": {
-            "key": ["Hea", "Mar", "Tck", "Ant", "Pos", "Str"],
-            "preferred": ["Dri", "Agg", "Bra", "Cmp", "Cnt", "Dec", "Wor", "Acc", "Agi", "Jum", "Pac", "Sta"]
-        },
-        "Inside Wing-Back": {
-            "key": ["Pas", "Tck", "Ant", "Cmp", "Dec", "Pos", "Tea", "Acc"],
-            "preferred": ["Fir", "Mar", "Tec", "Cnt", "Wor", "Agi", "Pac", "Sta"]
-        },
-        "Playmaking Wing-Back": {
-            "key": ["Fir", "Pas", "Tck", "Tec", "Cmp", "Dec", "Pos", "Tea", "Vis", "Acc"],
-            "preferred": ["Cro", "Dri", "Mar", "Ant", "Cnt", "OtB", "Pos", "Wor", "Agi", "Pac", "Sta"]
-        },
-        "Wing-Back": {
-            "key": ["Cro", "Mar", "Tck", "Tea", "Wor", "Acc", "Pac", "Sta"],
-            "preferred": ["Dri", "Fir", "Pas", "Tec", "Ant", "Cnt", "Dec", "OtB", "Pos", "Agi", "Bal"]
-        },
-        "Advanced Wing-Back": {
-            "key": ["Cro", "Dri", "Tec", "OtB", "Tea", "Wor", "Acc", "Agi", "Pac", "Sta"],
-            "preferred": ["Fir", "Mar", "Pas", "Tck", "Ant", "Dec", "Fla", "Pos", "Bal"]
-        },
-
-        # Defensive Midfield
-        "Defensive Midfielder": {
-            "key": ["Tck", "Ant", "Cnt", "Pos", "Tea"],
-            "preferred": ["Fir", "Mar", "Pas", "Agg", "Cmp", "Dec", "Wor", "Sta", "Str"]
-        },
-        "Box-to-Box Midfielder": {
-            "key": ["Pas", "Tck", "OtB", "Tea", "Wor", "Sta"],
-            "preferred": ["Dri", "Fin", "Fir", "Lon", "Tec", "Agg", "Ant", "Cmp", "Dec", "Pos", "Acc", "Bal", "Pac", "Str"]
-        },
-        "Box-to-Box Playmaker": {
-            "key": ["Fir", "Pas", "Tec", "Cmp", "Dec", "OtB", "Tea", "Vis", "Wor", "Sta"],
-            "preferred": ["Dri", "Mar", "Tck", "Ant", "Pos", "Acc", "Agi", "Bal", "Pac"]
-        },
-        "Deep-Lying Playmaker": {
-            "key": ["Fir", "Pas", "Tec", "Cmp", "Dec", "OtB", "Tea", "Vis"],
-            "preferred": ["Mar", "Tck", "Ant", "Cnt", "Pos", "Wor", "Bal", "Sta"]
-        },
-        "Half-Back": {
-            "key": ["Hea", "Mar", "Tck", "Ant", "Cnt", "Pos", "Tea", "Jum", "Str"],
-            "preferred": ["Fir", "Pas", "Agg", "Bra", "Cmp", "Dec", "Wor", "Sta"]
-        },
-
-        # Central Midfield
-        "Central Midfielder": {
-            "key": ["Fir", "Pas", "Tck", "Dec", "Tea"],
-            "preferred": ["Tec", "Ant", "Cmp", "Cnt", "OtB", "Pos", "Vis", "Wor", "Sta"]
-        },
-        "Advanced Playmaker": {
-            "key": ["Fir", "Pas", "Tec", "Cmp", "Dec", "OtB", "Tea", "Vis"],
-            "preferred": ["Cro", "Dri", "Ant", "Fla", "Acc", "Agi"]
-        },
-        "Midfield Playmaker": {
-            "key": ["Fir", "Pas", "Tec", "Cmp", "Dec", "OtB", "Tea", "Vis"],
-            "preferred": ["Dri", "Tck", "Ant", "Fla", "Pos", "Wor", "Agi", "Sta"]
-        },
-        "Wide Central Midfielder": {
-            "key": ["Fir", "Pas", "Tck", "Dec", "Tea"],
-            "preferred": ["Cro", "Dri", "Tec", "Ant", "Cmp", "Cnt", "OtB", "Pos", "Vis", "Wor", "Agi", "Sta"]
-        },
-
-        # Wide Midfield and Wingers
-        "Wide Midfielder": {
-            "key": ["Cro", "Pas", "Tec", "Tea", "Wor", "Pac", "Sta"],
-            "preferred": ["Dri", "Fir", "Ant", "Cmp", "OtB", "Vis", "Acc", "Agi"]
-        },
-        "Inside Winger": {
-            "key": ["Dri", "Fir", "Tec", "Cmp", "Tea", "Acc", "Agi"],
-            "preferred": ["Cro", "Lon", "Pas", "Ant", "Fla", "OtB", "Vis", "Wor", "Bal", "Pac", "Sta"]
-        },
-        "Playmaking Winger": {
-            "key": ["Cro", "Dri", "Fir", "Pas", "Tec", "Cmp", "Dec", "OtB", "Tea", "Vis", "Acc"],
-            "preferred": ["Ant", "Fla", "Wor", "Agi", "Pac", "Sta"]
-        },
-        "Winger": {
-            "key": ["Cro", "Dri", "Tec", "Tea", "Acc", "Agi", "Pac"],
-            "preferred": ["Fir", "Pas", "Ant", "Fla", "OtB", "Wor", "Bal", "Sta"]
-        },
-
-        # Attacking Midfield
-        "Attacking Midfielder": {
-            "key": ["Fir", "Lon", "Pas", "Tec", "Cmp", "Fla", "OtB"],
-            "preferred": ["Cro", "Dri", "Fin", "Ant", "Dec", "Vis", "Acc", "Agi"]
-        },
-        "Channel Midfielder": {
-            "key": ["Cro", "Fir", "Pas", "Tec", "Cmp", "OtB", "Wor", "Acc"],
-            "preferred": ["Dri", "Lon", "Ant", "Dec", "Fla", "Vis", "Agi", "Pac", "Sta"]
-        },
-        "Free Role": {
-            "key": ["Dri", "Fir", "Lon", "Pas", "Tec", "Cmp", "Fla", "OtB", "Vis"],
-            "preferred": ["Cro", "Fin", "Ant", "Dec", "Acc", "Agi"]
-        },
-        "Second Striker": {
-            "key": ["Fin", "Fir", "Ant", "Cmp", "OtB", "Acc"],
-            "preferred": ["Dri", "Lon", "Pas", "Tec", "Cnt", "Dec", "Wor", "Agi", "Pac", "Sta"]
-        },
-
-        # Wide Forwards
-        "Wide Forward": {
-            "key": ["Dri", "Fir", "Tec", "Ant", "OtB", "Acc", "Agi", "Pac"],
-            "preferred": ["Cro", "Fin", "Pas", "Cmp", "Fla", "Wor", "Bal", "Sta"]
-        },
-        "Inside Forward": {
-            "key": ["Dri", "Fir", "Tec", "Ant", "Cmp", "OtB", "Acc", "Agi"],
-            "preferred": ["Cro", "Fin", "Lon", "Pas", "Fla", "Vis", "Wor", "Bal", "Pac", "Sta"]
-        },
-
-        # Centre Forwards
-        "Centre Forward": {
-            "key": ["Fin", "Fir", "Hea", "Tec", "Cmp", "OtB", "Acc", "Str"],
-            "preferred": ["Dri", "Pas", "Ant", "Dec", "Agi", "Bal", "Jum", "Pac"]
-        },
-        "Channel Forward": {
-            "key": ["Dri", "Fin", "Fir", "Tec", "Cmp", "OtB", "Wor", "Acc"],
-            "preferred": ["Cro", "Hea", "Pas", "Ant", "Dec", "Agi", "Bal", "Pac", "Sta"]
-        },
-        "Deep-Lying Forward": {
-            "key": ["Fin", "Fir", "Tec", "Cmp", "OtB", "Str"],
-            "preferred": ["Dri", "Pas", "Ant", "Dec", "Tea", "Vis", "Bal"]
-        },
-        "False Nine": {
-            "key": ["Dri", "Fir", "Pas", "Tec", "Cmp", "Dec", "OtB", "Tea", "Vis", "Acc"],
-            "preferred": ["Fin", "Ant", "Fla", "Agi", "Bal"]
-        },
-        "Poacher": {
-            "key": ["Fin", "Hea", "Ant", "Cmp", "Cnt", "OtB", "Acc"],
-            "preferred": ["Fir", "Tec", "Dec", "Bal"]
-        },
-        "Target Forward": {
-            "key": ["Fin", "Hea", "Agg", "Bra", "Cmp", "OtB", "Bal", "Jum", "Str"],
-            "preferred": ["Fir", "Ant", "Dec", "Tea"]
-        },
-    },
-    "Out of Possession": {
-        "Covering Centre-Back": {"key": ["Ant", "Pac", "Mar"], "preferred": []},
-        "Stopping Centre-Back": {"key": ["Agg", "Tck", "Str"], "preferred": []},
-        "Covering Wide Centre-Back": {"key": ["Ant", "Pac", "Mar"], "preferred": []},
-        "Stopping Wide Centre-Back": {"key": ["Agg", "Tck", "Str"], "preferred": []},
-        "Holding Full-Back": {"key": ["Pos", "Cnt", "Mar"], "preferred": []},
-        "Pressing Full-Back": {"key": ["Agg", "Wor", "Ant"], "preferred": []},
-        "Holding Wing-Back": {"key": ["Pos", "Cnt", "Mar"], "preferred": []},
-        "Pressing Wing-Back": {"key": ["Agg", "Wor", "Ant"], "preferred": []},
-        "Dropping Defensive Midfielder": {"key": ["Pos", "Dec", "Ant"], "preferred": []},
-        "Pressing Defensive Midfielder": {"key": ["Agg", "Wor", "Ant"], "preferred": []},
-        "Screening Defensive Midfielder": {"key": ["Pos", "Cnt", "Mar"], "preferred": []},
-        "Wide Covering Defensive Midfielder": {"key": ["Ant", "Pac", "Wor"], "preferred": []},
-        "Pressing Central Midfielder": {"key": ["Agg", "Wor", "Ant"], "preferred": []},
-        "Screening Central Midfielder": {"key": ["Pos", "Cnt", "Mar"], "preferred": []},
-        "Wide Covering Central Midfielder": {"key": ["Ant", "Pac", "Wor"], "preferred": []},
-        "Tracking Wide Midfielder": {"key": ["Mar", "Wor", "Sta"], "preferred": []},
-        "Wide Outlet Wide Midfielder": {"key": ["OtB", "Pac", "Ant"], "preferred": []},
-        "Central Outlet Attacking Midfielder": {"key": ["OtB", "Dec", "Ant"], "preferred": []},
-        "Splitting Outlet Attacking Midfielder": {"key": ["OtB", "Pac", "Ant"], "preferred": []},
-        "Tracking Attacking Midfielder": {"key": ["Mar", "Wor", "Sta"], "preferred": []},
-        "Inside Outlet Winger": {"key": ["OtB", "Dec", "Ant"], "preferred": []},
-        "Tracking Winger": {"key": ["Mar", "Wor", "Sta"], "preferred": []},
-        "Wide Outlet Winger": {"key": ["OtB", "Pac", "Ant"], "preferred": []},
-        "Central Outlet Centre Forward": {"key": ["OtB", "Dec", "Ant"], "preferred": []},
-        "Splitting Outlet Centre Forward": {"key": ["OtB", "Pac", "Ant"], "preferred": []},
-        "Tracking Centre Forward": {"key": ["Mar", "Wor", "Sta"], "preferred": []},
-    }
-}
-
-role_groups = {
-    role: phase
-    for phase, roles in role_attributes.items()
-    for role in roles.keys()
-}
-
-
-role_area_groups = {
-    # Defensive roles
-    "Centre-Back": "Defensive",
-    "Ball-Playing Centre-Back": "Defensive",
-    "No-Nonsense Centre-Back": "Defensive",
-    "Wide Centre-Back": "Defensive",
-    "Advanced Centre-Back": "Defensive",
-    "Overlapping Centre-Back": "Defensive",
-    "Full-Back": "Defensive",
-    "Inside Full-Back": "Defensive",
-    "Inside Wing-Back": "Defensive",
-    "Playmaking Wing-Back": "Defensive",
-    "Wing-Back": "Defensive",
-    "Advanced Wing-Back": "Defensive",
-    "Covering Centre-Back": "Defensive",
-    "Stopping Centre-Back": "Defensive",
-    "Covering Wide Centre-Back": "Defensive",
-    "Stopping Wide Centre-Back": "Defensive",
-    "Holding Full-Back": "Defensive",
-    "Pressing Full-Back": "Defensive",
-    "Holding Wing-Back": "Defensive",
-    "Pressing Wing-Back": "Defensive",
-
-    # Midfield roles
-    "Defensive Midfielder": "Midfield",
-    "Box-to-Box Midfielder": "Midfield",
-    "Box-to-Box Playmaker": "Midfield",
-    "Deep-Lying Playmaker": "Midfield",
-    "Half-Back": "Midfield",
-    "Central Midfielder": "Midfield",
-    "Advanced Playmaker": "Midfield",
-    "Midfield Playmaker": "Midfield",
-    "Wide Central Midfielder": "Midfield",
-    "Wide Midfielder": "Midfield",
-    "Inside Winger": "Midfield",
-    "Playmaking Winger": "Midfield",
-    "Winger": "Midfield",
-    "Dropping Defensive Midfielder": "Midfield",
-    "Pressing Defensive Midfielder": "Midfield",
-    "Screening Defensive Midfielder": "Midfield",
-    "Wide Covering Defensive Midfielder": "Midfield",
-    "Pressing Central Midfielder": "Midfield",
-    "Screening Central Midfielder": "Midfield",
-    "Wide Covering Central Midfielder": "Midfield",
-    "Tracking Wide Midfielder": "Midfield",
-    "Wide Outlet Wide Midfielder": "Midfield",
-
-    # Attacking roles
-    "Attacking Midfielder": "Attacking",
-    "Channel Midfielder": "Attacking",
-    "Free Role": "Attacking",
-    "Second Striker": "Attacking",
-    "Wide Forward": "Attacking",
-    "Inside Forward": "Attacking",
-    "Centre Forward": "Attacking",
-    "Channel Forward": "Attacking",
-    "Deep-Lying Forward": "Attacking",
-    "False Nine": "Attacking",
-    "Poacher": "Attacking",
-    "Target Forward": "Attacking",
-    "Central Outlet Attacking Midfielder": "Attacking",
-    "Splitting Outlet Attacking Midfielder": "Attacking",
-    "Tracking Attacking Midfielder": "Attacking",
-    "Inside Outlet Winger": "Attacking",
-    "Tracking Winger": "Attacking",
-    "Wide Outlet Winger": "Attacking",
-    "Central Outlet Centre Forward": "Attacking",
-    "Splitting Outlet Centre Forward": "Attacking",
-    "Tracking Centre Forward": "Attacking",
-}
-
-area_order = ["Defensive", "Midfield", "Attacking"]
-
-all_role_names = [
-    role
-    for phase in ["In Possession", "Out of Possession"]
-    for role in role_attributes[phase].keys()
-]
-
-all_attributes = sorted({
-    attr
-    for phase_roles in role_attributes.values()
-    for attrs in phase_roles.values()
-    for attr_list in [attrs["key"], attrs["preferred"]]
-    for attr in attr_list
-})
-
-
-def avg_attrs(df, attrs):
-    existing = [attr for attr in attrs if attr in df.columns]
-    if not existing:
-        return pd.Series(0, index=df.index)
-    return df[existing].mean(axis=1)
-
-
-def calculate_role_scores(df):
-    results = []
-
-    for phase, roles in role_attributes.items():
-        for role, attrs in roles.items():
-            key_score = avg_attrs(df, attrs["key"])
-
-            if attrs["preferred"]:
-                preferred_score = avg_attrs(df, attrs["preferred"])
-                score_series = (key_score * 0.8) + (preferred_score * 0.2)
-            else:
-                score_series = key_score
 
-            for player, score in zip(df["Name"], score_series.round(2)):
-                results.append({
-                    "Player": player,
-                    "Phase": phase,
-                    "Area": role_area_groups.get(role, "Midfield"),
-                    "Role": role,
-                    "Score": score
-                })
+@st.cache_resource
+def get_result_cache():
+    return ResultCache(CACHE_MAX_MB * 1024 * 1024)
+
+
+def render_stage_panel(records):
+    if not show_stage_panel:
+        return
+    st.sidebar.subheader("Performance")
+    if not tracemalloc.is_tracing():
+        st.sidebar.caption("Set FM_ROLE_TRACE_MEMORY=1 on the server to measure peak memory per stage.")
+    job_records = [record for records in st.session_state.get("job_records", {}).values() for record in records]
+    if job_records:
+        st.sidebar.caption("Background jobs for this upload (parsing, scoring, simulation):")
+        job_df = pd.DataFrame(job_records).drop(columns=["session"], errors="ignore")
+        st.sidebar.dataframe(job_df, use_container_width=True, hide_index=True)
+    if not records:
+        st.sidebar.caption("No stages ran on this rerun (everything came from the cache).")
+        return
+    panel_df = pd.DataFrame(records).drop(columns=["session"], errors="ignore")
+    st.sidebar.caption("Since the last interaction:")
+    st.sidebar.dataframe(panel_df, use_container_width=True, hide_index=True)
+    st.sidebar.caption(f"Total: {panel_df['seconds'].sum():.3f} s over {len(panel_df)} stages")
+
+
+def download_buttons(name, cache_key, build_frame):
+    # One button per format. The file is only built when a button is
+    # clicked, and the bytes are cached under cache_key + (format,).
+    for column, (export_format, (extension, mime)) in zip(st.columns(len(export_formats)), export_formats.items()):
+        column.download_button(
+            f"Download {export_format}",
+            data=lambda export_format=export_format: result_cache.get_or_compute(
+                cache_key + (export_format,),
+                lambda: export_bytes(build_frame(), export_format)
+            ),
+            file_name=f"{name}{extension}",
+            mime=mime,
+            on_click="ignore",
+            key=f"download_{name}_{export_format}"
+        )
 
-    return pd.DataFrame(results)
 
+def render_page(df, number_format, key, hide_index=False):
+    # One page of df, styled on its own, so the Styler stays under
+    # STYLER_MAX_CELLS however many rows df has.
+    size_col, page_col = st.columns(2)
+    page_size = size_col.selectbox(
+        "Rows per page:", PAGE_SIZES, index=PAGE_SIZES.index(DEFAULT_PAGE_SIZE), key=f"{key}_page_size"
+    )
+    page_count = max(1, -(-len(df) // page_size))
+    page_number = page_col.number_input(
+        f"Page (of {page_count}):",
+        min_value=1,
+        max_value=page_count,
+        value=1,
+        key=f"{key}_page_{page_size}_{len(df)}"
+    )
+    first_row = (page_number - 1) * page_size
+    page_df = df.iloc[first_row:first_row + page_size]
+    st.dataframe(page_df.style.format(number_format), use_container_width=True, hide_index=hide_index)
+    st.caption(f"Showing players {min(first_row + 1, len(df))}-{first_row + len(page_df)} of {len(df)}")
 
-def highlight_max(s):
-    is_max = s == s.max()
-    return ["background-color: #006400; color: white" if v else "" for v in is_max]
 
+def session_holder(slot):
+    return st.session_state["session_id"], slot
 
-if uploaded_file:
+
+def cached_result(slot, key):
+    # The session holds the latest result of each slot (parsed upload,
+    # scores, indexes) in the shared cache, so a rerun finds it again: held
+    # results only make room for another session's, and only within
+    # FM_ROLE_CACHE_MB. The session itself keeps no results.
+    return result_cache.get(key, session_holder(slot))
+
+
+def session_result(slot, key, compute):
+    return result_cache.get_or_compute(key, compute, session_holder(slot))
+
+
+def job_result(slot, key, run, render_partial=None):
+    # session_result computed by run(job) as the session's background job.
+    # Raises the job's error.
+    value = cached_result(slot, key)
+    if value is None:
+        holder = session_holder(slot)
+        job = session_job(
+            st.session_state, key, lambda job: result_cache.get_or_compute(key, lambda: run(job), holder)
+        )
+        # The job's stages run outside any one rerun, so the performance
+        # panel lists them separately for the current upload.
+        st.session_state["job_records"][key] = job.records
+        wait_for_job(job, render_partial)
+        if job.error is not None:
+            raise job.error
+        value = job.result
+        # The cache holds the result now; dropping the finished job keeps
+        # it (and its partial results) from holding a second reference.
+        st.session_state.pop("job", None)
+    return value
+
+
+def wait_for_job(job, render_partial=None):
+    # While the session's background job runs, show its progress (and any
+    # partial results), then rerun shortly. Widgets stay usable meanwhile
+    # and reruns do not restart the job.
+    if job.done():
+        return
+    st.progress(job.fraction, text=f"{job.message} ({job.elapsed():.0f}s)")
+    if render_partial is not None and job.partial is not None:
+        render_partial(job.partial)
+    render_stage_panel(stage_records)
+    st.session_state["polled_records"] = list(stage_records)
+    time.sleep(JOB_POLL_SECONDS)
+    st.rerun()
+
+
+def parsing_job(upload_bytes, filename):
+    # CSV is read_upload one chunk at a time, so a new upload can stop the
+    # parse between chunks. Other formats are parsed whole.
+    def run(job):
+        job.report(0.0, f"Reading {filename}")
+        if not filename.lower().endswith(".csv"):
+            return read_upload(upload_bytes, filename)
+
+        chunks = []
+        with stage("read_upload", rows=0) as record:
+            for chunk in upload_chunks(upload_bytes, filename):
+                chunks.append(chunk)
+                record["rows"] += len(chunk)
+                job.report(0.0, f"Read {record['rows']:,} players from {filename}")
+            return pd.concat(chunks, ignore_index=True)
+    return run
+
+
+def scoring_job(attributes_df, previous, positions):
+    def run(job):
+        def progress(done, total, scored_rows, scores):
+            message = "Ranking players" if done == total else f"Scored {done:,} of {total:,} players"
+            job.report(0.9 * done / max(total, 1), message, partial=(scored_rows, scores))
+
+        job.report(0.0, "Scoring players")
+        return score_snapshot(attributes_df, previous, positions, progress=progress)
+    return run
+
+
+def robustness_job(attributes_df, role_scores, custom_roles, top_n, draws, noise):
+    def run(job):
+        def progress(done, total):
+            job.report(done / max(total, 1), f"Simulated {done} of {total} roles")
+
+        job.report(0.0, f"Simulating {draws:,} draws")
+        linear = column_weights(role_scores, custom_roles)
+        return simulate_top_n(attributes_df, role_scores, linear, top_n, draws, noise, progress=progress)
+    return run
+
+
+def render_partial_scores(partial):
+    # Best player per role among the players scored so far.
+    scored_rows, scores = partial
+    scored = scores[scored_rows]
+    best = np.where(np.isnan(scored), -np.inf, scored).argmax(axis=0)
+    role_columns = np.arange(len(role_weights["roles"]))
+    preview = pd.DataFrame({
+        "Phase": role_weights["phases"],
+        "Role": role_weights["roles"],
+        "Best So Far": attributes_df["Name"].to_numpy()[scored_rows[best]],
+        "Score": scored[best, role_columns],
+    }).dropna(subset=["Score"])
+    st.caption(f"Early results from the first {len(scored_rows):,} players:")
+    st.dataframe(preview.style.format({"Score": "{:.2f}"}), use_container_width=True, hide_index=True)
+
+
+def store_job(upload_bytes, filename, directory):
+    def run(job):
+        def converted(rows):
+            job.report(0.0, f"Converted {rows:,} players to the on-disk store")
+
+        job.report(0.0, f"Reading {filename}")
+        store = open_store(directory) or write_store(upload_chunks(upload_bytes, filename), directory, progress=converted)
+        prune_stores(keep=directory)
+        return store
+    return run
+
+
+def store_scoring_job(store, by_position):
+    def run(job):
+        def progress(done, total):
+            job.report(done / max(total, 1), f"Scored {done:,} of {total:,} players")
+
+        job.report(0.0, "Scoring players")
+        summary = score_store(store, by_position, progress=progress)
+        prune_stores(keep=store["directory"])
+        return summary
+    return run
+
+
+def render_out_of_core(upload_bytes, filename, upload_key):
+    # Large databases are converted once into a memory-mapped store on disk
+    # and scored in blocks, so memory stays bounded. Only the views that can
+    # work from the per-role top-K, the score counts and block scans are
+    # shown; custom roles and the other views need in-memory mode.
+    store_key = upload_key + ("store",)
+    directory = store_directory(upload_key[0])
+    if not os.path.exists(os.path.join(directory, "meta.json")):
+        # Another session pruned the store since it was opened; convert the
+        # upload again rather than scoring into a deleted directory.
+        result_cache.discard(store_key)
     try:
-        if uploaded_file.name.lower().endswith(".csv"):
-            attributes_df = pd.read_csv(uploaded_file)
+        store = job_result("store", store_key, store_job(upload_bytes, filename, directory))
+    except Exception as e:
+        st.error(f"Failed to read file: {e}")
+        st.stop()
+
+    if store["missing"]:
+        st.warning(
+            "Some attributes used in the role scores were not found in your upload. "
+            "They will be treated as 0: " + ", ".join(store["missing"])
+        )
+    if store["rows"] == 0:
+        st.warning("No outfield players found after filtering out goalkeepers.")
+        st.stop()
+    if custom_roles:
+        st.info("Custom roles and weights are not applied in out-of-core mode.")
+
+    by_position = store["positions"] is not None and st.checkbox(
+        "Only score players in roles their positions allow", value=True
+    )
+    summary_key = store_key + ("all positions" if not by_position else "by position",)
+    try:
+        summary = job_result("summary", summary_key, store_scoring_job(store, by_position))
+    except Exception as e:
+        st.error(f"Failed to score players: {e}")
+        st.stop()
+    st.success(f"Role scores calculated for {store['rows']:,} players (out-of-core mode).")
+
+    phase_filter = st.radio(
+        "Choose role phase to view:",
+        ["All", "In Possession", "Out of Possession"],
+        horizontal=True
+    )
+    area_filter = st.radio(
+        "Choose role area to view:",
+        ["All", "Defensive", "Midfield", "Attacking"],
+        horizontal=True
+    )
+
+    visible_mask = np.ones(len(summary["roles"]), dtype=bool)
+    if phase_filter != "All":
+        visible_mask &= summary["phases"] == phase_filter
+    if area_filter != "All":
+        visible_mask &= summary["areas"] == area_filter
+    visible_columns = np.flatnonzero(visible_mask)
+    if len(visible_columns) == 0:
+        st.warning("No roles match the selected filters.")
+        st.stop()
+    table_columns = ordered_role_columns(summary, visible_columns)
+    table_roles = summary["roles"][table_columns]
+
+    with st.expander("View Top Player Per Role", expanded=False):
+        top_n = st.selectbox("Players per role:", [1, 5, 10, 25], index=0)
+        top_rows = summary["top_rows"][:top_n, visible_columns]
+        top_scores = summary["top_scores"][:top_n, visible_columns]
+        top_columns = np.broadcast_to(visible_columns, top_rows.shape)
+        top_players = pd.DataFrame({
+            "Player": names_at(store, top_rows.T.ravel()),
+            "Phase": summary["phases"][top_columns.T.ravel()],
+            "Area": summary["areas"][top_columns.T.ravel()],
+            "Role": summary["roles"][top_columns.T.ravel()],
+            "Score": top_scores.T.ravel(),
+            "Rank": store_ranks(summary, top_scores, visible_columns).T.ravel(),
+        }).dropna(subset=["Score"])
+        st.dataframe(
+            top_players.sort_values(by=["Phase", "Area", "Role"], kind="stable"),
+            use_container_width=True
+        )
+
+    with st.expander("View Ranked Role Scores Per Player", expanded=True):
+        search = st.text_input("Search for a player by name:")
+        found_rows = find_players(store, search) if search else np.empty(0, dtype=np.int64)
+        if search and len(found_rows) == 0:
+            st.info(f"No player name contains '{search}'.")
+        elif len(found_rows):
+            found_names = names_at(store, found_rows)
+            choice = st.selectbox(
+                "Select a player to view their roles:",
+                range(len(found_rows)),
+                format_func=lambda i: f"{found_names[i]} (row {found_rows[i] + 1})"
+            )
+            player_scores = summary["scores"][found_rows[choice]][None, :]
+            best_role = summary["roles"][np.where(np.isnan(player_scores), -np.inf, player_scores).argmax()]
+            st.caption(f"Best role overall: {best_role}")
+            player_roles = pd.DataFrame({
+                "Phase": summary["phases"][visible_columns],
+                "Area": summary["areas"][visible_columns],
+                "Role": summary["roles"][visible_columns],
+                "Score": player_scores[0, visible_columns],
+                "Rank": store_ranks(summary, player_scores[:, visible_columns], visible_columns)[0],
+                "Percentile": store_percentiles(summary, player_scores[:, visible_columns], visible_columns)[0],
+            }).dropna(subset=["Score"])
+            st.dataframe(
+                player_roles.sort_values(by=["Phase", "Area", "Score"], ascending=[True, True, False]),
+                use_container_width=True
+            )
+
+    with st.expander("View All Role Scores Table", expanded=True):
+        score_limits = store_score_range(summary, table_columns)
+        if score_limits is None:
+            st.warning("No role scores available to display.")
         else:
-            attributes_df = pd.read_excel(uploaded_file)
+            min_score, max_score = score_limits
+            if min_score == max_score:
+                st.info(f"All scores are the same: {min_score:.2f}")
+                score_range = score_limits
+            else:
+                score_range = st.slider(
+                    "Select score range to filter players",
+                    min_value=min_score,
+                    max_value=max_score,
+                    value=score_limits,
+                    step=0.01
+                )
 
-        attributes_df.columns = attributes_df.columns.str.strip()
+            # Players stay in upload order; sorting would need the full matrix.
+            size_col, page_col = st.columns(2)
+            page_size = size_col.selectbox("Rows per page:", PAGE_SIZES, index=PAGE_SIZES.index(DEFAULT_PAGE_SIZE))
+            # Counting the matches takes a scan of its own, so it is kept
+            # while only the page changes.
+            match_count = session_result(
+                "store_matches",
+                summary_key + ("matches", tuple(table_columns), tuple(score_range)),
+                lambda: scan_score_range(summary, table_columns, score_range[0], score_range[1], page_size=0)[1]
+            )
+            page_count = max(1, -(-match_count // page_size))
+            page_number = page_col.number_input(
+                f"Page (of {page_count}):",
+                min_value=1,
+                max_value=page_count,
+                value=1,
+                key=f"store_page_{page_size}_{match_count}"
+            )
+            page_rows, match_count = scan_score_range(
+                summary, table_columns, score_range[0], score_range[1], page=page_number - 1, page_size=page_size
+            )
+            page_scores = summary["scores"][page_rows][:, table_columns]
+            page_df = pd.DataFrame(
+                page_scores,
+                index=pd.Index(names_at(store, page_rows), name="Player"),
+                columns=pd.Index(table_roles, name="Role")
+            )
+            st.dataframe(highlight_row_max(page_df), use_container_width=True, hide_index=True)
 
+            first_row = (page_number - 1) * page_size
+            st.caption(
+                f"Showing players {min(first_row + 1, match_count)}-{first_row + len(page_rows)} of {match_count}"
+            )
+
+
+if uploaded_file:
+    upload_bytes = uploaded_file.getvalue()
+    upload_key = (hashlib.sha256(upload_bytes).hexdigest(), role_definition_version)
+    result_cache = get_result_cache()
+    if st.session_state.get("results_key") != upload_key:
+        result_cache.release(st.session_state["session_id"])
+        st.session_state["job_records"] = {}
+        st.session_state["results_key"] = upload_key
+
+    if st.checkbox(
+        "Out-of-core mode: keep the database on disk and score it in blocks (for very large exports)",
+        value=len(upload_bytes) >= OUT_OF_CORE_MB * 1024 * 1024
+    ):
+        render_out_of_core(upload_bytes, uploaded_file.name, upload_key)
+        render_stage_panel(stage_records)
+        st.stop()
+
+    # Parsing and scoring run as background jobs; a new upload cancels the
+    # session's running job.
+    try:
+        attributes_df = job_result("parsed", upload_key + ("parsed",), parsing_job(upload_bytes, uploaded_file.name))
     except Exception as e:
         st.error(f"Failed to read file: {e}")
         st.stop()
 
-    attributes_df = attributes_df.rename(columns=column_map)
-
     if "Name" not in attributes_df.columns:
         st.error("Could not find a player name column. Your file needs a column called 'Player' or 'Name'.")
         st.write("Columns found:", list(attributes_df.columns))
         st.stop()
 
-    missing_attributes = [attr for attr in all_attributes if attr not in attributes_df.columns]
+    attributes_df, missing_attributes = session_result(
+        "players",
+        upload_key + ("players",),
+        lambda: prepare_attributes(attributes_df)
+    )
 
     if missing_attributes:
         st.warning(
             "Some attributes used in the role scores were not found in your upload. "
             "They will be treated as 0: " + ", ".join(missing_attributes)
         )
-        for attr in missing_attributes:
-            attributes_df[attr] = 0
-
-    for attr in all_attributes:
-        attributes_df[attr] = pd.to_numeric(attributes_df[attr], errors="coerce").fillna(0)
-
-    # Remove Goalkeepers
-    if "Best Pos" in attributes_df.columns:
-        attributes_df = attributes_df[
-            ~attributes_df["Best Pos"].astype(str).str.contains("GK", case=False, na=False)
-        ]
 
     if attributes_df.empty:
         st.warning("No outfield players found after filtering out goalkeepers.")
         st.stop()
 
-    results_df = calculate_role_scores(attributes_df)
-    results_df["Rank"] = results_df.groupby("Role")["Score"].rank(ascending=False, method="min")
+    # Players are only scored and ranked for roles their positions allow,
+    # when the upload has a "Position" or "Best Pos" column.
+    player_position_masks = player_positions(attributes_df)
+    if player_position_masks is not None and not st.checkbox(
+        "Only score players in roles their positions allow", value=True
+    ):
+        player_position_masks = None
+    scores_key = upload_key + ("all positions" if player_position_masks is None else "by position",)
+
+    # Snapshot mode: when a new export replaces the previous one in this
+    # session, only new or changed player rows are scored again. Snapshots
+    # are cache keys; the previous scores are held like any other result.
+    snapshots = st.session_state.setdefault("snapshots", {})
+    if snapshots.get("key") != upload_key:
+        snapshots["previous"] = snapshots.get("current")
+        snapshots["previous_name"] = snapshots.get("name")
+    previous_scores = None if snapshots["previous"] is None else cached_result("previous", snapshots["previous"])
+
+    base_scores = role_scores = job_result(
+        "scores",
+        scores_key + ("scores",),
+        scoring_job(attributes_df, previous_scores, player_position_masks),
+        render_partial_scores
+    )
+    snapshots.update(key=upload_key, current=scores_key + ("scores",), name=uploaded_file.name)
+
+    if custom_roles:
+        # Each custom role is scored and ranked on its own, so editing one
+        # role only recomputes that role's column.
+        role_scores = session_result(
+            "custom",
+            scores_key + ("custom", definitions_key(custom_roles)),
+            lambda: merge_role_columns(base_scores, [
+                result_cache.get_or_compute(
+                    scores_key + ("role", definitions_key(role_def)),
+                    lambda role_def=role_def: score_role_columns(attributes_df, base_scores, role_def)
+                )
+                for role_def in single_role_definitions(custom_roles)
+            ])
+        )
 
     st.success("Role scores calculated!")
 
+    if "score_low" in role_scores:
+        # Roles a player cannot play are NaN in both bounds, which is not a range.
+        masked = ~np.isclose(role_scores["score_low"], role_scores["score_high"], equal_nan=True)
+        masked_count = int(masked.any(axis=1).sum())
+        st.info(
+            f"{masked_count} players have scouting ranges or unscouted attributes. Their scores use "
+            "the middle of each range (10.5 for an unscouted attribute), and Score Low / Score High "
+            "show the possible range."
+        )
+
     phase_filter = st.radio(
         "Choose role phase to view:",
         ["All", "In Possession", "Out of Possession"],
@@ -447,44 +655,71 @@ if uploaded_file:
         horizontal=True
     )
 
-    visible_results_df = results_df.copy()
+    visible_mask = np.ones(len(role_scores["roles"]), dtype=bool)
 
     if phase_filter != "All":
-        visible_results_df = visible_results_df[visible_results_df["Phase"] == phase_filter].copy()
+        visible_mask &= role_scores["phases"] == phase_filter
 
     if area_filter != "All":
-        visible_results_df = visible_results_df[visible_results_df["Area"] == area_filter].copy()
+        visible_mask &= role_scores["areas"] == area_filter
+
+    visible_columns = np.flatnonzero(visible_mask)
 
-    if visible_results_df.empty:
+    if len(visible_columns) == 0:
         st.warning("No roles match the selected filters.")
         st.stop()
 
+    table_columns = ordered_role_columns(role_scores, visible_columns)
+    # Downloads are cached per upload, scoring mode, custom roles and filters.
+    export_key = scores_key + ("export", definitions_key(custom_roles), phase_filter, area_filter)
+    table_scores = role_scores["scores"][:, table_columns]
+    # Best rank per player in each phase/area group, built once per set of
+    # scores; the filters pick groups, so squad views read a few columns.
+    coverage_index = session_result(
+        "coverage",
+        scores_key + ("coverage", definitions_key(custom_roles)),
+        lambda: build_coverage_index(role_scores)
+    )
+    group_ranks = coverage_index["best_ranks"][:, visible_groups(coverage_index, phase_filter, area_filter)]
+
     with st.expander("View Top Player Per Role", expanded=False):
-        top_players = visible_results_df.loc[
-            visible_results_df.groupby("Role")["Score"].idxmax()
-        ].reset_index(drop=True)
+        top_n = st.selectbox("Players per role:", [1, 5, 10, 25], index=0)
+        top_rows = role_scores["top_rows"][:top_n, visible_columns]
+        top_columns = np.broadcast_to(visible_columns, top_rows.shape)
+        top_players = pd.DataFrame({
+            "Player": role_scores["players"][top_rows.T.ravel()],
+            "Phase": role_scores["phases"][top_columns.T.ravel()],
+            "Area": role_scores["areas"][top_columns.T.ravel()],
+            "Role": role_scores["roles"][top_columns.T.ravel()],
+            "Score": role_scores["scores"][top_rows, top_columns].T.ravel(),
+            "Rank": role_scores["ranks"][top_rows, top_columns].T.ravel(),
+        }).dropna(subset=["Score"])
         st.dataframe(
-            top_players.sort_values(by=["Phase", "Area", "Role"]),
+            top_players.sort_values(by=["Phase", "Area", "Role"], kind="stable"),
             use_container_width=True
         )
 
     with st.expander("View Ranked Role Scores Per Player", expanded=True):
-        player_list = sorted(visible_results_df["Player"].unique().tolist())
+        player_list = pd.unique(role_scores["players"]).tolist()
         selected_player = st.selectbox("Select a player to view their roles:", player_list)
-        player_roles = visible_results_df[visible_results_df["Player"] == selected_player].sort_values(
+        player_rows = np.flatnonzero(role_scores["players"] == selected_player)
+        best_role = role_scores["roles"][role_scores["best_roles"][player_rows[0]]]
+        st.caption(f"Best role overall: {best_role}")
+        player_roles = long_results(role_scores, rows=player_rows, columns=visible_columns)
+        player_roles["Percentile"] = role_percentiles(role_scores, player_rows, visible_columns).T.ravel()
+        player_roles = player_roles.dropna(subset=["Score"])
+        player_roles = player_roles.sort_values(
             by=["Phase", "Area", "Score"],
             ascending=[True, True, False]
         )
         st.dataframe(player_roles, use_container_width=True)
 
     with st.expander("View All Role Scores Table", expanded=True):
-        pivot_df = visible_results_df.pivot(index="Player", columns="Role", values="Score")
-
-        if pivot_df.empty:
+        if np.isnan(table_scores).all():
             st.warning("No role scores available to display.")
         else:
-            min_score = float(pivot_df.min().min())
-            max_score = float(pivot_df.max().max())
+            min_score = float(np.nanmin(table_scores))
+            max_score = float(np.nanmax(table_scores))
 
             if min_score == max_score:
                 st.info(f"All scores are the same: {min_score:.2f}")
@@ -498,23 +733,73 @@ if uploaded_file:
                     step=0.01
                 )
 
-            mask = pivot_df.apply(lambda row: row.between(score_range[0], score_range[1]).any(), axis=1)
-            filtered_df = pivot_df[mask]
-
-            selected_roles = visible_results_df[["Role", "Area", "Phase"]].drop_duplicates()
-            selected_roles["AreaOrder"] = selected_roles["Area"].apply(lambda x: area_order.index(x) if x in area_order else 99)
-            selected_roles["PhaseOrder"] = selected_roles["Phase"].apply(lambda x: 0 if x == "In Possession" else 1)
-            ordered_roles = selected_roles.sort_values(["PhaseOrder", "AreaOrder", "Role"])["Role"].tolist()
-            ordered_roles = [role for role in ordered_roles if role in filtered_df.columns]
-            filtered_df = filtered_df[ordered_roles]
+            with stage("score_range_filter", rows=len(table_scores)):
+                in_range = players_in_score_range(table_scores, score_range[0], score_range[1])
 
-            styled_filtered_df = (
-                filtered_df.style
-                .apply(highlight_max, axis=1)
-                .format("{:.2f}")
+            # The full table is one Styler, so it is only offered below the cell limit.
+            full_table_too_large = int(in_range.sum()) * len(table_columns) > STYLER_MAX_CELLS
+            render_mode = st.radio(
+                "Table rendering:",
+                ["Paginated", "Full table (slow for large squads)"],
+                horizontal=True,
+                disabled=full_table_too_large
             )
+            if full_table_too_large:
+                st.caption(f"Full table is only available up to {STYLER_MAX_CELLS:,} cells.")
+                render_mode = "Paginated"
+
+            if render_mode == "Paginated":
+                # Sort, slice and style only the visible page on the server.
+                table_roles = role_scores["roles"][table_columns].tolist()
+                sort_col, order_col, size_col, page_col = st.columns(4)
+                sort_by = sort_col.selectbox("Sort by:", ["Player"] + table_roles)
+                sort_order = order_col.radio(
+                    "Order:",
+                    ["Ascending", "Descending"],
+                    index=0 if sort_by == "Player" else 1,
+                    horizontal=True,
+                    key=f"sort_order_{sort_by}"
+                )
+                page_size = size_col.selectbox("Rows per page:", PAGE_SIZES, index=PAGE_SIZES.index(DEFAULT_PAGE_SIZE))
+
+                match_count = int(in_range.sum())
+                page_count = max(1, -(-match_count // page_size))
+                page_number = page_col.number_input(
+                    f"Page (of {page_count}):",
+                    min_value=1,
+                    max_value=page_count,
+                    value=1,
+                    key=f"page_{sort_by}_{sort_order}_{page_size}_{match_count}"
+                )
 
-            st.dataframe(styled_filtered_df, use_container_width=True)
+                with stage("render_all_roles_table", rows=match_count):
+                    page_rows, match_count = sorted_page(
+                        table_scores,
+                        in_range,
+                        sort_column=None if sort_by == "Player" else table_roles.index(sort_by),
+                        descending=sort_order == "Descending",
+                        page=page_number - 1,
+                        page_size=page_size
+                    )
+                    page_df = role_table(role_scores, table_columns, rows=page_rows)
+                    st.dataframe(highlight_row_max(page_df), use_container_width=True, hide_index=True)
+
+                first_row = (page_number - 1) * page_size
+                st.caption(
+                    f"Showing players {min(first_row + 1, match_count)}-{first_row + len(page_rows)} "
+                    f"of {match_count}"
+                )
+            else:
+                filtered_df = role_table(role_scores, table_columns, rows=in_range)
+
+                with stage("render_all_roles_table", rows=len(filtered_df)):
+                    st.dataframe(highlight_row_max(filtered_df), use_container_width=True, hide_index=True)
+
+            download_buttons(
+                "role_scores_table",
+                export_key + ("pivot", tuple(score_range)),
+                lambda: role_table(role_scores, table_columns, rows=in_range).reset_index()
+            )
 
     with st.expander("Show Players Outside Top N in Every Role", expanded=False):
         rank_threshold = st.selectbox(
@@ -524,30 +809,211 @@ if uploaded_file:
         )
         display_option = st.radio("View:", ["Scores", "Ranks"], horizontal=True)
 
-        score_pivot = visible_results_df.pivot(index="Player", columns="Role", values="Score")
-        rank_pivot = visible_results_df.pivot(index="Player", columns="Role", values="Rank")
+        with stage("outside_top_n_filter", rows=len(group_ranks)):
+            outside_top_n = players_outside_top_n(group_ranks, rank_threshold)
 
-        mask_outside_top_n = rank_pivot.apply(lambda row: row.dropna().min() > rank_threshold, axis=1)
-        outside_top_n_players = rank_pivot[mask_outside_top_n]
-
-        if outside_top_n_players.empty:
+        if np.isnan(group_ranks).all():
+            st.warning("No player is eligible for any of the visible roles.")
+        elif not outside_top_n.any():
             st.warning(f"All players have at least one visible role ranked within top {rank_threshold}.")
         else:
             if display_option == "Scores":
-                df_to_display = score_pivot.loc[outside_top_n_players.index]
-                selected_roles = visible_results_df[["Role", "Area", "Phase"]].drop_duplicates()
-                selected_roles["AreaOrder"] = selected_roles["Area"].apply(lambda x: area_order.index(x) if x in area_order else 99)
-                selected_roles["PhaseOrder"] = selected_roles["Phase"].apply(lambda x: 0 if x == "In Possession" else 1)
-                ordered_roles = selected_roles.sort_values(["PhaseOrder", "AreaOrder", "Role"])["Role"].tolist()
-                df_to_display = df_to_display[[role for role in ordered_roles if role in df_to_display.columns]]
-                st.dataframe(df_to_display.style.format("{:.2f}"), use_container_width=True)
+                df_to_display = role_table(role_scores, table_columns, rows=outside_top_n)
+                render_page(df_to_display, "{:.2f}", "outside_top_n")
             else:
-                df_to_display = rank_pivot.loc[outside_top_n_players.index]
-                selected_roles = visible_results_df[["Role", "Area", "Phase"]].drop_duplicates()
-                selected_roles["AreaOrder"] = selected_roles["Area"].apply(lambda x: area_order.index(x) if x in area_order else 99)
-                selected_roles["PhaseOrder"] = selected_roles["Phase"].apply(lambda x: 0 if x == "In Possession" else 1)
-                ordered_roles = selected_roles.sort_values(["PhaseOrder", "AreaOrder", "Role"])["Role"].tolist()
-                df_to_display = df_to_display[[role for role in ordered_roles if role in df_to_display.columns]]
-                st.dataframe(df_to_display.style.format("{:.0f}"), use_container_width=True)
+                df_to_display = role_table(role_scores, table_columns, rows=outside_top_n, values="ranks")
+                render_page(df_to_display, "{:.0f}", "outside_top_n")
+
+            download_buttons(
+                f"outside_top_{rank_threshold}_{display_option.lower()}",
+                export_key + ("outside top n", rank_threshold, display_option),
+                lambda: df_to_display.reset_index()
+            )
+
+    with st.expander("Squad Depth and Role Coverage", expanded=False):
+        depth_col, cover_col = st.columns(2)
+        depth_n = depth_col.selectbox("Depth: players within the top N of a role:", [1, 2, 3, 5, 10], index=2)
+        cover_score = cover_col.slider(
+            "A role is covered by players scoring at least:",
+            min_value=1.0,
+            max_value=20.0,
+            value=DEFAULT_COVER_SCORE,
+            step=0.5
+        )
+
+        with stage("squad_coverage", rows=len(table_columns)):
+            coverage_df = role_coverage(role_scores, table_columns, depth_n, cover_score)
+            area_df = area_coverage(
+                coverage_index, visible_groups(coverage_index, phase_filter, area_filter), coverage_df, depth_n
+            )
+
+        st.dataframe(area_df, use_container_width=True, hide_index=True)
+        uncovered_roles = coverage_df.loc[coverage_df["Cover"] == 0, "Role"].tolist()
+        if uncovered_roles:
+            st.warning(f"No player scores {cover_score:.1f} or more in: " + ", ".join(uncovered_roles))
+        st.dataframe(
+            coverage_df.style.format({"First Score": "{:.2f}", "Second Score": "{:.2f}", "Gap": "{:.2f}"}),
+            use_container_width=True,
+            hide_index=True
+        )
+        download_buttons(
+            f"role_coverage_top_{depth_n}",
+            export_key + ("coverage", depth_n, cover_score),
+            lambda: coverage_df
+        )
+
+    with st.expander("Download All Results", expanded=False):
+        st.caption("One row per player and visible role, with score, rank and any scouting bounds.")
+        download_buttons(
+            "role_scores_long",
+            export_key + ("long",),
+            lambda: long_results(role_scores, columns=table_columns)
+        )
+
+    with st.expander("Find Similar Players", expanded=False):
+        similar_to = st.selectbox("Find players similar to:", player_list, key="similar_to")
+        phase_col, area_col, metric_col, count_col = st.columns(4)
+        similar_phase = phase_col.selectbox("Compare on phase:", ["All", "In Possession", "Out of Possession"])
+        similar_area = area_col.selectbox("Compare on area:", ["All", "Defensive", "Midfield", "Attacking"])
+        similar_metric = metric_col.radio("Distance:", ["Cosine", "Euclidean"], horizontal=True)
+        similar_count = count_col.selectbox("Players to show:", [5, 10, 25], index=1)
+
+        similarity_index = session_result(
+            "similarity",
+            scores_key + ("similarity", definitions_key(custom_roles)),
+            lambda: build_similarity_index(attributes_df, role_scores)
+        )
+        query_row = np.flatnonzero(role_scores["players"] == similar_to)[0]
+
+        with stage("similar_players", rows=len(role_scores["players"])):
+            similar_rows, distances = similar_players(
+                similarity_index,
+                query_row,
+                k=similar_count,
+                metric=similar_metric.lower(),
+                columns=similarity_columns(
+                    role_scores, similar_phase, similar_area, definitions=merged_role_attributes(custom_roles)
+                )
+            )
+
+        similar_df = pd.DataFrame({
+            "Player": role_scores["players"][similar_rows],
+            "Distance": distances,
+            "Best Role": role_scores["roles"][role_scores["best_roles"][similar_rows]],
+        })
+        if similar_metric == "Cosine":
+            similar_df.insert(1, "Similarity", 1 - distances)
+        st.dataframe(similar_df.style.format({"Distance": "{:.3f}", "Similarity": "{:.3f}"}), use_container_width=True)
+
+    with st.expander("Best XI and Depth Chart", expanded=False):
+        formation = st.selectbox("Formation:", list(formations.keys()))
+        depth = st.selectbox("Players per slot (starter plus backups):", [1, 2, 3], index=0)
+        in_possession_roles = role_scores["roles"][role_scores["phases"] == "In Possession"].tolist()
+
+        slot_roles = []
+        slot_cols = st.columns(5)
+        for i, default_role in enumerate(formations[formation]):
+            with slot_cols[i % 5]:
+                slot_roles.append(st.selectbox(
+                    f"Slot {i + 1}",
+                    in_possession_roles,
+                    index=in_possession_roles.index(default_role),
+                    key=f"slot_{formation}_{i}"
+                ))
+
+        lineup = assign_slots(role_scores, slot_roles, depth=depth)
+        starters = lineup[lineup["Depth"] == 1]
+        st.caption(f"Starting XI total score: {starters['Score'].sum():.2f} (goalkeeper not included)")
+        empty_slots = lineup.loc[lineup["Player"].isna(), "Slot"].unique()
+        if len(empty_slots):
+            st.warning(
+                "No eligible player left for slot " + ", ".join(str(slot) for slot in empty_slots)
+                + "; those places are left empty."
+            )
+        st.dataframe(lineup.style.format({"Score": "{:.2f}"}), use_container_width=True)
+
+    with st.expander("Progression Since Previous Upload", expanded=False):
+        if previous_scores is None:
+            st.info("Upload a newer export of the same save to see how players have progressed.")
+        elif previous_scores["version"] != base_scores["version"]:
+            # Fingerprints include the position masks, so every player would
+            # look changed across role definitions or scoring modes.
+            st.info(
+                f"{snapshots['previous_name']} was scored with other role definitions or another position "
+                "setting, so progression cannot be compared."
+            )
+        else:
+            with stage("progression", rows=len(role_scores["players"])):
+                # Compared on the built-in definitions; custom columns are left out.
+                progression_df, counts = progression(
+                    previous_scores, base_scores, table_columns[table_columns < len(base_scores["roles"])]
+                )
+
+            st.caption(
+                f"Compared with {snapshots['previous_name']}: {counts['changed']} changed, "
+                f"{counts['unchanged']} unchanged, {counts['new']} new and {counts['departed']} departed players. "
+                f"Scores were reused for {role_scores.get('reused_count', 0)} of {len(role_scores['players'])} rows."
+            )
+            if progression_df.empty:
+                st.info("No player's attributes changed between the two uploads.")
+            else:
+                render_page(progression_df, "{:+.2f}", "progression")
+
+    with st.expander("Ranking Robustness (Monte Carlo)", expanded=False):
+        st.caption(
+            "Simulates attribute noise (exact values +/- the noise, scouting ranges and unscouted "
+            "attributes anywhere in their range) to show how likely each player is to stay in a "
+            "role's top N. Players with no chance in any visible role are left out."
+        )
+        top_col, draws_col, noise_col = st.columns(3)
+        robust_n = top_col.selectbox("Top N:", [1, 3, 5, 10], index=2)
+        draw_count = draws_col.selectbox("Draws:", [500, 1000, 2000, 5000], index=[500, 1000, 2000, 5000].index(SIMULATION_DRAWS))
+        noise = noise_col.select_slider("Attribute noise (points):", [0, 1, 2, 3], value=ATTRIBUTE_NOISE)
+
+        robustness_key = scores_key + ("robustness", definitions_key(custom_roles), robust_n, draw_count, noise)
+        robustness = cached_result("robustness", robustness_key)
+        running = st.session_state.get("job") is not None and st.session_state["job"].key == robustness_key
+        if robustness is None and (running or st.button("Run simulation")):
+            # The simulation runs as the session's background job. This is the
+            # last view, so the rest of the page stays up while it runs.
+            try:
+                robustness = job_result(
+                    "robustness",
+                    robustness_key,
+                    robustness_job(attributes_df, role_scores, custom_roles, robust_n, draw_count, noise)
+                )
+            except Exception as e:
+                st.error(f"Simulation failed: {e}")
+
+        if robustness is not None:
+            robust_df = robustness_results(role_scores, robustness, table_columns)
+            robust_df = robust_df.sort_values(
+                by=["Phase", "Area", "Role", robust_df.columns[-1]],
+                ascending=[True, True, True, False],
+                kind="stable"
+            )
+            # One row per player x role with any chance of the top N, which
+            # can pass STYLER_MAX_CELLS for large exports, so it is paginated.
+            render_page(
+                robust_df,
+                {
+                    "Score": "{:.2f}", "Rank": "{:.0f}", "Expected Score": "{:.2f}", "Spread": "{:.2f}",
+                    robust_df.columns[-1]: "{:.1%}",
+                },
+                "robustness",
+                hide_index=True
+            )
+            download_buttons(
+                f"robustness_top_{robust_n}",
+                export_key + ("robustness", robust_n, draw_count, noise),
+                lambda: robust_df
+            )
+
+    render_stage_panel(stage_records)
 else:
+    cancel_session_job(st.session_state)
+    get_result_cache().release(st.session_state["session_id"])
+    st.session_state.pop("job_records", None)
+    st.session_state.pop("results_key", None)
     st.info("Please upload a file to begin.")
+    render_stage_panel(stage_records)
@@ -0,0 +1,130 @@
+"""Score a directory of Football Manager exports without Streamlit.
+
+Usage: python batch.py EXPORT_DIR [--output-dir DIR] [--format parquet|csv|xlsx]
+                       [--layout wide|long] [--workers N] [--log-stages]
+                       [--roles ROLES.json|ROLES.yaml] [--all-positions]
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from custom_roles import load_role_definitions, single_role_definitions
+from exports import export_bytes, export_formats
+from instrumentation import configure_stage_logging, start_stage_log
+from loading import player_positions, prepare_attributes, read_upload
+from scoring import long_results, merge_role_columns, role_table, score_players, score_role_columns
+
+export_extensions = (".csv", ".xlsx", ".xls", ".html", ".htm")
+
+
+def score_export(path, output_dir, output_format="parquet", layout="wide", log_stages=False, role_definitions=None,
+                 by_position=True):
+    if log_stages:
+        configure_stage_logging()
+    start_stage_log(session=os.path.basename(path))
+
+    with open(path, "rb") as f:
+        data = f.read()
+
+    attributes_df = read_upload(data, os.path.basename(path))
+    if "Name" not in attributes_df.columns:
+        raise ValueError("no 'Player' or 'Name' column")
+
+    attributes_df, missing_attributes = prepare_attributes(attributes_df)
+    if attributes_df.empty:
+        raise ValueError("no outfield players after filtering out goalkeepers")
+
+    positions = player_positions(attributes_df) if by_position else None
+    role_scores = score_players(attributes_df, positions=positions)
+    if role_definitions:
+        role_scores = merge_role_columns(role_scores, [
+            score_role_columns(attributes_df, role_scores, role_def)
+            for role_def in single_role_definitions(role_definitions)
+        ])
+    if layout == "long":
+        results = long_results(role_scores)
+    else:
+        results = role_table(role_scores, np.arange(len(role_scores["roles"]))).reset_index()
+
+    # The source extension stays in the name, so save.csv and save.html in
+    # one directory write save_csv_scores.* and save_html_scores.*.
+    stem, extension = os.path.splitext(os.path.basename(path))
+    output_path = os.path.join(output_dir, f"{stem}_{extension[1:]}_scores.{output_format}")
+    export_format = {name.lower(): name for name in export_formats}[output_format]
+    with open(output_path, "wb") as f:
+        f.write(export_bytes(results, export_format))
+
+    return output_path, len(attributes_df), missing_attributes
+
+
+def find_exports(export_dir):
+    return sorted(
+        os.path.join(export_dir, name)
+        for name in os.listdir(export_dir)
+        if name.lower().endswith(export_extensions)
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score every FM export in a directory.")
+    parser.add_argument("export_dir", help="directory containing csv/xlsx/html exports")
+    parser.add_argument("--output-dir", help="where to write results (default: EXPORT_DIR/scores)")
+    parser.add_argument("--format", choices=["parquet", "csv", "xlsx"], default="parquet")
+    parser.add_argument("--layout", choices=["wide", "long"], default="wide",
+                        help="wide: one row per player, one column per role; long: one row per player x role")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--log-stages", action="store_true", help="write per-stage timings to stderr as JSON lines")
+    parser.add_argument("--roles", help="JSON or YAML file of custom roles / weight overrides")
+    parser.add_argument("--all-positions", action="store_true",
+                        help="score every player for every role, ignoring the Position / Best Pos column")
+    args = parser.parse_args(argv)
+
+    role_definitions = None
+    if args.roles:
+        try:
+            with open(args.roles, "rb") as f:
+                role_definitions = load_role_definitions(f.read(), args.roles)
+        except (OSError, ValueError) as e:
+            print(f"Could not load {args.roles}: {e}", file=sys.stderr)
+            return 1
+
+    exports = find_exports(args.export_dir)
+    if not exports:
+        print(f"No exports found in {args.export_dir}", file=sys.stderr)
+        return 1
+
+    output_dir = args.output_dir or os.path.join(args.export_dir, "scores")
+    os.makedirs(output_dir, exist_ok=True)
+
+    failures = 0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = {
+            pool.submit(
+                score_export, path, output_dir, args.format, args.layout, args.log_stages, role_definitions,
+                not args.all_positions
+            ): path
+            for path in exports
+        }
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                output_path, player_count, missing_attributes = future.result()
+            except Exception as e:
+                failures += 1
+                print(f"FAILED {path}: {e}", file=sys.stderr)
+                continue
+
+            note = f" (missing: {', '.join(missing_attributes)})" if missing_attributes else ""
+            print(f"{path}: {player_count} players -> {output_path}{note}")
+
+    print(f"Scored {len(exports) - failures}/{len(exports)} exports in {time.perf_counter() - start:.1f}s")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
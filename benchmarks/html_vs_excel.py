@@ -0,0 +1,45 @@
+"""Compare parsing an FM HTML export with parsing the same data as xlsx.
+
+Usage: python benchmarks/html_vs_excel.py [rows]
+"""
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+
+# synthetic puts the repository root on sys.path.
+from synthetic import synthetic_export, to_fm_html, to_xlsx
+
+from loading import read_upload
+
+
+def measure(label, data, filename):
+    start = time.perf_counter()
+    df = read_upload(data, filename)
+    elapsed = time.perf_counter() - start
+
+    # Second pass for memory only, since tracemalloc slows parsing down.
+    tracemalloc.start()
+    read_upload(data, filename)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{label:<6} {elapsed:8.2f} s  peak {peak / 2**20:8.1f} MB  {len(df)} rows")
+    return df
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    df = synthetic_export(rows)
+    html_bytes = to_fm_html(df)
+    xlsx_bytes = to_xlsx(df)
+    print(f"{rows} rows: html {len(html_bytes) / 2**20:.1f} MB, xlsx {len(xlsx_bytes) / 2**20:.1f} MB")
+
+    html_df = measure("html", html_bytes, "export.html")
+    xlsx_df = measure("xlsx", xlsx_bytes, "export.xlsx")
+    pd.testing.assert_frame_equal(html_df, xlsx_df, check_dtype=False)
+
+
+if __name__ == "__main__":
+    main()
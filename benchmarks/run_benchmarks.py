@@ -0,0 +1,193 @@
+"""Time each stage of the scoring pipeline on synthetic exports.
+
+Usage:
+    python benchmarks/run_benchmarks.py                     compare with baseline.json
+    python benchmarks/run_benchmarks.py --update-baseline   record a new baseline
+    python benchmarks/run_benchmarks.py --sizes 1000 10000  only some sizes
+    python benchmarks/run_benchmarks.py --sizes 500000      large run (several GB of memory)
+
+Exits with status 1 when a stage is slower than the baseline by more than
+--tolerance (and by more than --min-delta seconds, to ignore timer noise).
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# synthetic puts the repository root on sys.path.
+from synthetic import synthetic_export, to_csv, to_xlsx
+
+from loading import filter_goalkeepers, player_positions, prepare_attributes, read_upload, upload_chunks
+from robustness import column_weights, simulate_top_n
+from scoring import (
+    build_role_index,
+    calculate_role_scores,
+    highlight_row_max,
+    ordered_role_columns,
+    players_in_score_range,
+    players_outside_top_n,
+    role_ranks,
+    role_table,
+)
+from store import score_store, write_store
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+# 500k rows needs more memory than a typical CI box has, so it is opt-in.
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+
+
+def best_of(repeat, fn):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def run_stages(rows, repeat, xlsx_max_rows, styler_max_rows):
+    timings = {}
+    export = synthetic_export(rows)
+    csv_bytes = to_csv(export)
+
+    def stage(name, fn):
+        timings[name], result = best_of(repeat, fn)
+        return result
+
+    # Parsing: the full read (as the app used to do) and the projected,
+    # compact read the app uses now.
+    raw_df = stage("parse_csv_full", lambda: read_upload(csv_bytes, "export.csv", compact=False))
+    stage("parse_csv_compact", lambda: read_upload(csv_bytes, "export.csv"))
+    masked_csv_bytes = to_csv(synthetic_export(rows, masked=0.1))
+    stage("parse_csv_masked", lambda: read_upload(masked_csv_bytes, "export.csv"))
+    if rows <= xlsx_max_rows:
+        xlsx_bytes = to_xlsx(export)
+        stage("parse_xlsx_compact", lambda: read_upload(xlsx_bytes, "export.xlsx"))
+
+    # Missing-attribute fill, numeric coercion and goalkeeper filtering.
+    stage("rename_and_coerce", lambda: prepare_attributes(raw_df))
+    coerced_df = prepare_attributes(raw_df)[0]
+    stage("filter_goalkeepers", lambda: filter_goalkeepers(coerced_df))
+    players_df = filter_goalkeepers(coerced_df)
+
+    role_scores = stage("calculate_role_scores", lambda: calculate_role_scores(players_df))
+    positions = player_positions(players_df)
+    stage("calculate_role_scores_by_position", lambda: calculate_role_scores(players_df, positions=positions))
+
+    def out_of_core():
+        # A fresh directory each time, so the store is written and scored.
+        with tempfile.TemporaryDirectory() as directory:
+            return score_store(write_store(upload_chunks(csv_bytes, "export.csv"), directory))["valid_counts"]
+
+    stage("out_of_core_scores", out_of_core)
+
+    def rank():
+        role_scores.update(build_role_index(role_scores))
+        return role_ranks(role_scores)
+
+    role_scores["ranks"] = stage("rank", rank)
+
+    linear = column_weights(role_scores)
+    stage("simulate_top_n", lambda: simulate_top_n(players_df, role_scores, linear, top_n=5, draws=200))
+
+    columns = ordered_role_columns(role_scores, np.arange(len(role_scores["roles"])))
+    scores = role_scores["scores"][:, columns]
+    ranks = role_scores["ranks"][:, columns]
+    low, high = np.percentile(scores, [60, 100])
+
+    in_range = stage("row_filters", lambda: (
+        players_in_score_range(scores, low, high),
+        players_outside_top_n(ranks, 10),
+    ))[0]
+
+    filtered_df = stage("pivots", lambda: (
+        role_table(role_scores, columns, rows=in_range),
+        role_table(role_scores, columns),
+        role_table(role_scores, columns, values="ranks"),
+    ))[0]
+
+    if len(filtered_df) <= styler_max_rows:
+        stage("styler_render", lambda: highlight_row_max(filtered_df).to_html())
+
+    return timings
+
+
+def compare(results, baseline, tolerance, min_delta):
+    # Regressions, plus the stages that ran but have no baseline to check.
+    regressions = []
+    unchecked = []
+    for size, timings in results.items():
+        for name, seconds in timings.items():
+            before = baseline.get(size, {}).get(name)
+            if before is None:
+                unchecked.append(f"{name} @ {size} rows")
+                continue
+            if seconds > before * tolerance and seconds - before > min_delta:
+                regressions.append(f"{name} @ {size} rows: {before:.3f}s -> {seconds:.3f}s")
+    return regressions, unchecked
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark each pipeline stage on synthetic exports.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per stage; the fastest is kept")
+    parser.add_argument("--xlsx-max-rows", type=int, default=10_000, help="skip xlsx parsing above this size")
+    parser.add_argument("--styler-max-rows", type=int, default=2_000, help="skip Styler rendering above this size")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="allowed slowdown factor")
+    parser.add_argument("--min-delta", type=float, default=0.05, help="ignore slowdowns smaller than this (s)")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for rows in args.sizes:
+        repeat = args.repeat if rows <= 100_000 else 1
+        timings = run_stages(rows, repeat, args.xlsx_max_rows, args.styler_max_rows)
+        results[str(rows)] = timings
+        print(f"\n{rows} rows")
+        for name, seconds in timings.items():
+            print(f"  {name:<34} {seconds:9.4f} s")
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.setdefault("timings", {}).update(results)
+        baseline["machine"] = f"{platform.machine()} {platform.python_implementation()} {platform.python_version()}"
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --update-baseline first.")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    regressions, unchecked = compare(results, baseline.get("timings", {}), args.tolerance, args.min_delta)
+    if unchecked:
+        print("\nNo baseline for (run with --update-baseline to record it):")
+        for line in unchecked:
+            print(f"  {line}")
+    if regressions:
+        print("\nRegressions against baseline:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+
+    print("\nNo regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
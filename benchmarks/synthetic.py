@@ -0,0 +1,77 @@
+"""Synthetic Football Manager exports for benchmarks."""
+import html
+import io
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from roles import all_attributes, column_map  # noqa: E402
+
+positions = [
+    "GK", "D (C)", "D (RC)", "D (L)", "D/WB (R)", "WB (L)", "DM", "DM, M (C)",
+    "M (C)", "M/AM (R)", "AM (L)", "AM (RLC)", "AM (C), ST (C)", "ST (C)",
+]
+# Roughly how often each Best Pos shows up in a full database export.
+position_weights = np.array([10, 12, 4, 5, 4, 3, 6, 5, 11, 6, 6, 5, 7, 16], dtype=float)
+
+
+def full_attribute_names():
+    # The long header FM writes for each attribute (e.g. "Passing" for "Pas").
+    names = {}
+    for full_name, short_name in column_map.items():
+        names.setdefault(short_name, full_name)
+    return [names.get(attr, attr) for attr in all_attributes]
+
+
+def synthetic_export(rows, seed=0, masked=0.0):
+    # `masked` is the share of attribute cells shown as a scouting range
+    # ("12-15"); a tenth of those are unscouted ("-") instead.
+    rng = np.random.default_rng(seed)
+
+    # Players have an overall level plus per-attribute noise, so attributes
+    # are correlated the way real ones are rather than uniformly random.
+    level = rng.normal(11, 3, size=(rows, 1))
+    values = np.clip(np.rint(level + rng.normal(0, 2.5, size=(rows, len(all_attributes)))), 1, 20)
+
+    df = pd.DataFrame(values.astype(np.int64), columns=full_attribute_names())
+    if masked:
+        cells = values.astype(np.int64)
+        ranges = np.char.add(np.char.add(np.maximum(cells - 2, 1).astype(str), "-"), np.minimum(cells + 1, 20).astype(str))
+        shown = np.where(rng.random(cells.shape) < masked, ranges, cells.astype(str))
+        shown[rng.random(cells.shape) < masked / 10] = "-"
+        df = pd.DataFrame(shown.astype(object), columns=full_attribute_names())
+    df.insert(0, "Player", [f"Player {i}" for i in range(rows)])
+    df.insert(1, "Best Pos", rng.choice(positions, rows, p=position_weights / position_weights.sum()))
+    df.insert(2, "Age", rng.integers(15, 38, rows))
+
+    # Columns a real export carries that the tool never uses.
+    df["Nat"] = rng.choice(["ENG", "ESP", "FRA", "BRA", "GER", "ITA"], rows)
+    df["Personality"] = rng.choice(["Balanced", "Determined", "Professional", "Fairly Ambitious"], rows)
+    df["Wage"] = rng.choice(["£1,200 p/w", "£35,000 p/w", "£120,000 p/w"], rows)
+    df["Transfer Value"] = rng.choice(["£1.2M - £3M", "£25M - £40M", "Not for Sale"], rows)
+    return df
+
+
+def to_csv(df):
+    return df.to_csv(index=False).encode("utf-8")
+
+
+def to_xlsx(df):
+    buffer = io.BytesIO()
+    df.to_excel(buffer, index=False)
+    return buffer.getvalue()
+
+
+def to_fm_html(df):
+    # Same layout as FM's "Print Screen" web page export: one header row of
+    # <th> cells followed by one <tr> of <td> cells per player.
+    lines = ["<html><head><meta charset=\"utf-8\"></head><body><table>"]
+    lines.append("<tr>" + "".join(f"<th>{html.escape(str(c))}</th>" for c in df.columns) + "</tr>")
+    for row in df.itertuples(index=False):
+        lines.append("<tr>" + "".join(f"<td>{html.escape(str(v))}</td>" for v in row) + "</tr>")
+    lines.append("</table></body></html>")
+    return "\n".join(lines).encode("utf-8")
@@ -0,0 +1,140 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+def frame_size(value):
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.memmap):
+        # Memory-mapped store columns live on disk, not in the cache's budget.
+        return 0
+    if isinstance(value, np.ndarray):
+        if value.dtype == object:
+            return int(pd.Series(value).memory_usage(deep=True))
+        return value.nbytes
+    if isinstance(value, (tuple, list)):
+        return sum(frame_size(item) for item in value)
+    if isinstance(value, dict):
+        return sum(frame_size(item) for item in value.values())
+    return 0
+
+
+class ResultCache:
+    # LRU cache bounded by the total memory of the cached frames. One instance
+    # is shared by every session, so all access goes through the lock.
+    #
+    # A session keeps the results its reruns need by holding them: a holder
+    # is an (owner, slot) pair, and each slot holds one key at a time. Held
+    # entries are only evicted for another owner's held results, least
+    # recently used first, and an owner's own results are stored even past
+    # max_bytes. The cache therefore stays within max_bytes, or within the
+    # largest set of results one session holds if that is bigger.
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.sizes = {}
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.holds = {}
+
+    def get(self, key, holder=None):
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+            if holder is not None:
+                self.hold(holder, key)
+            return self.entries[key]
+
+    def put(self, key, value, holder=None):
+        size = frame_size(value)
+        if size > self.max_bytes and holder is None:
+            return
+
+        with self.lock:
+            if key in self.entries:
+                self.remove(key)
+            if holder is not None:
+                # Replaces what the slot held before, so that can be evicted.
+                self.hold(holder, key)
+
+            self.evict(size, holder)
+            if self.total_bytes + size > self.max_bytes and holder is None:
+                return
+
+            self.entries[key] = value
+            self.sizes[key] = size
+            self.total_bytes += size
+
+    def discard(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.remove(key)
+
+    def release(self, owner):
+        # Drops everything the owner holds (e.g. when its upload changes);
+        # the entries stay cached until something else needs the room.
+        with self.lock:
+            self.holds.pop(owner, None)
+
+    def hold(self, holder, key):
+        owner, slot = holder
+        self.holds.setdefault(owner, {})[slot] = key
+
+    def remove(self, key):
+        self.total_bytes -= self.sizes.pop(key)
+        del self.entries[key]
+
+    def evict(self, size, holder):
+        # Frees room for `size` bytes: unheld entries first, then (for a
+        # holder) entries only other owners hold. Without a holder nothing
+        # is evicted unless that makes enough room. Callers hold the lock.
+        owner = holder[0] if holder is not None else None
+        own_keys = set(self.holds.get(owner, {}).values())
+        held_keys = {key for slots in self.holds.values() for key in slots.values()}
+
+        victims = [key for key in self.entries if key not in held_keys]
+        if holder is not None:
+            victims += [key for key in self.entries if key in held_keys and key not in own_keys]
+        elif self.total_bytes - sum(self.sizes[key] for key in victims) + size > self.max_bytes:
+            return
+
+        for key in victims:
+            if self.total_bytes + size <= self.max_bytes:
+                return
+            self.remove(key)
+            for slots in self.holds.values():
+                for slot in [slot for slot, held in slots.items() if held == key]:
+                    del slots[slot]
+
+    def get_or_compute(self, key, compute, holder=None):
+        value = self.get(key, holder)
+        if value is not None:
+            return value
+
+        # Sessions asking for the same key wait for the first one to finish
+        # instead of parsing and scoring the same upload in parallel.
+        with self.lock:
+            key_lock = self.pending.setdefault(key, threading.Lock())
+
+        try:
+            with key_lock:
+                value = self.get(key, holder)
+                if value is None:
+                    value = compute()
+                    self.put(key, value, holder)
+        finally:
+            with self.lock:
+                if self.pending.get(key) is key_lock:
+                    del self.pending[key]
+
+        return value
@@ -0,0 +1,135 @@
+import copy
+import json
+import os
+
+try:
+    import yaml
+except ImportError:  # PyYAML is optional; JSON definitions always work.
+    yaml = None
+
+from roles import all_attributes, area_order, positions, role_area_groups, role_attributes, role_positions
+
+# Custom definitions use the role_attributes layout:
+#   {"In Possession": {"My Role": {"key": [...], "preferred": [...],
+#                                  "area": "Midfield", "key_weight": 0.7,
+#                                  "positions": ["DM", "M (C)"]}}}
+# Overriding a built-in role only needs the fields that change; the rest
+# come from its built-in definition.
+role_fields = ["key", "preferred", "area", "key_weight", "positions"]
+
+
+def load_role_definitions(data, filename):
+    text = data.decode("utf-8") if isinstance(data, bytes) else data
+    if os.path.splitext(filename)[1].lower() in (".yaml", ".yml"):
+        if yaml is None:
+            raise ValueError("Reading YAML role definitions needs PyYAML (pip install pyyaml); JSON works without it.")
+        try:
+            definitions = yaml.safe_load(text)
+        except yaml.YAMLError as e:
+            raise ValueError(f"Invalid YAML: {e}") from e
+    else:
+        definitions = json.loads(text)
+    return validate_role_definitions(definitions)
+
+
+def is_name_list(value):
+    return isinstance(value, (list, tuple)) and all(isinstance(item, str) for item in value)
+
+
+def validate_role_definitions(definitions):
+    # Returns the definitions with every field filled in, or raises
+    # ValueError listing everything that is wrong.
+    if not isinstance(definitions, dict):
+        raise ValueError("Role definitions must map a phase to its roles.")
+
+    # Role names label columns, exports and tables without their phase, so
+    # a name may only be used in one phase.
+    phase_roles = {phase: set(roles) for phase, roles in role_attributes.items()}
+    for phase, roles in definitions.items():
+        if phase in phase_roles and isinstance(roles, dict):
+            phase_roles[phase].update(roles)
+
+    errors = []
+    valid = {}
+    for phase, roles in definitions.items():
+        if phase not in role_attributes:
+            errors.append(f"Unknown phase '{phase}' (expected one of: {', '.join(role_attributes)})")
+            continue
+        if not isinstance(roles, dict):
+            errors.append(f"{phase}: roles must map a role name to its definition")
+            continue
+
+        for role, attrs in roles.items():
+            if not isinstance(attrs, dict):
+                errors.append(f"{phase} / {role}: definition must be a mapping")
+                continue
+            unknown_fields = sorted(set(attrs) - set(role_fields))
+            if unknown_fields:
+                errors.append(f"{phase} / {role}: unknown fields {', '.join(unknown_fields)}")
+            other_phases = [other for other, names in phase_roles.items() if other != phase and role in names]
+            if other_phases:
+                errors.append(f"{phase} / {role}: the name is already a role in {', '.join(other_phases)}")
+
+            not_lists = [
+                field for field in ("key", "preferred", "positions")
+                if field in attrs and not is_name_list(attrs[field])
+            ]
+            if not_lists:
+                errors.append(f"{phase} / {role}: {', '.join(not_lists)} must be a list of names")
+                continue
+
+            built_in = role_attributes[phase].get(role, {})
+            role_def = {
+                "key": list(attrs.get("key", built_in.get("key", []))),
+                "preferred": list(attrs.get("preferred", built_in.get("preferred", []))),
+                "area": attrs.get("area", role_area_groups.get(role, "Midfield")),
+            }
+            if "key_weight" in attrs:
+                role_def["key_weight"] = attrs["key_weight"]
+            allowed = attrs.get("positions", role_positions.get(role))
+            if allowed is not None:
+                # An empty list opens the role to every position.
+                role_def["positions"] = list(allowed) or list(positions)
+
+            if not role_def["key"]:
+                errors.append(f"{phase} / {role}: needs at least one key attribute")
+            unknown = [attr for attr in role_def["key"] + role_def["preferred"] if attr not in all_attributes]
+            if unknown:
+                errors.append(f"{phase} / {role}: unknown attributes {', '.join(map(str, unknown))}")
+            unknown_positions = [position for position in role_def.get("positions", []) if position not in positions]
+            if unknown_positions:
+                errors.append(f"{phase} / {role}: unknown positions {', '.join(map(str, unknown_positions))}")
+            if role_def["area"] not in area_order:
+                errors.append(f"{phase} / {role}: area must be one of {', '.join(area_order)}")
+            key_weight = role_def.get("key_weight", 0)
+            if isinstance(key_weight, bool) or not isinstance(key_weight, (int, float)) or not 0 <= key_weight <= 1:
+                errors.append(f"{phase} / {role}: key_weight must be a number between 0 and 1")
+
+            valid.setdefault(phase, {})[role] = role_def
+
+    if errors:
+        raise ValueError("Invalid role definitions:\n" + "\n".join(errors))
+    return valid
+
+
+def single_role_definitions(definitions):
+    # Splits definitions into one {phase: {role: attrs}} per role, so each
+    # role can be scored (and cached) on its own.
+    return [
+        {phase: {role: attrs}}
+        for phase, roles in definitions.items()
+        for role, attrs in roles.items()
+    ]
+
+
+def definitions_key(definitions):
+    return json.dumps(definitions, sort_keys=True)
+
+
+def merged_role_attributes(definitions):
+    # role_attributes with the custom definitions applied.
+    merged = copy.deepcopy(role_attributes)
+    for phase, roles in definitions.items():
+        for role, attrs in roles.items():
+            merged[phase][role] = {"key": attrs["key"], "preferred": attrs["preferred"]}
+    return merged
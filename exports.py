@@ -0,0 +1,60 @@
+import io
+
+import pandas as pd
+from openpyxl import Workbook
+
+from instrumentation import stage
+
+# Download formats: file extension and MIME type.
+export_formats = {
+    "CSV": (".csv", "text/csv"),
+    "Parquet": (".parquet", "application/vnd.apache.parquet"),
+    "XLSX": (".xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+
+# Rows converted per block while streaming a workbook, and rows per sheet
+# (Excel's limit is 1,048,576 including the header); must be a multiple of
+# XLSX_CHUNK_ROWS.
+XLSX_CHUNK_ROWS = 10_000
+XLSX_SHEET_ROWS = 1_000_000
+
+
+def cell_values(column):
+    # Plain Python values for openpyxl, with missing values as empty cells.
+    values = column.astype(object) if isinstance(column.dtype, pd.CategoricalDtype) else column
+    return [None if pd.isna(value) else value for value in values.to_numpy().tolist()]
+
+
+def xlsx_bytes(df, sheet_name="Results"):
+    # Streams df into a write-only workbook a block of rows at a time, so
+    # the whole sheet is never held as cell objects. Frames longer than
+    # XLSX_SHEET_ROWS continue on further sheets.
+    workbook = Workbook(write_only=True)
+    header = [str(column) for column in df.columns]
+    sheet = None
+
+    for start in range(0, max(len(df), 1), XLSX_CHUNK_ROWS):
+        if start % XLSX_SHEET_ROWS == 0:
+            sheet_number = start // XLSX_SHEET_ROWS + 1
+            sheet = workbook.create_sheet(sheet_name if sheet_number == 1 else f"{sheet_name} {sheet_number}")
+            sheet.append(header)
+        block = df.iloc[start:start + XLSX_CHUNK_ROWS]
+        for row in zip(*(cell_values(block[column]) for column in block.columns)):
+            sheet.append(row)
+
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def export_bytes(df, export_format):
+    with stage(f"export_{export_format.lower()}", rows=len(df)):
+        if export_format == "CSV":
+            return df.to_csv(index=False).encode("utf-8")
+        if export_format == "Parquet":
+            buffer = io.BytesIO()
+            df.to_parquet(buffer, index=False)
+            return buffer.getvalue()
+        if export_format == "XLSX":
+            return xlsx_bytes(df)
+    raise ValueError(f"Unknown export format: {export_format}")
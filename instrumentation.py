@@ -0,0 +1,109 @@
+import contextvars
+import functools
+import json
+import logging
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger("fm_roles.stages")
+
+# Records for the current script run / job. Each Streamlit session runs in
+# its own thread, and threads start with an empty context, so sessions never
+# see each other's records.
+stage_log = contextvars.ContextVar("stage_log", default=None)
+stage_session = contextvars.ContextVar("stage_session", default=None)
+
+# Peak-memory state of the stages open in this context, innermost last.
+# tracemalloc has a single peak, which each stage resets; the peak seen so
+# far is folded into the enclosing stage first so its own peak stays right.
+open_stages = contextvars.ContextVar("open_stages", default=())
+
+
+def start_stage_log(session=None, records=None):
+    # Starts collecting this context's stage records, into `records` if given.
+    records = [] if records is None else records
+    stage_log.set(records)
+    stage_session.set(session)
+    return records
+
+
+def configure_stage_logging(stream=None):
+    # One JSON object per line, nothing else, so the lines can be parsed as-is.
+    if any(getattr(handler, "stage_handler", False) for handler in logger.handlers):
+        return
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    handler.stage_handler = True
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+def max_rss_mb():
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere.
+    return round(max_rss / 2**20 if sys.platform == "darwin" else max_rss / 1024, 1)
+
+
+def fold_peak(peak=None):
+    # Raises the innermost open stage's peak to `peak` (default: the current
+    # tracemalloc peak).
+    stages = open_stages.get()
+    if stages:
+        peak = tracemalloc.get_traced_memory()[1] if peak is None else peak
+        stages[-1]["peak"] = max(stages[-1]["peak"], peak)
+
+
+@contextmanager
+def stage(name, rows=None):
+    # Times the block and records wall time, row count and memory. Peak
+    # memory is only measured while tracemalloc is tracing, and it is
+    # process-wide, so concurrent sessions can inflate each other's peaks.
+    record = {"stage": name, "rows": rows}
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        fold_peak()
+        tracemalloc.reset_peak()
+        memory = {"start": tracemalloc.get_traced_memory()[0], "peak": 0}
+        token = open_stages.set(open_stages.get() + (memory,))
+    start = time.perf_counter()
+
+    try:
+        yield record
+    finally:
+        record["seconds"] = round(time.perf_counter() - start, 6)
+        if tracing:
+            fold_peak()
+            open_stages.reset(token)
+            fold_peak(memory["peak"])
+            record["peak_mb"] = round((memory["peak"] - memory["start"]) / 2**20, 3)
+        record["max_rss_mb"] = max_rss_mb()
+        if stage_session.get() is not None:
+            record["session"] = stage_session.get()
+
+        records = stage_log.get()
+        if records is not None:
+            records.append(record)
+        logger.info(json.dumps(record, default=str))
+
+
+def timed(name, rows=len):
+    # Decorator form of stage(); rows(result) gives the row count to record.
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name) as record:
+                result = fn(*args, **kwargs)
+                record["rows"] = rows(result)
+            return result
+        return wrapper
+    return decorator
@@ -0,0 +1,83 @@
+import contextvars
+import threading
+import time
+
+from instrumentation import stage_session, start_stage_log
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class BackgroundJob:
+    # Runs fn(job) on a daemon thread so the Streamlit script can keep
+    # rerunning (and drawing progress) while a long parse or scoring job
+    # works. fn reports progress through job.report(), which raises
+    # JobCancelled once cancel() has been called.
+
+    def __init__(self, key, fn):
+        self.key = key
+        self.fraction = 0.0
+        self.message = "Starting"
+        self.partial = None
+        self.result = None
+        self.error = None
+        self.started = time.perf_counter()
+        self.records = []
+        self.cancelled = threading.Event()
+        self.finished = threading.Event()
+
+        # Copying the context keeps the session id on the job's stage logs;
+        # the records themselves are kept on the job, since each rerun of the
+        # script starts a new list.
+        context = contextvars.copy_context()
+        self.thread = threading.Thread(target=context.run, args=(self.run, fn), daemon=True)
+        self.thread.start()
+
+    def run(self, fn):
+        start_stage_log(stage_session.get(), self.records)
+        try:
+            self.result = fn(self)
+        except JobCancelled:
+            pass
+        except Exception as e:
+            self.error = e
+        finally:
+            self.finished.set()
+
+    def report(self, fraction, message, partial=None):
+        if self.cancelled.is_set():
+            raise JobCancelled()
+        self.fraction = min(max(fraction, 0.0), 1.0)
+        self.message = message
+        if partial is not None:
+            self.partial = partial
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def done(self):
+        return self.finished.is_set()
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+def session_job(state, key, fn):
+    # The session's background job for `key`, starting it if needed. A
+    # session runs one job at a time: asking for a different key (a new
+    # upload, say) cancels the job that was running.
+    job = state.get("job")
+    if job is not None and job.key != key:
+        job.cancel()
+        job = None
+    if job is None:
+        job = BackgroundJob(key, fn)
+        state["job"] = job
+    return job
+
+
+def cancel_session_job(state):
+    job = state.pop("job", None)
+    if job is not None:
+        job.cancel()
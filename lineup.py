@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+from scipy.optimize import linear_sum_assignment
+
+from instrumentation import timed
+from scoring import top_players_for_role
+
+# Solver score for a player x slot the player cannot play. It is below any
+# total of real scores, so such pairs are only used when a slot has no
+# eligible player left, and those slots are then left empty.
+INELIGIBLE_SCORE = -1e6
+
+# Outfield slots for the Best XI solver, one In Possession role per slot.
+formations = {
+    "4-2-3-1": [
+        "Full-Back", "Centre-Back", "Centre-Back", "Full-Back",
+        "Defensive Midfielder", "Deep-Lying Playmaker",
+        "Winger", "Attacking Midfielder", "Inside Forward",
+        "Centre Forward",
+    ],
+    "4-3-3": [
+        "Wing-Back", "Centre-Back", "Ball-Playing Centre-Back", "Full-Back",
+        "Defensive Midfielder", "Central Midfielder", "Box-to-Box Midfielder",
+        "Inside Forward", "Winger",
+        "Poacher",
+    ],
+    "4-4-2": [
+        "Full-Back", "Centre-Back", "Centre-Back", "Full-Back",
+        "Wide Midfielder", "Central Midfielder", "Box-to-Box Midfielder", "Wide Midfielder",
+        "Target Forward", "Poacher",
+    ],
+    "3-5-2": [
+        "Wide Centre-Back", "Centre-Back", "Wide Centre-Back",
+        "Wing-Back", "Defensive Midfielder", "Central Midfielder", "Advanced Playmaker", "Wing-Back",
+        "Deep-Lying Forward", "Channel Forward",
+    ],
+}
+
+
+def greedy_assignment(slot_scores):
+    # Repeatedly takes the best remaining player x slot pair.
+    slot_scores = slot_scores.astype("float64").copy()
+    chosen_rows = []
+    chosen_slots = []
+
+    for _ in range(min(slot_scores.shape)):
+        row, slot = np.unravel_index(np.argmax(slot_scores), slot_scores.shape)
+        chosen_rows.append(row)
+        chosen_slots.append(slot)
+        slot_scores[row, :] = -np.inf
+        slot_scores[:, slot] = -np.inf
+
+    return np.array(chosen_rows, dtype=int), np.array(chosen_slots, dtype=int)
+
+
+@timed("assign_slots")
+def assign_slots(role_scores, slot_roles, depth=1, method="pruned"):
+    # Fills each slot with a different player to maximise the total score.
+    # "optimal" solves the assignment over every player; "pruned" solves it
+    # over the union of each slot role's top len(slots) * depth players, which
+    # gives the same total since any better-scoring player outside that set
+    # could be swapped in; "greedy" picks pairs best-first from the same set.
+    # Slots are In Possession roles, so only those columns are looked up.
+    role_columns = {
+        role: col
+        for col, (phase, role) in enumerate(zip(role_scores["phases"], role_scores["roles"]))
+        if phase == "In Possession"
+    }
+    slot_columns = np.array([role_columns[role] for role in slot_roles])
+
+    if method == "optimal":
+        candidates = np.arange(len(role_scores["players"]))
+    else:
+        per_role = len(slot_columns) * depth
+        candidates = np.unique(np.concatenate([
+            top_players_for_role(role_scores, col, per_role) for col in np.unique(slot_columns)
+        ]))
+
+    slot_scores = role_scores["scores"][candidates][:, slot_columns]
+    eligible = ~np.isnan(slot_scores)
+    slot_scores = np.where(eligible, slot_scores, INELIGIBLE_SCORE)
+    available = np.ones(len(candidates), dtype=bool)
+    picks = []
+
+    # Depth 1 is the starting XI; each further level re-solves the slots
+    # without the players already picked.
+    for level in range(1, depth + 1):
+        rows = np.flatnonzero(available)
+        if len(rows) == 0:
+            chosen_rows = chosen_slots = np.array([], dtype=int)
+        elif method == "greedy":
+            chosen_rows, chosen_slots = greedy_assignment(slot_scores[rows])
+        else:
+            chosen_rows, chosen_slots = linear_sum_assignment(slot_scores[rows], maximize=True)
+
+        # A slot nobody left can play, or left over when there are fewer
+        # players than slots, stays empty (no player, NaN score).
+        filled = {
+            slot: row for row, slot in zip(rows[chosen_rows], chosen_slots) if eligible[row, slot]
+        }
+        available[list(filled.values())] = False
+        for slot, role in enumerate(slot_roles):
+            row = filled.get(slot)
+            picks.append({
+                "Slot": slot + 1,
+                "Depth": level,
+                "Role": role,
+                "Player": role_scores["players"][candidates[row]] if row is not None else None,
+                "Score": slot_scores[row, slot] if row is not None else np.nan,
+            })
+
+    return pd.DataFrame(picks, columns=["Slot", "Depth", "Role", "Player", "Score"]).sort_values(
+        ["Slot", "Depth"]
+    ).reset_index(drop=True)
@@ -0,0 +1,300 @@
+import io
+
+import numpy as np
+import pandas as pd
+from lxml import etree
+
+from instrumentation import timed
+from roles import all_attributes, all_positions_mask, column_map, position_bits
+
+# Large CSV uploads are parsed this many rows at a time.
+CSV_CHUNK_ROWS = 100_000
+
+# HTML exports are read into Python strings, so they are compacted every
+# this many rows rather than at the end.
+HTML_CHUNK_ROWS = 5_000
+
+# Non-attribute columns kept when an upload is read in compact mode.
+kept_columns = ["Name", "Best Pos", "Position"]
+
+# Possible attribute values, used as the bounds of an unscouted ("-") cell.
+ATTRIBUTE_MIN = 1
+ATTRIBUTE_MAX = 20
+
+
+def compact_numbers(series):
+    # Attributes are whole numbers from 1 to 20, so they fit in uint8. Anything
+    # else (fractional or out-of-range values) is kept as float32.
+    if series.dtype in (np.uint8, np.float32):
+        return series
+
+    values = pd.to_numeric(series, errors="coerce").fillna(0).to_numpy(dtype="float32")
+    if ((values >= 0) & (values <= 255) & (values == np.round(values))).all():
+        return pd.Series(values.astype(np.uint8), index=series.index, name=series.name)
+    return pd.Series(values, index=series.index, name=series.name)
+
+
+def resolve_columns(header):
+    # Map the raw upload headers to the columns the app uses, keeping the
+    # first header when several aliases resolve to the same column.
+    wanted = set(kept_columns) | set(all_attributes)
+    resolved = {}
+    for raw in header:
+        name = column_map.get(str(raw).strip(), str(raw).strip())
+        if name in wanted and name not in resolved.values():
+            resolved[raw] = name
+    return resolved
+
+
+def bound_columns(attr):
+    return f"{attr} (min)", f"{attr} (max)"
+
+
+def parse_attribute_cells(values):
+    # Lowest and highest possible value of every cell in a 2-D array of raw
+    # attribute cells: "14" -> (14, 14), a scouting range "12-15" -> (12, 15),
+    # unscouted "-" -> (ATTRIBUTE_MIN, ATTRIBUTE_MAX). Anything else counts as
+    # 0, as plain numeric coercion always did. An export only has a few
+    # hundred distinct cells, so each distinct cell is parsed once.
+    codes, uniques = pd.factorize(values.ravel())
+    cells = pd.Series(uniques, dtype=object)
+    low = pd.to_numeric(cells, errors="coerce").to_numpy(dtype="float64", copy=True)
+    high = low.copy()
+
+    text_rows = np.flatnonzero(np.isnan(low))
+    if len(text_rows):
+        text = cells.iloc[text_rows].astype(str).str.strip()
+        parts = text.str.partition("-")
+        range_low = pd.to_numeric(parts[0], errors="coerce").to_numpy(dtype="float64")
+        range_high = pd.to_numeric(parts[2], errors="coerce").to_numpy(dtype="float64")
+        unscouted = (text == "-").to_numpy()
+        low[text_rows] = np.where(unscouted, ATTRIBUTE_MIN, range_low)
+        high[text_rows] = np.where(unscouted, ATTRIBUTE_MAX, range_high)
+
+    unparsed = np.isnan(low) | np.isnan(high)
+    low[unparsed] = 0
+    high[unparsed] = 0
+
+    # Missing cells have code -1, which picks the trailing 0.
+    low = np.append(low, 0)[codes]
+    high = np.append(high, 0)[codes]
+    return low.reshape(values.shape), high.reshape(values.shape)
+
+
+def compact_chunk(df):
+    # Numeric attribute columns are only compacted. Text columns are parsed
+    # in one pass: a range is stored as its midpoint (10.5 for unscouted, so
+    # every role still gets a score) plus "(min)"/"(max)" bound columns,
+    # which are only added when the column has masked cells.
+    text_columns = []
+    for attr in all_attributes:
+        if attr not in df.columns:
+            continue
+        if pd.api.types.is_numeric_dtype(df[attr]):
+            df[attr] = compact_numbers(df[attr])
+        else:
+            text_columns.append(attr)
+
+    if not text_columns:
+        return df
+
+    low, high = parse_attribute_cells(df[text_columns].to_numpy(dtype=object))
+    masked = low != high
+    middle = (low + high) / 2
+
+    for i, attr in enumerate(text_columns):
+        if masked[:, i].any():
+            low_column, high_column = bound_columns(attr)
+            df[attr] = middle[:, i].astype(np.float32)
+            df[low_column] = low[:, i].astype(np.float32)
+            df[high_column] = high[:, i].astype(np.float32)
+        else:
+            df[attr] = compact_numbers(pd.Series(low[:, i], index=df.index, name=attr))
+    return df
+
+
+def attribute_bounds(df, attributes=all_attributes):
+    # Lowest and highest possible value of each attribute as float64
+    # matrices (rows as in df), or None when no cell in df is masked.
+    if not any(bound_columns(attr)[0] in df.columns for attr in attributes):
+        return None
+
+    low = df[attributes].to_numpy(dtype="float64")
+    high = low.copy()
+    for i, attr in enumerate(attributes):
+        low_column, high_column = bound_columns(attr)
+        if low_column in df.columns:
+            column_low = df[low_column].to_numpy(dtype="float64")
+            # Chunks without masked cells have no bounds (NaN) after concat.
+            has_bounds = ~np.isnan(column_low)
+            low[has_bounds, i] = column_low[has_bounds]
+            high[has_bounds, i] = df[high_column].to_numpy(dtype="float64")[has_bounds]
+    return low, high
+
+
+def unscouted_cells(df, attributes=all_attributes):
+    # Boolean rows x attributes matrix of unscouted cells (bounds spanning
+    # every possible value), or None when no cell in df is masked.
+    bounds = attribute_bounds(df, attributes)
+    if bounds is None:
+        return None
+    low, high = bounds
+    return (low == ATTRIBUTE_MIN) & (high == ATTRIBUTE_MAX)
+
+
+def cell_text(cell):
+    # Most cells are plain text; only nested markup needs the slower itertext.
+    if len(cell) == 0:
+        return (cell.text or "").strip()
+    return "".join(cell.itertext()).strip()
+
+
+def read_html_export(data, compact=True):
+    # Streams the <tr> rows of Football Manager's HTML "Print Screen" export
+    # straight into per-column lists, freeing each row as soon as it is read.
+    # Every HTML_CHUNK_ROWS rows the lists become a (compact) frame.
+    header = None
+    positions = {}
+    columns = {}
+    chunks = []
+    row_count = 0
+
+    def flush():
+        df = pd.DataFrame(columns)
+        chunks.append(compact_chunk(df) if compact else df)
+        for values in columns.values():
+            values.clear()
+
+    for _, row in etree.iterparse(io.BytesIO(data), events=("end",), tag="tr", html=True):
+        cells = [cell for cell in row if cell.tag in ("th", "td")]
+
+        if header is None and cells:
+            header = [cell_text(cell) for cell in cells]
+            if compact:
+                resolved = resolve_columns(header)
+                positions = {header.index(raw): name for raw, name in resolved.items()}
+            else:
+                positions = {i: column_map.get(raw, raw) for i, raw in enumerate(header)}
+            if compact and "Name" not in positions.values():
+                # Only the header is returned, so the rows are not kept.
+                positions = {}
+            columns = {name: [] for name in positions.values()}
+        elif cells and positions:
+            for i, name in positions.items():
+                columns[name].append(cell_text(cells[i]) if i < len(cells) else None)
+            row_count += 1
+            if row_count % HTML_CHUNK_ROWS == 0:
+                flush()
+
+        row.clear()
+        while row.getprevious() is not None:
+            del row.getparent()[0]
+
+    if header is None:
+        raise ValueError("No table found in the HTML file.")
+
+    if compact and "Name" not in columns:
+        return pd.DataFrame(columns=[column_map.get(raw, raw) for raw in header])
+
+    if row_count % HTML_CHUNK_ROWS or not chunks:
+        flush()
+    return pd.concat(chunks, ignore_index=True)
+
+
+@timed("read_upload")
+def read_upload(data, filename, compact=True):
+    if filename.lower().endswith((".html", ".htm")):
+        return read_html_export(data, compact=compact)
+
+    is_csv = filename.lower().endswith(".csv")
+    reader = pd.read_csv if is_csv else pd.read_excel
+
+    if not compact:
+        df = reader(io.BytesIO(data))
+        df.columns = df.columns.str.strip()
+        return df.rename(columns=column_map)
+
+    header = reader(io.BytesIO(data), nrows=0)
+    resolved = resolve_columns(header.columns)
+
+    if "Name" not in resolved.values():
+        # Return the full header so the caller can report what was found.
+        header.columns = header.columns.str.strip()
+        return header.rename(columns=column_map)
+
+    usecols = list(resolved)
+    if is_csv:
+        chunks = pd.read_csv(io.BytesIO(data), usecols=usecols, chunksize=CSV_CHUNK_ROWS)
+        df = pd.concat([compact_chunk(chunk.rename(columns=resolved)) for chunk in chunks], ignore_index=True)
+    else:
+        df = compact_chunk(pd.read_excel(io.BytesIO(data), usecols=usecols).rename(columns=resolved))
+
+    return df
+
+
+def upload_chunks(data, filename, chunk_rows=CSV_CHUNK_ROWS):
+    # The upload as compact frames of at most chunk_rows rows. CSV is read
+    # incrementally; other formats are parsed whole and then split. Without
+    # a name column, yields just the header (as read_upload returns it).
+    if not filename.lower().endswith(".csv"):
+        df = read_upload(data, filename)
+        for start in range(0, max(len(df), 1), chunk_rows):
+            yield df.iloc[start:start + chunk_rows]
+        return
+
+    header = pd.read_csv(io.BytesIO(data), nrows=0)
+    resolved = resolve_columns(header.columns)
+    if "Name" not in resolved.values():
+        header.columns = header.columns.str.strip()
+        yield header.rename(columns=column_map)
+        return
+
+    for chunk in pd.read_csv(io.BytesIO(data), usecols=list(resolved), chunksize=chunk_rows):
+        yield compact_chunk(chunk.rename(columns=resolved))
+
+
+@timed("prepare_attributes", rows=lambda result: len(result[0]))
+def prepare_attributes(df):
+    df = df.copy()
+    missing_attributes = [attr for attr in all_attributes if attr not in df.columns]
+
+    for attr in missing_attributes:
+        df[attr] = np.uint8(0)
+
+    return filter_goalkeepers(compact_chunk(df)), missing_attributes
+
+
+def position_mask(text):
+    # Bitmask of the positions in an FM position string such as
+    # "D/WB (R), DM, M (LC)". Strings with no recognisable position get
+    # every bit, so those players are still scored for every role.
+    mask = 0
+    for group in str(text).upper().split(","):
+        names, _, sides = group.partition("(")
+        sides = sides.strip(" )") or "C"
+        for name in names.split("/"):
+            name = name.strip()
+            if name in position_bits:
+                mask |= position_bits[name]
+                continue
+            for side in sides:
+                mask |= position_bits.get(f"{name} ({side})", 0)
+    return mask or all_positions_mask
+
+
+def player_positions(df):
+    # Position bitmask per row, from "Position" (every position a player can
+    # play) or else "Best Pos". None when the upload has neither. Each
+    # distinct string is parsed once.
+    column = "Position" if "Position" in df.columns else "Best Pos"
+    if column not in df.columns:
+        return None
+    codes, uniques = pd.factorize(df[column])
+    masks = np.array([position_mask(text) for text in uniques] + [all_positions_mask], dtype=np.uint16)
+    return masks[codes]
+
+
+def filter_goalkeepers(df):
+    if "Best Pos" not in df.columns:
+        return df
+    return df[~df["Best Pos"].astype(str).str.contains("GK", case=False, na=False)]
@@ -0,0 +1,202 @@
+import numpy as np
+import pandas as pd
+
+from instrumentation import stage, timed
+from loading import ATTRIBUTE_MAX, ATTRIBUTE_MIN, attribute_bounds
+from roles import all_attributes, role_attributes
+from scoring import compile_role_weights
+
+# Default number of simulated attribute draws and the 1-point noise FM
+# attributes are usually assumed to carry.
+SIMULATION_DRAWS = 1_000
+ATTRIBUTE_NOISE = 1
+
+# Players per block when bounding scores, and simulated attribute cells
+# (draws x players x attributes) per batch of draws.
+SIMULATION_BLOCK_ROWS = 65_536
+SIMULATION_BATCH_CELLS = 8_000_000
+
+# Simulated scores are rounded to two decimals (in float32), and a rounded
+# tie can go to a player whose exact score is lower, so candidates are kept
+# down to this far below the pruning threshold.
+TIE_MARGIN = 0.02
+
+
+def linear_role_weights(weights):
+    # Attributes x roles matrix with score = values @ matrix once every
+    # attribute is known, as in a simulated draw.
+    key_counts = weights["key"].sum(axis=0)
+    preferred_counts = weights["preferred"].sum(axis=0)
+    key = weights["key"] / np.maximum(key_counts, 1)
+    preferred = weights["preferred"] / np.maximum(preferred_counts, 1)
+    return np.where(
+        preferred_counts > 0,
+        key * weights["key_share"] + preferred * weights["preferred_share"],
+        key
+    )
+
+
+def column_weights(role_scores, custom_roles=None):
+    # linear_role_weights for every column of role_scores, custom roles
+    # (validated definitions) included.
+    custom_roles = custom_roles or {}
+    return np.hstack([
+        linear_role_weights(compile_role_weights({
+            phase: {role: custom_roles.get(phase, {}).get(role) or role_attributes[phase][role]}
+        }))
+        for phase, role in zip(role_scores["phases"], role_scores["roles"])
+    ])
+
+
+def attribute_ranges(df, rows, noise=ATTRIBUTE_NOISE):
+    # Lowest and highest whole value each attribute of the given rows (upload
+    # positions) can take: a scouting range as shown, an unscouted cell 1-20
+    # and an exact value +/- noise within 1-20. Attributes missing from the
+    # upload (0) stay fixed.
+    block = df.iloc[rows]
+    bounds = attribute_bounds(block)
+    if bounds is None:
+        values = block[all_attributes].to_numpy(dtype="float64")
+        bounds = (values, values)
+    low, high = bounds
+    noisy = (low == high) & (low >= ATTRIBUTE_MIN)
+    return (
+        np.where(noisy, np.maximum(low - noise, ATTRIBUTE_MIN), low),
+        np.where(noisy, np.minimum(high + noise, ATTRIBUTE_MAX), high),
+    )
+
+
+def score_moments(low, high, linear):
+    # Expected score and standard deviation of every role when each
+    # attribute is drawn uniformly from the whole numbers low..high,
+    # independently. Scores are linear in the attributes, so both are exact
+    # for the simulated distribution rather than estimated from draws.
+    means = (low + high) / 2
+    variances = ((high - low + 1) ** 2 - 1) / 12
+    return means @ linear, np.sqrt(variances @ linear ** 2)
+
+
+def top_n_candidates(df, role_scores, linear, top_n, noise, block_rows=SIMULATION_BLOCK_ROWS):
+    # Players (role_scores order) x roles who can reach a role's top N in
+    # some draw. Every draw has at least N players scoring at or above the
+    # N-th best lowest possible score, so a player whose highest possible
+    # score is below it (by more than TIE_MARGIN) never makes the top N and
+    # needs no simulation.
+    player_count, role_count = role_scores["scores"].shape
+    best_lows = np.full((0, role_count), -np.inf)
+    rows = []
+    highs = []
+
+    for start in range(0, player_count, block_rows):
+        block = slice(start, start + block_rows)
+        eligible = ~np.isnan(role_scores["scores"][block])
+        low, high = attribute_ranges(df, role_scores["rows"][block], noise)
+        low_scores = np.where(eligible, low @ linear, -np.inf)
+        high_scores = np.where(eligible, high @ linear, -np.inf)
+
+        best_lows = np.vstack([best_lows, low_scores])
+        if len(best_lows) > top_n:
+            best_lows = -np.partition(-best_lows, top_n - 1, axis=0)[:top_n]
+        threshold = best_lows.min(axis=0) if len(best_lows) == top_n else np.full(role_count, -np.inf)
+
+        keep = ((high_scores >= threshold - TIE_MARGIN) & eligible).any(axis=1)
+        rows.append(start + np.flatnonzero(keep))
+        highs.append(high_scores[keep])
+
+    threshold = best_lows.min(axis=0) if len(best_lows) == top_n else np.full(role_count, -np.inf)
+    rows = np.concatenate(rows)
+    highs = np.vstack(highs)
+    candidates = (highs >= threshold - TIE_MARGIN) & np.isfinite(highs)
+    keep = candidates.any(axis=1)
+    return rows[keep], candidates[keep]
+
+
+def top_n_mask(scores, top_n):
+    # True for the top N players (columns) of each draw (row), ties going to
+    # the player listed first. Found by partition rather than a full sort.
+    if scores.shape[1] <= top_n:
+        return np.ones(scores.shape, dtype=bool)
+    nth = -np.partition(-scores, top_n - 1, axis=1)[:, top_n - 1:top_n]
+    above = scores > nth
+    tied = scores == nth
+    room = top_n - above.sum(axis=1)
+    placed = above | tied
+    # Only draws with more ties than places left need the tie-break.
+    draws = np.flatnonzero(tied.sum(axis=1) > room)
+    if len(draws):
+        ties = tied[draws]
+        placed[draws] = above[draws] | (ties & (np.cumsum(ties, axis=1) <= room[draws, None]))
+    return placed
+
+
+@timed("simulate_top_n", rows=lambda result: len(result["rows"]))
+def simulate_top_n(df, role_scores, linear, top_n=5, draws=SIMULATION_DRAWS, noise=ATTRIBUTE_NOISE,
+                   seed=0, progress=None):
+    # Monte Carlo robustness of the rankings. Each draw perturbs the
+    # attributes of a role's contenders (see attribute_ranges and
+    # top_n_candidates), scores them all with one matrix product and takes
+    # the top N. Simulated scores are rounded to two decimals like the real
+    # ones, so equal scores tie exactly and go to the player listed first in
+    # the upload. Roles are simulated separately, since each probability only depends on its
+    # own role. Returns the players (role_scores rows) with a chance of a
+    # top-N place in some role, their probability of it per role (NaN where
+    # they cannot play the role) and their expected score and spread.
+    # Everyone else has probability 0. progress(done, total) is called after
+    # each role and can raise to stop the job.
+    rows, candidates = top_n_candidates(df, role_scores, linear, top_n, noise)
+    order = np.argsort(role_scores["rows"][rows], kind="stable")
+    rows, candidates = rows[order], candidates[order]
+    low, high = attribute_ranges(df, role_scores["rows"][rows], noise)
+    expected, spread = score_moments(low, high, linear)
+
+    counts = np.zeros(candidates.shape, dtype=np.int64)
+    rng = np.random.default_rng(seed)
+    role_count = candidates.shape[1]
+
+    with stage("simulate_draws", rows=int(candidates.sum())):
+        for col in range(role_count):
+            players = np.flatnonzero(candidates[:, col])
+            used = np.flatnonzero(linear[:, col])
+            if len(players) == 0 or len(used) == 0:
+                continue
+            role_low = low[np.ix_(players, used)].astype(np.float32)
+            role_widths = (high[np.ix_(players, used)] - role_low + 1).astype(np.float32)
+            role_weights = linear[used, col]
+            batch_draws = max(1, SIMULATION_BATCH_CELLS // role_low.size)
+
+            for done in range(0, draws, batch_draws):
+                shape = (min(batch_draws, draws - done),) + role_low.shape
+                values = role_low + np.floor(rng.random(shape, dtype=np.float32) * role_widths)
+                counts[players, col] += top_n_mask((values @ role_weights).round(2), top_n).sum(axis=0)
+            if progress is not None:
+                progress(col + 1, role_count)
+
+    eligible = ~np.isnan(role_scores["scores"][rows])
+    return {
+        "rows": rows,
+        "probabilities": np.where(eligible, counts / max(draws, 1), np.nan).astype(np.float32),
+        "expected": np.where(eligible, expected, np.nan).astype(np.float32),
+        "spread": np.where(eligible, spread, np.nan).astype(np.float32),
+        "top_n": top_n,
+        "draws": draws,
+    }
+
+
+def robustness_results(role_scores, robustness, columns):
+    # One row per player and role (of `columns`) with a chance of a top-N
+    # place, next to the player's actual score and rank.
+    probabilities = robustness["probabilities"][:, columns]
+    player_rows, role_columns = np.nonzero(probabilities > 0)
+    rows = robustness["rows"][player_rows]
+    cols = np.asarray(columns)[role_columns]
+    return pd.DataFrame({
+        "Player": role_scores["players"][rows],
+        "Phase": role_scores["phases"][cols],
+        "Area": role_scores["areas"][cols],
+        "Role": role_scores["roles"][cols],
+        "Score": role_scores["scores"][rows, cols],
+        "Rank": role_scores["ranks"][rows, cols],
+        "Expected Score": robustness["expected"][player_rows, cols],
+        "Spread": robustness["spread"][player_rows, cols],
+        f"P(Top {robustness['top_n']})": probabilities[player_rows, role_columns],
+    })
@@ -0,0 +1,439 @@
+import hashlib
+import json
+
+column_map = {
+    "Player": "Name",
+    "Decisions": "Dec",
+    "Long Throws": "L Th",
+    "Passing": "Pas",
+    "Technique": "Tec",
+    "Tackling": "Tck",
+    "Penalty Taking": "Pen",
+    "Marking": "Mar",
+    "Long Shots": "Lon",
+    "Heading": "Hea",
+    "Crossing": "Cro",
+    "First Touch": "Fir",
+    "Free Kick Taking": "Fre",
+    "Finishing": "Fin",
+    "Dribbling": "Dri",
+    "Corners": "Cor",
+    "Acceleration": "Acc",
+    "Work Rate": "Wor",
+    "Vision": "Vis",
+    "Team Work": "Tea",
+    "Teamwork": "Tea",
+    "Positioning": "Pos",
+    "Off The Ball": "OtB",
+    "Off the Ball": "OtB",
+    "Leadership": "Ldr",
+    "Flair": "Fla",
+    "Determination": "Det",
+    "Concentration": "Cnt",
+    "Composure": "Cmp",
+    "Bravery": "Bra",
+    "Anticipation": "Ant",
+    "Aggression": "Agg",
+    "Agility": "Agi",
+    "Balance": "Bal",
+    "Jumping Reach": "Jum",
+    "Jumping": "Jum",
+    "Natural Fitness": "Nat",
+    "Pace": "Pac",
+    "Stamina": "Sta",
+    "Strength": "Str"
+}
+
+# Role attributes are split into In Possession and Out of Possession.
+# Scoring uses 80% Key attributes and 20% Preferred attributes.
+# Roles with no Preferred attributes are scored from Key attributes only.
+role_attributes = {
+    "In Possession": {
+        # Centre-Backs
+        "Centre-Back": {
+            "key": ["Hea", "Mar", "Tck", "Ant", "Pos", "Jum", "Str"],
+            "preferred": ["Agg", "Bra", "Cmp", "Cnt", "Dec", "Pac"]
+        },
+        "Ball-Playing Centre-Back": {
+            "key": ["Hea", "Mar", "Pas", "Tck", "Ant", "Cmp", "Pos", "Jum", "Str"],
+            "preferred": ["Fir", "Tec", "Agg", "Bra", "Cnt", "Dec", "Vis", "Pac"]
+        },
+        "No-Nonsense Centre-Back": {
+            "key": ["Hea", "Mar", "Tck", "Ant", "Pos", "Jum", "Str"],
+            "preferred": ["Agg", "Bra", "Cnt", "Pac"]
+        },
+        "Wide Centre-Back": {
+            "key": ["Hea", "Mar", "Tck", "Ant", "Pos", "Jum", "Str"],
+            "preferred": ["Dri", "Agg", "Bra", "Cmp", "Cnt", "Dec", "Wor", "Acc", "Agi", "Pac", "Sta"]
+        },
+        "Advanced Centre-Back": {
+            "key": ["Hea", "Mar", "Pas", "Tck", "Tec", "Ant", "Cmp", "Dec", "Pos", "Tea", "Jum", "Str"],
+            "preferred": ["Dri", "Fir", "Agg", "Bra", "Cnt", "Vis", "Pac", "Sta"]
+        },
+        "Overlapping Centre-Back": {
+            "key": ["Cro", "Hea", "Mar", "Tck", "Ant", "Wor", "Jum", "Pac", "Sta", "Str"],
+            "preferred": ["Dri", "Tec", "Agg", "Bra", "Cmp", "Cnt", "Dec", "OtB", "Pos", "Acc", "Agi"]
+        },
+
+        # Full-Backs and Wing-Backs
+        "Full-Back": {
+            "key": ["Mar", "Tck", "Ant", "Cnt", "Pos", "Tea", "Acc"],
+            "preferred": ["Cro", "Dri", "Pas", "Tec", "Dec", "Wor", "Agi", "Pac", "Sta"]
+        },
+        "Inside Full-Back": {
+            "key": ["Hea", "Mar", "Tck", "Ant", "Pos", "Str"],
+            "preferred": ["Dri", "Agg", "Bra", "Cmp", "Cnt", "Dec", "Wor", "Acc", "Agi", "Jum", "Pac", "Sta"]
+        },
+        "Inside Wing-Back": {
+            "key": ["Pas", "Tck", "Ant", "Cmp", "Dec", "Pos", "Tea", "Acc"],
+            "preferred": ["Fir", "Mar", "Tec", "Cnt", "Wor", "Agi", "Pac", "Sta"]
+        },
+        "Playmaking Wing-Back": {
+            "key": ["Fir", "Pas", "Tck", "Tec", "Cmp", "Dec", "Pos", "Tea", "Vis", "Acc"],
+            "preferred": ["Cro", "Dri", "Mar", "Ant", "Cnt", "OtB", "Pos", "Wor", "Agi", "Pac", "Sta"]
+        },
+        "Wing-Back": {
+            "key": ["Cro", "Mar", "Tck", "Tea", "Wor", "Acc", "Pac", "Sta"],
+            "preferred": ["Dri", "Fir", "Pas", "Tec", "Ant", "Cnt", "Dec", "OtB", "Pos", "Agi", "Bal"]
+        },
+        "Advanced Wing-Back": {
+            "key": ["Cro", "Dri", "Tec", "OtB", "Tea", "Wor", "Acc", "Agi", "Pac", "Sta"],
+            "preferred": ["Fir", "Mar", "Pas", "Tck", "Ant", "Dec", "Fla", "Pos", "Bal"]
+        },
+
+        # Defensive Midfield
+        "Defensive Midfielder": {
+            "key": ["Tck", "Ant", "Cnt", "Pos", "Tea"],
+            "preferred": ["Fir", "Mar", "Pas", "Agg", "Cmp", "Dec", "Wor", "Sta", "Str"]
+        },
+        "Box-to-Box Midfielder": {
+            "key": ["Pas", "Tck", "OtB", "Tea", "Wor", "Sta"],
+            "preferred": ["Dri", "Fin", "Fir", "Lon", "Tec", "Agg", "Ant", "Cmp", "Dec", "Pos", "Acc", "Bal", "Pac", "Str"]
+        },
+        "Box-to-Box Playmaker": {
+            "key": ["Fir", "Pas", "Tec", "Cmp", "Dec", "OtB", "Tea", "Vis", "Wor", "Sta"],
+            "preferred": ["Dri", "Mar", "Tck", "Ant", "Pos", "Acc", "Agi", "Bal", "Pac"]
+        },
+        "Deep-Lying Playmaker": {
+            "key": ["Fir", "Pas", "Tec", "Cmp", "Dec", "OtB", "Tea", "Vis"],
+            "preferred": ["Mar", "Tck", "Ant", "Cnt", "Pos", "Wor", "Bal", "Sta"]
+        },
+        "Half-Back": {
+            "key": ["Hea", "Mar", "Tck", "Ant", "Cnt", "Pos", "Tea", "Jum", "Str"],
+            "preferred": ["Fir", "Pas", "Agg", "Bra", "Cmp", "Dec", "Wor", "Sta"]
+        },
+
+        # Central Midfield
+        "Central Midfielder": {
+            "key": ["Fir", "Pas", "Tck", "Dec", "Tea"],
+            "preferred": ["Tec", "Ant", "Cmp", "Cnt", "OtB", "Pos", "Vis", "Wor", "Sta"]
+        },
+        "Advanced Playmaker": {
+            "key": ["Fir", "Pas", "Tec", "Cmp", "Dec", "OtB", "Tea", "Vis"],
+            "preferred": ["Cro", "Dri", "Ant", "Fla", "Acc", "Agi"]
+        },
+        "Midfield Playmaker": {
+            "key": ["Fir", "Pas", "Tec", "Cmp", "Dec", "OtB", "Tea", "Vis"],
+            "preferred": ["Dri", "Tck", "Ant", "Fla", "Pos", "Wor", "Agi", "Sta"]
+        },
+        "Wide Central Midfielder": {
+            "key": ["Fir", "Pas", "Tck", "Dec", "Tea"],
+            "preferred": ["Cro", "Dri", "Tec", "Ant", "Cmp", "Cnt", "OtB", "Pos", "Vis", "Wor", "Agi", "Sta"]
+        },
+
+        # Wide Midfield and Wingers
+        "Wide Midfielder": {
+            "key": ["Cro", "Pas", "Tec", "Tea", "Wor", "Pac", "Sta"],
+            "preferred": ["Dri", "Fir", "Ant", "Cmp", "OtB", "Vis", "Acc", "Agi"]
+        },
+        "Inside Winger": {
+            "key": ["Dri", "Fir", "Tec", "Cmp", "Tea", "Acc", "Agi"],
+            "preferred": ["Cro", "Lon", "Pas", "Ant", "Fla", "OtB", "Vis", "Wor", "Bal", "Pac", "Sta"]
+        },
+        "Playmaking Winger": {
+            "key": ["Cro", "Dri", "Fir", "Pas", "Tec", "Cmp", "Dec", "OtB", "Tea", "Vis", "Acc"],
+            "preferred": ["Ant", "Fla", "Wor", "Agi", "Pac", "Sta"]
+        },
+        "Winger": {
+            "key": ["Cro", "Dri", "Tec", "Tea", "Acc", "Agi", "Pac"],
+            "preferred": ["Fir", "Pas", "Ant", "Fla", "OtB", "Wor", "Bal", "Sta"]
+        },
+
+        # Attacking Midfield
+        "Attacking Midfielder": {
+            "key": ["Fir", "Lon", "Pas", "Tec", "Cmp", "Fla", "OtB"],
+            "preferred": ["Cro", "Dri", "Fin", "Ant", "Dec", "Vis", "Acc", "Agi"]
+        },
+        "Channel Midfielder": {
+            "key": ["Cro", "Fir", "Pas", "Tec", "Cmp", "OtB", "Wor", "Acc"],
+            "preferred": ["Dri", "Lon", "Ant", "Dec", "Fla", "Vis", "Agi", "Pac", "Sta"]
+        },
+        "Free Role": {
+            "key": ["Dri", "Fir", "Lon", "Pas", "Tec", "Cmp", "Fla", "OtB", "Vis"],
+            "preferred": ["Cro", "Fin", "Ant", "Dec", "Acc", "Agi"]
+        },
+        "Second Striker": {
+            "key": ["Fin", "Fir", "Ant", "Cmp", "OtB", "Acc"],
+            "preferred": ["Dri", "Lon", "Pas", "Tec", "Cnt", "Dec", "Wor", "Agi", "Pac", "Sta"]
+        },
+
+        # Wide Forwards
+        "Wide Forward": {
+            "key": ["Dri", "Fir", "Tec", "Ant", "OtB", "Acc", "Agi", "Pac"],
+            "preferred": ["Cro", "Fin", "Pas", "Cmp", "Fla", "Wor", "Bal", "Sta"]
+        },
+        "Inside Forward": {
+            "key": ["Dri", "Fir", "Tec", "Ant", "Cmp", "OtB", "Acc", "Agi"],
+            "preferred": ["Cro", "Fin", "Lon", "Pas", "Fla", "Vis", "Wor", "Bal", "Pac", "Sta"]
+        },
+
+        # Centre Forwards
+        "Centre Forward": {
+            "key": ["Fin", "Fir", "Hea", "Tec", "Cmp", "OtB", "Acc", "Str"],
+            "preferred": ["Dri", "Pas", "Ant", "Dec", "Agi", "Bal", "Jum", "Pac"]
+        },
+        "Channel Forward": {
+            "key": ["Dri", "Fin", "Fir", "Tec", "Cmp", "OtB", "Wor", "Acc"],
+            "preferred": ["Cro", "Hea", "Pas", "Ant", "Dec", "Agi", "Bal", "Pac", "Sta"]
+        },
+        "Deep-Lying Forward": {
+            "key": ["Fin", "Fir", "Tec", "Cmp", "OtB", "Str"],
+            "preferred": ["Dri", "Pas", "Ant", "Dec", "Tea", "Vis", "Bal"]
+        },
+        "False Nine": {
+            "key": ["Dri", "Fir", "Pas", "Tec", "Cmp", "Dec", "OtB", "Tea", "Vis", "Acc"],
+            "preferred": ["Fin", "Ant", "Fla", "Agi", "Bal"]
+        },
+        "Poacher": {
+            "key": ["Fin", "Hea", "Ant", "Cmp", "Cnt", "OtB", "Acc"],
+            "preferred": ["Fir", "Tec", "Dec", "Bal"]
+        },
+        "Target Forward": {
+            "key": ["Fin", "Hea", "Agg", "Bra", "Cmp", "OtB", "Bal", "Jum", "Str"],
+            "preferred": ["Fir", "Ant", "Dec", "Tea"]
+        },
+    },
+    "Out of Possession": {
+        "Covering Centre-Back": {"key": ["Ant", "Pac", "Mar"], "preferred": []},
+        "Stopping Centre-Back": {"key": ["Agg", "Tck", "Str"], "preferred": []},
+        "Covering Wide Centre-Back": {"key": ["Ant", "Pac", "Mar"], "preferred": []},
+        "Stopping Wide Centre-Back": {"key": ["Agg", "Tck", "Str"], "preferred": []},
+        "Holding Full-Back": {"key": ["Pos", "Cnt", "Mar"], "preferred": []},
+        "Pressing Full-Back": {"key": ["Agg", "Wor", "Ant"], "preferred": []},
+        "Holding Wing-Back": {"key": ["Pos", "Cnt", "Mar"], "preferred": []},
+        "Pressing Wing-Back": {"key": ["Agg", "Wor", "Ant"], "preferred": []},
+        "Dropping Defensive Midfielder": {"key": ["Pos", "Dec", "Ant"], "preferred": []},
+        "Pressing Defensive Midfielder": {"key": ["Agg", "Wor", "Ant"], "preferred": []},
+        "Screening Defensive Midfielder": {"key": ["Pos", "Cnt", "Mar"], "preferred": []},
+        "Wide Covering Defensive Midfielder": {"key": ["Ant", "Pac", "Wor"], "preferred": []},
+        "Pressing Central Midfielder": {"key": ["Agg", "Wor", "Ant"], "preferred": []},
+        "Screening Central Midfielder": {"key": ["Pos", "Cnt", "Mar"], "preferred": []},
+        "Wide Covering Central Midfielder": {"key": ["Ant", "Pac", "Wor"], "preferred": []},
+        "Tracking Wide Midfielder": {"key": ["Mar", "Wor", "Sta"], "preferred": []},
+        "Wide Outlet Wide Midfielder": {"key": ["OtB", "Pac", "Ant"], "preferred": []},
+        "Central Outlet Attacking Midfielder": {"key": ["OtB", "Dec", "Ant"], "preferred": []},
+        "Splitting Outlet Attacking Midfielder": {"key": ["OtB", "Pac", "Ant"], "preferred": []},
+        "Tracking Attacking Midfielder": {"key": ["Mar", "Wor", "Sta"], "preferred": []},
+        "Inside Outlet Winger": {"key": ["OtB", "Dec", "Ant"], "preferred": []},
+        "Tracking Winger": {"key": ["Mar", "Wor", "Sta"], "preferred": []},
+        "Wide Outlet Winger": {"key": ["OtB", "Pac", "Ant"], "preferred": []},
+        "Central Outlet Centre Forward": {"key": ["OtB", "Dec", "Ant"], "preferred": []},
+        "Splitting Outlet Centre Forward": {"key": ["OtB", "Pac", "Ant"], "preferred": []},
+        "Tracking Centre Forward": {"key": ["Mar", "Wor", "Sta"], "preferred": []},
+    }
+}
+
+role_groups = {
+    role: phase
+    for phase, roles in role_attributes.items()
+    for role in roles.keys()
+}
+
+
+role_area_groups = {
+    # Defensive roles
+    "Centre-Back": "Defensive",
+    "Ball-Playing Centre-Back": "Defensive",
+    "No-Nonsense Centre-Back": "Defensive",
+    "Wide Centre-Back": "Defensive",
+    "Advanced Centre-Back": "Defensive",
+    "Overlapping Centre-Back": "Defensive",
+    "Full-Back": "Defensive",
+    "Inside Full-Back": "Defensive",
+    "Inside Wing-Back": "Defensive",
+    "Playmaking Wing-Back": "Defensive",
+    "Wing-Back": "Defensive",
+    "Advanced Wing-Back": "Defensive",
+    "Covering Centre-Back": "Defensive",
+    "Stopping Centre-Back": "Defensive",
+    "Covering Wide Centre-Back": "Defensive",
+    "Stopping Wide Centre-Back": "Defensive",
+    "Holding Full-Back": "Defensive",
+    "Pressing Full-Back": "Defensive",
+    "Holding Wing-Back": "Defensive",
+    "Pressing Wing-Back": "Defensive",
+
+    # Midfield roles
+    "Defensive Midfielder": "Midfield",
+    "Box-to-Box Midfielder": "Midfield",
+    "Box-to-Box Playmaker": "Midfield",
+    "Deep-Lying Playmaker": "Midfield",
+    "Half-Back": "Midfield",
+    "Central Midfielder": "Midfield",
+    "Advanced Playmaker": "Midfield",
+    "Midfield Playmaker": "Midfield",
+    "Wide Central Midfielder": "Midfield",
+    "Wide Midfielder": "Midfield",
+    "Inside Winger": "Midfield",
+    "Playmaking Winger": "Midfield",
+    "Winger": "Midfield",
+    "Dropping Defensive Midfielder": "Midfield",
+    "Pressing Defensive Midfielder": "Midfield",
+    "Screening Defensive Midfielder": "Midfield",
+    "Wide Covering Defensive Midfielder": "Midfield",
+    "Pressing Central Midfielder": "Midfield",
+    "Screening Central Midfielder": "Midfield",
+    "Wide Covering Central Midfielder": "Midfield",
+    "Tracking Wide Midfielder": "Midfield",
+    "Wide Outlet Wide Midfielder": "Midfield",
+
+    # Attacking roles
+    "Attacking Midfielder": "Attacking",
+    "Channel Midfielder": "Attacking",
+    "Free Role": "Attacking",
+    "Second Striker": "Attacking",
+    "Wide Forward": "Attacking",
+    "Inside Forward": "Attacking",
+    "Centre Forward": "Attacking",
+    "Channel Forward": "Attacking",
+    "Deep-Lying Forward": "Attacking",
+    "False Nine": "Attacking",
+    "Poacher": "Attacking",
+    "Target Forward": "Attacking",
+    "Central Outlet Attacking Midfielder": "Attacking",
+    "Splitting Outlet Attacking Midfielder": "Attacking",
+    "Tracking Attacking Midfielder": "Attacking",
+    "Inside Outlet Winger": "Attacking",
+    "Tracking Winger": "Attacking",
+    "Wide Outlet Winger": "Attacking",
+    "Central Outlet Centre Forward": "Attacking",
+    "Splitting Outlet Centre Forward": "Attacking",
+    "Tracking Centre Forward": "Attacking",
+}
+
+area_order = ["Defensive", "Midfield", "Attacking"]
+
+# Positions as Football Manager writes them in "Best Pos" / "Position".
+positions = [
+    "GK",
+    "D (L)", "D (C)", "D (R)",
+    "WB (L)", "WB (R)",
+    "DM",
+    "M (L)", "M (C)", "M (R)",
+    "AM (L)", "AM (C)", "AM (R)",
+    "ST (C)",
+]
+
+position_bits = {position: 1 << i for i, position in enumerate(positions)}
+all_positions_mask = (1 << len(positions)) - 1
+
+# Positions each role can be played from. Roles not listed here (such as
+# custom roles without "positions") are open to every position.
+centre_back_positions = ["D (C)"]
+full_back_positions = ["D (L)", "D (R)"]
+wing_back_positions = ["D (L)", "D (R)", "WB (L)", "WB (R)"]
+wide_midfield_positions = ["M (L)", "M (R)"]
+winger_positions = ["M (L)", "M (R)", "AM (L)", "AM (R)"]
+wide_forward_positions = ["AM (L)", "AM (R)"]
+striker_positions = ["ST (C)"]
+
+role_positions = {
+    # Defenders
+    "Centre-Back": centre_back_positions,
+    "Ball-Playing Centre-Back": centre_back_positions,
+    "No-Nonsense Centre-Back": centre_back_positions,
+    "Wide Centre-Back": centre_back_positions,
+    "Advanced Centre-Back": centre_back_positions,
+    "Overlapping Centre-Back": centre_back_positions,
+    "Covering Centre-Back": centre_back_positions,
+    "Stopping Centre-Back": centre_back_positions,
+    "Covering Wide Centre-Back": centre_back_positions,
+    "Stopping Wide Centre-Back": centre_back_positions,
+    "Full-Back": full_back_positions,
+    "Inside Full-Back": full_back_positions,
+    "Holding Full-Back": full_back_positions,
+    "Pressing Full-Back": full_back_positions,
+    "Wing-Back": wing_back_positions,
+    "Inside Wing-Back": wing_back_positions,
+    "Playmaking Wing-Back": wing_back_positions,
+    "Advanced Wing-Back": wing_back_positions,
+    "Holding Wing-Back": wing_back_positions,
+    "Pressing Wing-Back": wing_back_positions,
+
+    # Midfielders
+    "Defensive Midfielder": ["DM"],
+    "Half-Back": ["DM"],
+    "Dropping Defensive Midfielder": ["DM"],
+    "Pressing Defensive Midfielder": ["DM"],
+    "Screening Defensive Midfielder": ["DM"],
+    "Wide Covering Defensive Midfielder": ["DM"],
+    "Deep-Lying Playmaker": ["DM", "M (C)"],
+    "Box-to-Box Midfielder": ["M (C)"],
+    "Box-to-Box Playmaker": ["M (C)"],
+    "Central Midfielder": ["M (C)"],
+    "Midfield Playmaker": ["M (C)"],
+    "Wide Central Midfielder": ["M (C)"],
+    "Pressing Central Midfielder": ["M (C)"],
+    "Screening Central Midfielder": ["M (C)"],
+    "Wide Covering Central Midfielder": ["M (C)"],
+    "Advanced Playmaker": ["M (C)", "AM (C)"],
+    "Channel Midfielder": ["M (C)", "AM (C)"],
+    "Wide Midfielder": wide_midfield_positions,
+    "Tracking Wide Midfielder": wide_midfield_positions,
+    "Wide Outlet Wide Midfielder": wide_midfield_positions,
+    "Winger": winger_positions,
+    "Inside Winger": winger_positions,
+    "Playmaking Winger": winger_positions,
+
+    # Attackers
+    "Attacking Midfielder": ["AM (C)"],
+    "Free Role": ["AM (C)"],
+    "Central Outlet Attacking Midfielder": ["AM (C)"],
+    "Splitting Outlet Attacking Midfielder": ["AM (C)"],
+    "Tracking Attacking Midfielder": ["AM (C)"],
+    "Second Striker": ["AM (C)", "ST (C)"],
+    "Wide Forward": wide_forward_positions,
+    "Inside Forward": wide_forward_positions,
+    "Inside Outlet Winger": wide_forward_positions,
+    "Tracking Winger": wide_forward_positions,
+    "Wide Outlet Winger": wide_forward_positions,
+    "Centre Forward": striker_positions,
+    "Channel Forward": striker_positions,
+    "Deep-Lying Forward": striker_positions,
+    "False Nine": striker_positions,
+    "Poacher": striker_positions,
+    "Target Forward": striker_positions,
+    "Central Outlet Centre Forward": striker_positions,
+    "Splitting Outlet Centre Forward": striker_positions,
+    "Tracking Centre Forward": striker_positions,
+}
+
+all_role_names = [
+    role
+    for phase in ["In Possession", "Out of Possession"]
+    for role in role_attributes[phase].keys()
+]
+
+all_attributes = sorted({
+    attr
+    for phase_roles in role_attributes.values()
+    for attrs in phase_roles.values()
+    for attr_list in [attrs["key"], attrs["preferred"]]
+    for attr in attr_list
+})
+
+# Changes whenever the role definitions or column aliases change, so cached
+# results from an older definition are never reused.
+role_definition_version = hashlib.sha256(
+    json.dumps([column_map, role_attributes, role_area_groups, role_positions], sort_keys=True).encode()
+).hexdigest()[:16]
@@ -0,0 +1,426 @@
+import numpy as np
+import pandas as pd
+
+from instrumentation import timed
+from loading import attribute_bounds
+from roles import (
+    all_attributes,
+    all_positions_mask,
+    area_order,
+    position_bits,
+    role_area_groups,
+    role_attributes,
+    role_positions,
+)
+
+# Players per role kept in the precomputed top-K index.
+TOP_K_MAX = 25
+
+# Players scored per block by score_matrix_chunks.
+SCORE_CHUNK_ROWS = 50_000
+
+# Share of a role's score that comes from its Key attributes; the rest comes
+# from Preferred. A role definition can override it with "key_weight".
+DEFAULT_KEY_WEIGHT = 0.8
+
+# Style for each player's best score in the role tables.
+HIGHLIGHT_STYLE = "background-color: #006400; color: white"
+
+
+def compile_role_weights(role_attributes):
+    # Attribute x role count matrices for Key and Preferred attributes.
+    # Counts (rather than 1/n weights) keep the sums exact, so the means match
+    # a per-role DataFrame.mean(axis=1) to the last bit.
+    phases = []
+    roles = []
+    areas = []
+    key_shares = []
+    position_masks = []
+    attr_index = {attr: i for i, attr in enumerate(all_attributes)}
+    role_count = sum(len(phase_roles) for phase_roles in role_attributes.values())
+    key_matrix = np.zeros((len(all_attributes), role_count))
+    preferred_matrix = np.zeros((len(all_attributes), role_count))
+
+    for phase, phase_roles in role_attributes.items():
+        for role, attrs in phase_roles.items():
+            col = len(roles)
+            for attr in attrs["key"]:
+                key_matrix[attr_index[attr], col] += 1
+            for attr in attrs["preferred"]:
+                preferred_matrix[attr_index[attr], col] += 1
+            phases.append(phase)
+            roles.append(role)
+            areas.append(attrs.get("area", role_area_groups.get(role, "Midfield")))
+            key_shares.append(attrs.get("key_weight", DEFAULT_KEY_WEIGHT))
+            allowed = attrs.get("positions", role_positions.get(role))
+            position_masks.append(
+                all_positions_mask if allowed is None else sum(position_bits[position] for position in set(allowed))
+            )
+
+    key_shares = np.array(key_shares, dtype="float64")
+    return {
+        "phases": phases,
+        "roles": roles,
+        "areas": areas,
+        "key": key_matrix,
+        "preferred": preferred_matrix,
+        # Rounded so the default gives exactly 0.2, not 1 - 0.8.
+        "key_share": key_shares,
+        "preferred_share": (1 - key_shares).round(10),
+        "positions": np.array(position_masks, dtype=np.uint16),
+    }
+
+
+def select_roles(weights, columns):
+    # The compiled weights of just the given role columns.
+    return {
+        key: value[:, columns] if key in ("key", "preferred")
+        else [value[col] for col in columns] if isinstance(value, list)
+        else value[columns]
+        for key, value in weights.items()
+    }
+
+
+role_weights = compile_role_weights(role_attributes)
+
+
+def mean_scores(values, known, weights):
+    # Mean over the weighted attributes, skipping unknown (NaN) values like DataFrame.mean does.
+    sums = values @ weights
+    counts = known @ weights
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = sums / counts
+    # Roles whose attributes are all missing from the upload score 0.
+    return np.where(weights.sum(axis=0) == 0, 0.0, means)
+
+
+def present_attributes(df):
+    return [attr for attr in all_attributes if attr in df.columns]
+
+
+def score_matrix(df, weights=role_weights, positions=None):
+    attributes = present_attributes(df)
+    return score_values(df[attributes].to_numpy(dtype="float64"), attributes, weights, positions)
+
+
+def score_matrix_chunks(df, positions=None, chunk_rows=SCORE_CHUNK_ROWS):
+    # score_matrix one block of rows at a time, yielding (first row, block
+    # scores) so long jobs can report progress and stop between blocks.
+    for start in range(0, len(df), chunk_rows):
+        block_positions = None if positions is None else positions[start:start + chunk_rows]
+        yield start, score_matrix(df.iloc[start:start + chunk_rows], positions=block_positions)
+
+
+def score_values(values, attributes, weights=role_weights, positions=None):
+    # Role scores for an attribute value matrix whose columns are `attributes`.
+    # With per-row position bitmasks, each player is only scored for roles
+    # open to one of their positions (the rest are NaN): players are grouped
+    # by bitmask and each group is scored for its eligible roles only.
+    if positions is not None:
+        scores = np.full((len(values), len(weights["roles"])), np.nan)
+        masks, groups = np.unique(positions, return_inverse=True)
+        order = np.argsort(groups, kind="stable")
+        starts = np.searchsorted(groups[order], np.arange(len(masks) + 1))
+        for i, mask in enumerate(masks):
+            rows = order[starts[i]:starts[i + 1]]
+            columns = np.flatnonzero(weights["positions"] & mask)
+            if len(columns):
+                scores[np.ix_(rows, columns)] = score_values(values[rows], attributes, select_roles(weights, columns))
+        return scores
+
+    present = [all_attributes.index(attr) for attr in attributes]
+    known = ~np.isnan(values)
+    values = np.where(known, values, 0.0)
+    known = known.astype("float64")
+
+    key_weights = weights["key"][present]
+    preferred_weights = weights["preferred"][present]
+    key_score = mean_scores(values, known, key_weights)
+    preferred_score = mean_scores(values, known, preferred_weights)
+
+    # 80% Key / 20% Preferred unless the role says otherwise; roles without
+    # Preferred attributes use Key only.
+    has_preferred = weights["preferred"].sum(axis=0) > 0
+    scores = np.where(
+        has_preferred,
+        (key_score * weights["key_share"]) + (preferred_score * weights["preferred_share"]),
+        key_score
+    )
+    return scores.round(2)
+
+
+def score_bounds(df, scores, weights=role_weights, positions=None):
+    # Lowest and highest possible score of each role given masked attributes
+    # (scouting ranges and unscouted "-"), rows in df order. Players with no
+    # masked attributes keep their score as both bounds, so only the masked
+    # rows are scored again. None when nothing in df is masked.
+    attributes = present_attributes(df)
+    bounds = attribute_bounds(df, attributes)
+    if bounds is None:
+        return None
+
+    low, high = bounds
+    masked = np.flatnonzero((low != high).any(axis=1))
+    low_scores = scores.copy()
+    high_scores = scores.copy()
+    masked_positions = None if positions is None else positions[masked]
+    low_scores[masked] = score_values(low[masked], attributes, weights, masked_positions)
+    high_scores[masked] = score_values(high[masked], attributes, weights, masked_positions)
+    return low_scores, high_scores
+
+
+@timed("calculate_role_scores", rows=lambda role_scores: len(role_scores["players"]))
+def calculate_role_scores(df, scores=None, positions=None):
+    # Players x roles score matrix, with players sorted by name so every view
+    # is a plain slice. Role metadata lines up with the matrix columns and
+    # "rows" keeps each player's row position in the upload. `scores` can
+    # pass in an already computed score_matrix (rows in upload order).
+    # Uploads with masked attributes also get "score_low" / "score_high".
+    # With `positions` (loading.player_positions), roles a player cannot
+    # play are left unscored (NaN), so they are not ranked either.
+    names = df["Name"].to_numpy()
+    order = np.argsort(names.astype(str), kind="stable")
+    if scores is None:
+        scores = score_matrix(df, positions=positions)
+
+    role_scores = {
+        "players": names[order],
+        "rows": order,
+        "roles": np.array(role_weights["roles"], dtype=object),
+        "phases": np.array(role_weights["phases"], dtype=object),
+        "areas": np.array(role_weights["areas"], dtype=object),
+        "scores": scores[order].astype(np.float32),
+    }
+
+    if positions is not None:
+        role_scores["positions"] = positions[order]
+
+    bounds = score_bounds(df, scores, positions=positions)
+    if bounds is not None:
+        role_scores["score_low"] = bounds[0][order].astype(np.float32)
+        role_scores["score_high"] = bounds[1][order].astype(np.float32)
+    return role_scores
+
+
+def top_k_rows(scores, upload_rows, k):
+    # Best k rows of every role column, best first, ties going to the player
+    # listed first in the upload.
+    player_count, role_count = scores.shape
+    k = min(k, player_count)
+    top_rows = np.empty((k, role_count), dtype=np.int64)
+
+    for col in range(role_count):
+        column = np.where(np.isnan(scores[:, col]), -np.inf, scores[:, col])
+        if k < player_count:
+            threshold = column[np.argpartition(-column, k - 1)[:k]].min()
+            candidates = np.flatnonzero(column >= threshold)
+        else:
+            candidates = np.arange(player_count)
+        order = np.lexsort((upload_rows[candidates], -column[candidates]))
+        top_rows[:, col] = candidates[order[:k]]
+
+    return top_rows
+
+
+@timed("build_role_index", rows=lambda index: len(index["best_roles"]))
+def build_role_index(role_scores):
+    # Built once after scoring: each role's scores sorted ascending (NaNs
+    # last, column-major) for rank and percentile lookups, the top TOP_K_MAX
+    # rows per role and every player's best role.
+    scores = role_scores["scores"]
+    return {
+        "sorted_scores": np.sort(np.asfortranarray(scores), axis=0),
+        "valid_counts": (~np.isnan(scores)).sum(axis=0),
+        "top_rows": top_k_rows(scores, role_scores["rows"], TOP_K_MAX),
+        "best_roles": np.where(np.isnan(scores), -np.inf, scores).argmax(axis=1),
+    }
+
+
+def scores_at_or_below(role_scores, rows, columns):
+    # Number of players scoring at or below each selected player x role.
+    scores = np.asfortranarray(role_scores["scores"][rows][:, columns])
+    counts = np.empty(scores.shape, dtype=np.float32)
+    for j, col in enumerate(columns):
+        valid = role_scores["valid_counts"][col]
+        counts[:, j] = np.searchsorted(role_scores["sorted_scores"][:valid, col], scores[:, j], side="right")
+    counts[np.isnan(scores)] = np.nan
+    return counts
+
+
+@timed("role_ranks")
+def role_ranks(role_scores, rows=slice(None), columns=None):
+    # Per-role rank, 1 = best, ties share the lowest rank.
+    columns = np.arange(len(role_scores["roles"])) if columns is None else columns
+    below = scores_at_or_below(role_scores, rows, columns)
+    return role_scores["valid_counts"][columns] - below + 1
+
+
+def role_percentiles(role_scores, rows=slice(None), columns=None):
+    # Share of players in each role scoring at or below the player, in %.
+    columns = np.arange(len(role_scores["roles"])) if columns is None else columns
+    below = scores_at_or_below(role_scores, rows, columns)
+    return below / role_scores["valid_counts"][columns] * 100
+
+
+def top_players_for_role(role_scores, column, k):
+    if k <= role_scores["top_rows"].shape[0]:
+        return role_scores["top_rows"][:k, column]
+    return top_k_rows(role_scores["scores"][:, [column]], role_scores["rows"], k)[:, 0]
+
+
+def long_results(role_scores, rows=None, columns=None):
+    # One row per player x role, for views that still need the long layout.
+    rows = np.arange(len(role_scores["players"])) if rows is None else np.asarray(rows)
+    columns = np.arange(len(role_scores["roles"])) if columns is None else np.asarray(columns)
+    player_codes, player_names = pd.factorize(role_scores["players"][rows])
+
+    results = pd.DataFrame({
+        "Player": pd.Categorical.from_codes(np.tile(player_codes, len(columns)), categories=player_names),
+        "Phase": pd.Categorical(np.repeat(role_scores["phases"][columns], len(rows))),
+        "Area": pd.Categorical(np.repeat(role_scores["areas"][columns], len(rows))),
+        "Role": pd.Categorical.from_codes(np.repeat(np.arange(len(columns)), len(rows)), categories=role_scores["roles"][columns]),
+        "Score": role_scores["scores"][np.ix_(rows, columns)].T.ravel(),
+    })
+    if "ranks" in role_scores:
+        results["Rank"] = role_scores["ranks"][np.ix_(rows, columns)].T.ravel()
+    if "score_low" in role_scores:
+        results["Score Low"] = role_scores["score_low"][np.ix_(rows, columns)].T.ravel()
+        results["Score High"] = role_scores["score_high"][np.ix_(rows, columns)].T.ravel()
+    return results
+
+
+def score_players(df, scores=None, positions=None):
+    role_scores = calculate_role_scores(df, scores=scores, positions=positions)
+    role_scores.update(build_role_index(role_scores))
+    role_scores["ranks"] = role_ranks(role_scores)
+    return role_scores
+
+
+def score_role_columns(df, role_scores, definitions):
+    # Scores only the roles in `definitions` ({phase: {role: attrs}}, the
+    # role_attributes layout) with their own index and ranks, rows lined up
+    # with role_scores. Combine with merge_role_columns.
+    weights = compile_role_weights(definitions)
+    positions = None
+    if "positions" in role_scores:
+        positions = np.empty_like(role_scores["positions"])
+        positions[role_scores["rows"]] = role_scores["positions"]
+
+    scores = score_matrix(df, weights, positions)
+    columns = {
+        "rows": role_scores["rows"],
+        "roles": np.array(weights["roles"], dtype=object),
+        "phases": np.array(weights["phases"], dtype=object),
+        "areas": np.array(weights["areas"], dtype=object),
+        "scores": scores[role_scores["rows"]].astype(np.float32),
+    }
+    bounds = score_bounds(df, scores, weights, positions)
+    if bounds is not None:
+        columns["score_low"] = bounds[0][role_scores["rows"]].astype(np.float32)
+        columns["score_high"] = bounds[1][role_scores["rows"]].astype(np.float32)
+    columns.update(build_role_index(columns))
+    columns["ranks"] = role_ranks(columns)
+    return columns
+
+
+@timed("merge_role_columns", rows=lambda role_scores: len(role_scores["players"]))
+def merge_role_columns(role_scores, role_columns):
+    # Copy of role_scores with each score_role_columns result swapped in:
+    # a role with the same phase and name is replaced, any other is added as
+    # a new column. Nothing else is rescored; only best roles are refreshed.
+    merged = dict(role_scores)
+    existing = {
+        (phase, role): col
+        for col, (phase, role) in enumerate(zip(role_scores["phases"], role_scores["roles"]))
+    }
+    targets = []
+    for columns in role_columns:
+        for phase, role in zip(columns["phases"], columns["roles"]):
+            if (phase, role) not in existing:
+                existing[(phase, role)] = len(existing)
+            targets.append(existing[(phase, role)])
+
+    added = len(existing) - len(role_scores["roles"])
+    for key in ["roles", "phases", "areas", "valid_counts"]:
+        merged[key] = np.concatenate([role_scores[key], np.zeros(added, dtype=role_scores[key].dtype)])
+    matrix_keys = [key for key in ["scores", "ranks", "top_rows", "score_low", "score_high"] if key in role_scores]
+    for key in matrix_keys:
+        merged[key] = np.hstack([role_scores[key], np.zeros((len(role_scores[key]), added), dtype=role_scores[key].dtype)])
+    merged["sorted_scores"] = np.asfortranarray(np.hstack([
+        role_scores["sorted_scores"],
+        np.zeros((len(role_scores["players"]), added), dtype=np.float32)
+    ]))
+
+    start = 0
+    for columns in role_columns:
+        count = len(columns["roles"])
+        target = targets[start:start + count]
+        start += count
+        for key in ["roles", "phases", "areas", "valid_counts"]:
+            merged[key][target] = columns[key]
+        for key in matrix_keys + ["sorted_scores"]:
+            merged[key][:, target] = columns[key]
+
+    merged["best_roles"] = np.where(np.isnan(merged["scores"]), -np.inf, merged["scores"]).argmax(axis=1)
+    return merged
+
+
+@timed("role_table")
+def role_table(role_scores, columns, rows=None, values="scores"):
+    # Players x roles view of the score (or rank) matrix for the given columns.
+    rows = slice(None) if rows is None else rows
+    return pd.DataFrame(
+        role_scores[values][rows][:, columns],
+        index=pd.Index(role_scores["players"][rows], name="Player"),
+        columns=pd.Index(role_scores["roles"][columns], name="Role")
+    )
+
+
+def players_in_score_range(scores, low, high):
+    # Players with at least one score (in the given columns) inside the range.
+    return ((scores >= low) & (scores <= high)).any(axis=1)
+
+
+def players_outside_top_n(ranks, n):
+    # Players with no rank inside the top N, ignoring players with no ranks.
+    return ~np.isnan(ranks).all(axis=1) & ~(ranks <= n).any(axis=1)
+
+
+def row_max_mask(scores):
+    # True where a score equals its row's best score (NaNs ignored).
+    row_max = np.where(np.isnan(scores), -np.inf, scores).max(axis=1, keepdims=True)
+    return scores == row_max
+
+
+def highlight_row_max(table, number_format="{:.2f}"):
+    # Styler for a role_table with each player's best scores highlighted.
+    # Names repeat in large exports and Styler.apply needs unique labels,
+    # so the names become a Player column next to a positional index.
+    styles = np.where(row_max_mask(table.to_numpy(dtype="float64")), HIGHLIGHT_STYLE, "")
+    table = table.reset_index()
+    roles = list(table.columns[1:])
+    return table.style.apply(lambda _: styles, axis=None, subset=roles).format(number_format, subset=roles)
+
+
+def sorted_page(scores, rows, sort_column=None, descending=True, page=0, page_size=50):
+    # Row indices for one page of the players selected by the boolean mask
+    # `rows`, sorted by a score column (or kept in name order when
+    # sort_column is None). Returns the page and the number of matching rows.
+    rows = np.flatnonzero(rows)
+    if sort_column is not None:
+        keys = scores[rows, sort_column]
+        rows = rows[np.argsort(-keys if descending else keys, kind="stable")]
+    elif descending:
+        rows = rows[::-1]
+
+    start = page * page_size
+    return rows[start:start + page_size], len(rows)
+
+
+def ordered_role_columns(role_scores, columns):
+    # Table column order: In Possession first, then area_order, then role name.
+    areas = role_scores["areas"][columns]
+    area_rank = np.array([area_order.index(area) if area in area_order else 99 for area in areas])
+    phase_rank = (role_scores["phases"][columns] != "In Possession").astype(int)
+    order = np.lexsort((role_scores["roles"][columns].astype(str), area_rank, phase_rank))
+    return columns[order]
@@ -0,0 +1,103 @@
+import numpy as np
+
+from instrumentation import timed
+from loading import unscouted_cells
+from roles import all_attributes, role_attributes
+
+# Players compared per block, to bound the temporary distance arrays.
+SIMILARITY_BLOCK_ROWS = 65_536
+
+
+@timed("build_similarity_index", rows=lambda index: len(index["features"]))
+def build_similarity_index(attributes_df, role_scores):
+    # Feature rows line up with the role score matrix: every attribute in
+    # all_attributes followed by every role score, each standardised so no
+    # single feature dominates the distance.
+    attributes = attributes_df[all_attributes].to_numpy(dtype=np.float32)[role_scores["rows"]]
+    # Unscouted attributes take the attribute's average rather than skewing
+    # the distance.
+    unknown = unscouted_cells(attributes_df)
+    if unknown is not None:
+        unknown = unknown[role_scores["rows"]]
+        known_counts = np.maximum((~unknown).sum(axis=0), 1)
+        means = np.where(unknown, 0, attributes).sum(axis=0) / known_counts
+        attributes[unknown] = means[np.nonzero(unknown)[1]]
+    features = np.hstack([attributes, np.nan_to_num(role_scores["scores"])]).astype(np.float32)
+
+    std = features.std(axis=0)
+    features = (features - features.mean(axis=0)) / np.where(std > 0, std, 1)
+
+    return {
+        "features": features,
+        "norms": np.linalg.norm(features, axis=1),
+        "attribute_count": len(all_attributes),
+    }
+
+
+def similarity_columns(role_scores, phase="All", area="All", definitions=role_attributes):
+    # Feature columns for a phase/area: the scores of its roles and the
+    # attributes those roles use (per `definitions`, which must include any
+    # custom roles). None means every feature.
+    if phase == "All" and area == "All":
+        return None
+
+    role_mask = np.ones(len(role_scores["roles"]), dtype=bool)
+    if phase != "All":
+        role_mask &= role_scores["phases"] == phase
+    if area != "All":
+        role_mask &= role_scores["areas"] == area
+
+    used = set()
+    for col in np.flatnonzero(role_mask):
+        attrs = definitions[role_scores["phases"][col]][role_scores["roles"][col]]
+        used.update(attrs["key"])
+        used.update(attrs["preferred"])
+
+    attribute_columns = [i for i, attr in enumerate(all_attributes) if attr in used]
+    return np.concatenate([attribute_columns, len(all_attributes) + np.flatnonzero(role_mask)]).astype(int)
+
+
+def similar_players(index, row, k=10, metric="cosine", columns=None, block_rows=SIMILARITY_BLOCK_ROWS):
+    # The k players nearest to `row`, scanning the feature matrix in blocks
+    # and keeping only each block's k best. Returns (rows, distances), with
+    # cosine distance being 1 - cosine similarity.
+    features = index["features"]
+    columns = slice(None) if columns is None else columns
+    query = features[row, columns]
+    query_norm = np.linalg.norm(query)
+
+    best_rows = np.empty(0, dtype=np.int64)
+    best_distances = np.empty(0, dtype=np.float32)
+
+    for start in range(0, len(features), block_rows):
+        block = features[start:start + block_rows, columns]
+        dot = block @ query
+        if isinstance(columns, slice):
+            norms = index["norms"][start:start + block_rows]
+        else:
+            norms = np.linalg.norm(block, axis=1)
+
+        if metric == "cosine":
+            with np.errstate(invalid="ignore", divide="ignore"):
+                distances = 1 - dot / (norms * query_norm)
+            distances = np.nan_to_num(distances, nan=1.0)
+        else:
+            distances = np.sqrt(np.maximum(norms ** 2 - 2 * dot + query_norm ** 2, 0))
+
+        if start <= row < start + len(block):
+            distances[row - start] = np.inf
+
+        if len(distances) > k:
+            keep = np.argpartition(distances, k)[:k]
+        else:
+            keep = np.arange(len(distances))
+
+        best_rows = np.concatenate([best_rows, start + keep])
+        best_distances = np.concatenate([best_distances, distances[keep]])
+        if len(best_rows) > k:
+            keep = np.argpartition(best_distances, k)[:k]
+            best_rows, best_distances = best_rows[keep], best_distances[keep]
+
+    order = np.argsort(best_distances, kind="stable")
+    finite = np.isfinite(best_distances[order])
+    return best_rows[order][finite], best_distances[order][finite]
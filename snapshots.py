@@ -0,0 +1,115 @@
+import numpy as np
+import pandas as pd
+
+from instrumentation import stage
+from loading import attribute_bounds
+from roles import all_attributes, role_definition_version
+from scoring import build_role_index, calculate_role_scores, role_ranks, role_weights, score_matrix_chunks
+
+
+def fingerprint_players(df, positions=None):
+    # 64-bit hash of each player's name and the lowest and highest possible
+    # value of each attribute (equal unless scouting masks it). Values are
+    # hashed as float32 so a column stored as uint8 in one export and
+    # float32 in the next still fingerprints the same.
+    bounds = attribute_bounds(df)
+    if bounds is None:
+        values = df[all_attributes].to_numpy(dtype=np.float32)
+        bounds = (values, values)
+    key_df = pd.DataFrame(
+        np.hstack(bounds).astype(np.float32),
+        columns=[f"{attr} {bound}" for bound in ("min", "max") for attr in all_attributes]
+    )
+    key_df.insert(0, "Name", df["Name"].astype(str).to_numpy())
+    if positions is not None:
+        key_df["Positions"] = positions
+    return pd.util.hash_pandas_object(key_df, index=False).to_numpy()
+
+
+def matching_rows(fingerprints, previous_fingerprints):
+    # Position in the previous snapshot of each fingerprint, or -1 if new.
+    unique_fingerprints, first_rows = np.unique(previous_fingerprints, return_index=True)
+    if len(unique_fingerprints) == 0:
+        return np.full(len(fingerprints), -1)
+
+    positions = np.minimum(np.searchsorted(unique_fingerprints, fingerprints), len(unique_fingerprints) - 1)
+    found = unique_fingerprints[positions] == fingerprints
+    return np.where(found, first_rows[positions], -1)
+
+
+def score_snapshot(df, previous=None, positions=None, progress=None):
+    # Scores an upload, reusing the previous snapshot's scores for every
+    # player whose name, attributes and positions are unchanged and scoring
+    # only the new or changed rows. Any earlier role_scores from this
+    # function can be passed as `previous`; it is ignored if the role
+    # definitions differ or it was (or was not) scored by position.
+    # progress(done, total, scored_rows, scores) is called after each block
+    # of rows is scored (scores is the upload-order matrix being filled) and
+    # can raise to stop the job.
+    fingerprints = fingerprint_players(df, positions)
+    version = (role_definition_version, positions is not None)
+    scores = np.empty((len(df), len(role_weights["roles"])), dtype=np.float32)
+
+    if previous is None or previous.get("version") != version:
+        reused = np.zeros(len(df), dtype=bool)
+    else:
+        with stage("match_snapshot", rows=len(df)):
+            previous_rows = matching_rows(fingerprints, previous["fingerprints"])
+            reused = previous_rows >= 0
+        scores[reused] = previous["scores"][previous_rows[reused]]
+
+    changed = np.flatnonzero(~reused)
+    changed_positions = None if positions is None else positions[changed]
+    with stage("score_rows", rows=len(changed)):
+        for start, block_scores in score_matrix_chunks(df.iloc[changed], changed_positions):
+            done = start + len(block_scores)
+            scores[changed[start:done]] = block_scores
+            if progress is not None:
+                progress(done, len(changed), changed[:done], scores)
+
+    # score_players, with one more progress call so the job can still stop
+    # before the index and ranks are built.
+    role_scores = calculate_role_scores(df, scores=scores, positions=positions)
+    if progress is not None:
+        progress(len(changed), len(changed), changed, scores)
+    role_scores.update(build_role_index(role_scores))
+    role_scores["ranks"] = role_ranks(role_scores)
+    role_scores["fingerprints"] = fingerprints[role_scores["rows"]]
+    role_scores["version"] = version
+    role_scores["reused_count"] = int(reused.sum())
+    return role_scores
+
+
+def progression(previous, current, columns=None):
+    # Score change per role for players whose attributes changed between two
+    # snapshots, matched by name (first occurrence). Also returns the counts
+    # of unchanged, changed, new and departed players.
+    columns = np.arange(len(current["roles"])) if columns is None else columns
+    current_names = pd.Index(current["players"].astype(str))
+    previous_names = pd.Index(previous["players"].astype(str))
+    current_rows = np.flatnonzero(~current_names.duplicated())
+    previous_first = np.flatnonzero(~previous_names.duplicated())
+
+    matches = previous_names[previous_first].get_indexer(current_names[current_rows])
+    in_both = matches >= 0
+    current_rows, previous_rows = current_rows[in_both], previous_first[matches[in_both]]
+    changed = current["fingerprints"][current_rows] != previous["fingerprints"][previous_rows]
+    current_rows, previous_rows = current_rows[changed], previous_rows[changed]
+
+    deltas = current["scores"][current_rows][:, columns] - previous["scores"][previous_rows][:, columns]
+    diff = pd.DataFrame(
+        deltas,
+        index=pd.Index(current["players"][current_rows], name="Player"),
+        columns=pd.Index(current["roles"][columns], name="Role")
+    )
+    # Roles a player cannot play are NaN and left out of the average.
+    changed_roles = np.maximum((~np.isnan(deltas)).sum(axis=1), 1)
+    diff.insert(0, "Avg Change", np.nansum(deltas, axis=1) / changed_roles)
+
+    counts = {
+        "unchanged": int(in_both.sum() - changed.sum()),
+        "changed": int(changed.sum()),
+        "new": int((~in_both).sum()),
+        "departed": int(len(previous_first) - in_both.sum()),
+    }
+    return diff.sort_values("Avg Change", ascending=False), counts
@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+
+from instrumentation import timed
+
+# Score a player needs in a role to count as cover for it.
+DEFAULT_COVER_SCORE = 12.0
+
+
+@timed("build_coverage_index", rows=lambda index: len(index["best_ranks"]))
+def build_coverage_index(role_scores):
+    # Built once per set of role scores: every player's best rank within
+    # each phase/area group of roles. The phase and area filters select
+    # whole groups, so any filter's best rank per player is a min over a
+    # few group columns instead of over every visible role.
+    groups = pd.MultiIndex.from_arrays([role_scores["phases"], role_scores["areas"]])
+    codes, unique_groups = groups.factorize()
+    best_ranks = np.empty((len(role_scores["players"]), len(unique_groups)), dtype=np.float32)
+    for group in range(len(unique_groups)):
+        # fmin skips NaN ranks, so roles a player cannot play are ignored.
+        best_ranks[:, group] = np.fmin.reduce(role_scores["ranks"][:, codes == group], axis=1)
+
+    return {
+        "phases": unique_groups.get_level_values(0).to_numpy(dtype=object),
+        "areas": unique_groups.get_level_values(1).to_numpy(dtype=object),
+        "best_ranks": best_ranks,
+    }
+
+
+def visible_groups(index, phase="All", area="All"):
+    groups = np.ones(len(index["phases"]), dtype=bool)
+    if phase != "All":
+        groups &= index["phases"] == phase
+    if area != "All":
+        groups &= index["areas"] == area
+    return np.flatnonzero(groups)
+
+
+def players_scoring_at_least(role_scores, columns, scores):
+    # Number of players scoring at least scores[j] in each role columns[j],
+    # from the sorted score index.
+    counts = np.empty(len(columns), dtype=np.int64)
+    for j, col in enumerate(columns):
+        valid = role_scores["valid_counts"][col]
+        counts[j] = valid - np.searchsorted(role_scores["sorted_scores"][:valid, col], scores[j], side="left")
+    return counts
+
+
+def role_coverage(role_scores, columns, top_n, cover_score=DEFAULT_COVER_SCORE):
+    # One row per role: its first and second choice, the gap between them,
+    # how many players rank within the top N (more than N only with ties)
+    # and how many score at least cover_score. Only the top-K index and the
+    # sorted scores are read, so changing N or the score is cheap.
+    columns = np.asarray(columns)
+    top_rows = role_scores["top_rows"]
+    first = top_rows[0, columns]
+    first_scores = role_scores["scores"][first, columns]
+    if len(top_rows) > 1:
+        second = top_rows[1, columns]
+        second_scores = role_scores["scores"][second, columns]
+        second_names = np.where(np.isnan(second_scores), None, role_scores["players"][second])
+    else:
+        second_scores = np.full(len(columns), np.nan, dtype=np.float32)
+        second_names = np.full(len(columns), None, dtype=object)
+
+    # A player ranks within the top N when they score at least the N-th best
+    # score, which the top-K index holds unless N is larger than K.
+    if top_n <= len(top_rows):
+        nth_scores = role_scores["scores"][top_rows[top_n - 1, columns], columns]
+        within_top_n = np.where(
+            np.isnan(nth_scores),
+            role_scores["valid_counts"][columns],
+            players_scoring_at_least(role_scores, columns, nth_scores)
+        )
+    else:
+        within_top_n = (role_scores["ranks"][:, columns] <= top_n).sum(axis=0)
+
+    return pd.DataFrame({
+        "Phase": role_scores["phases"][columns],
+        "Area": role_scores["areas"][columns],
+        "Role": role_scores["roles"][columns],
+        "First Choice": np.where(np.isnan(first_scores), None, role_scores["players"][first]),
+        "First Score": first_scores,
+        "Second Choice": second_names,
+        "Second Score": second_scores,
+        "Gap": first_scores - second_scores,
+        f"Within Top {top_n}": within_top_n,
+        "Cover": players_scoring_at_least(role_scores, columns, np.full(len(columns), cover_score)),
+    })
+
+
+def area_coverage(index, groups, coverage, top_n):
+    # One row per visible phase/area group: its roles, the players ranked
+    # within the top N of at least one of them and its roles without cover.
+    uncovered = coverage[coverage["Cover"] == 0]
+    return pd.DataFrame({
+        "Phase": index["phases"][groups],
+        "Area": index["areas"][groups],
+        "Roles": [
+            int(((coverage["Phase"] == phase) & (coverage["Area"] == area)).sum())
+            for phase, area in zip(index["phases"][groups], index["areas"][groups])
+        ],
+        f"Players In A Top {top_n}": (index["best_ranks"][:, groups] <= top_n).sum(axis=0),
+        "Roles Without Cover": [
+            ", ".join(uncovered.loc[(uncovered["Phase"] == phase) & (uncovered["Area"] == area), "Role"])
+            for phase, area in zip(index["phases"][groups], index["areas"][groups])
+        ],
+    })
@@ -0,0 +1,334 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import stage
+from loading import ATTRIBUTE_MAX, player_positions, prepare_attributes
+from roles import all_attributes, role_definition_version
+from scoring import TOP_K_MAX, players_in_score_range, role_weights, score_values, top_k_rows
+
+# Players read from the memory-mapped store per block. Resident memory is
+# bounded by a block's attributes and scores, whatever the database size.
+STORE_BLOCK_ROWS = 65_536
+
+# Where converted uploads are kept; one directory per upload.
+STORE_DIR = os.environ.get("FM_ROLE_STORE_DIR", os.path.join(tempfile.gettempdir(), "fm_role_store"))
+
+# Disk space converted uploads may take, in MB. Past it, the least recently
+# opened stores are deleted (see prune_stores).
+STORE_MAX_MB = int(os.environ.get("FM_ROLE_STORE_MB", "4096"))
+
+# Sessions prune the shared store directory one at a time.
+prune_lock = threading.Lock()
+
+# Stores being written or scored, by directory; prune_stores skips them.
+stores_in_use = Counter()
+
+# Store layout, one flat file per column (readable with np.memmap):
+#   attributes.f32  rows x all_attributes, float32, ranges at their midpoint
+#   positions.u16   position bitmask per row (only with a position column)
+#   names.txt       UTF-8 names, one per line
+#   names.i64       byte offset of each name in names.txt, plus the end
+#   meta.json       row count and missing attributes, written last; its
+#                   mtime is when the store was last opened
+# Rows keep upload order (goalkeepers removed).
+
+
+def store_directory(sha256):
+    return os.path.join(STORE_DIR, f"{sha256[:16]}_{role_definition_version}")
+
+
+@contextmanager
+def store_in_use(directory):
+    directory = os.path.abspath(directory)
+    with prune_lock:
+        stores_in_use[directory] += 1
+    try:
+        yield
+    finally:
+        with prune_lock:
+            stores_in_use[directory] -= 1
+            if not stores_in_use[directory]:
+                del stores_in_use[directory]
+
+
+def write_store(chunks, directory, progress=None):
+    # Streams compact upload chunks (loading.upload_chunks) into the store.
+    # Only one chunk is held in memory at a time. A conversion that fails
+    # (or is cancelled) deletes the incomplete store.
+    with store_in_use(directory):
+        try:
+            return convert_chunks(chunks, directory, progress)
+        except Exception:
+            shutil.rmtree(directory, ignore_errors=True)
+            raise
+
+
+def convert_chunks(chunks, directory, progress):
+    os.makedirs(directory, exist_ok=True)
+    rows = 0
+    offset = 0
+    missing = None
+    has_positions = False
+
+    with ExitStack() as files:
+        attributes_file, positions_file, names_file, offsets_file = (
+            files.enter_context(open(os.path.join(directory, name), "wb"))
+            for name in ("attributes.f32", "positions.u16", "names.txt", "names.i64")
+        )
+        for chunk in chunks:
+            if "Name" not in chunk.columns:
+                raise ValueError("Could not find a player name column. Your file needs a column called 'Player' or 'Name'.")
+            chunk, missing = prepare_attributes(chunk)
+            positions = player_positions(chunk)
+            has_positions = positions is not None
+
+            with stage("write_store", rows=len(chunk)):
+                chunk[all_attributes].to_numpy(dtype=np.float32).tofile(attributes_file)
+                if has_positions:
+                    positions.tofile(positions_file)
+
+                names = chunk["Name"].astype(str).str.replace("\n", " ", regex=False) + "\n"
+                encoded = names.str.encode("utf-8")
+                lengths = encoded.str.len().to_numpy(dtype=np.int64)
+                (offset + np.cumsum(lengths) - lengths).tofile(offsets_file)
+                names_file.write(b"".join(encoded))
+
+            offset += int(lengths.sum())
+            rows += len(chunk)
+            if progress is not None:
+                progress(rows)
+
+        np.array([offset], dtype=np.int64).tofile(offsets_file)
+
+    with open(os.path.join(directory, "meta.json"), "w") as meta_file:
+        json.dump({"rows": rows, "positions": has_positions, "missing": missing or []}, meta_file)
+    return open_store(directory)
+
+
+def open_store(directory):
+    # The store's columns as read-only memory maps, or None if the directory
+    # holds no complete store.
+    meta_path = os.path.join(directory, "meta.json")
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path) as meta_file:
+        meta = json.load(meta_file)
+    os.utime(meta_path)
+
+    rows = meta["rows"]
+
+    def column(name, dtype, shape):
+        return mapped(os.path.join(directory, name), dtype, shape)
+
+    return {
+        "directory": directory,
+        "rows": rows,
+        "missing": meta["missing"],
+        "attributes": column("attributes.f32", np.float32, (rows, len(all_attributes))),
+        "positions": column("positions.u16", np.uint16, (rows,)) if meta["positions"] else None,
+        "names": column("names.txt", np.uint8, (os.path.getsize(os.path.join(directory, "names.txt")),)),
+        "name_offsets": column("names.i64", np.int64, (rows + 1,)),
+    }
+
+
+def directory_size(directory):
+    return sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file())
+
+
+def prune_stores(keep=None, max_bytes=STORE_MAX_MB * 1024 * 1024, root=STORE_DIR):
+    # Deletes the least recently opened stores under root until the rest fit
+    # in max_bytes. `keep`, stores being written or scored (stores_in_use)
+    # and stores without meta.json (possibly written by another process) are
+    # never deleted. Returns the deleted directories.
+    # Open memory maps of a deleted store stay readable on POSIX systems.
+    if not os.path.isdir(root):
+        return []
+
+    with prune_lock:
+        stores = []
+        total = 0
+        for entry in os.scandir(root):
+            if not entry.is_dir():
+                continue
+            size = directory_size(entry.path)
+            total += size
+            meta_path = os.path.join(entry.path, "meta.json")
+            path = os.path.abspath(entry.path)
+            in_use = path in stores_in_use or path == os.path.abspath(keep or "")
+            if os.path.exists(meta_path) and not in_use:
+                stores.append((os.path.getmtime(meta_path), size, entry.path))
+
+        deleted = []
+        for _, size, directory in sorted(stores):
+            if total <= max_bytes:
+                break
+            shutil.rmtree(directory, ignore_errors=True)
+            total -= size
+            deleted.append(directory)
+    return deleted
+
+
+def mapped(path, dtype, shape, mode="r"):
+    # np.memmap cannot map an empty file, so empty columns are plain arrays.
+    if 0 in shape:
+        return np.empty(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode=mode, shape=shape)
+
+
+def store_names(store, start, stop):
+    # Names of rows start..stop, decoded straight from the mapped file.
+    offsets = store["name_offsets"]
+    text = store["names"][offsets[start]:offsets[stop]].tobytes().decode("utf-8")
+    return np.array(text.split("\n")[:-1], dtype=object)
+
+
+def names_at(store, rows):
+    return np.array([store_names(store, row, row + 1)[0] for row in rows], dtype=object)
+
+
+def find_players(store, text, limit=50, block_rows=STORE_BLOCK_ROWS):
+    # Rows of the first `limit` players whose name contains `text`.
+    found = []
+    for start in range(0, store["rows"], block_rows):
+        names = pd.Series(store_names(store, start, min(start + block_rows, store["rows"])))
+        found.extend(start + np.flatnonzero(names.str.contains(text, case=False, regex=False).to_numpy()))
+        if len(found) >= limit:
+            break
+    return np.array(found[:limit], dtype=np.int64)
+
+
+def merge_top_k(top_rows, top_scores, rows, scores, k):
+    # Each role's k best of two candidate sets, ties going to the earlier row.
+    rows = np.vstack([top_rows, rows])
+    scores = np.vstack([top_scores, scores])
+    keys = np.where(np.isnan(scores), -np.inf, scores)
+    order = np.lexsort((rows, -keys), axis=0)[:k]
+    return np.take_along_axis(rows, order, axis=0), np.take_along_axis(scores, order, axis=0)
+
+
+def score_cents(scores):
+    # Scores are rounded to two decimals, so whole cents index them exactly.
+    return np.clip(np.rint(np.nan_to_num(scores) * 100), 0, None).astype(np.int64)
+
+
+def score_store(store, by_position=True, progress=None, block_rows=STORE_BLOCK_ROWS):
+    # Scores the store one block at a time into a memory-mapped rows x roles
+    # matrix (upload order), merging each block into the per-role top-K and
+    # a per-role count of players at each score. Those counts give exact
+    # ranks and percentiles without sorting the full matrix. The summary is
+    # saved next to the scores, so a store is only scored once per mode.
+    # progress(done, total) is called after each block and can raise to
+    # stop the job. prune_stores leaves the store alone meanwhile.
+    with store_in_use(store["directory"]):
+        return score_blocks(store, by_position, progress, block_rows)
+
+
+def score_blocks(store, by_position, progress, block_rows):
+    mode = "by_position" if by_position and store["positions"] is not None else "all_positions"
+    scores_path = os.path.join(store["directory"], f"scores_{mode}.f32")
+    summary_path = os.path.join(store["directory"], f"summary_{mode}.npz")
+    rows, role_count = store["rows"], len(role_weights["roles"])
+    shape = (rows, role_count)
+
+    summary = {
+        "roles": np.array(role_weights["roles"], dtype=object),
+        "phases": np.array(role_weights["phases"], dtype=object),
+        "areas": np.array(role_weights["areas"], dtype=object),
+    }
+    if os.path.exists(summary_path):
+        with np.load(summary_path) as saved:
+            summary.update(saved)
+        summary["scores"] = mapped(scores_path, np.float32, shape)
+        return summary
+
+    scores = mapped(scores_path, np.float32, shape, mode="w+")
+    top_rows = np.empty((0, role_count), dtype=np.int64)
+    top_scores = np.empty((0, role_count), dtype=np.float32)
+    valid_counts = np.zeros(role_count, dtype=np.int64)
+    score_counts = np.zeros((role_count, ATTRIBUTE_MAX * 100 + 1), dtype=np.int64)
+
+    with stage("score_store", rows=rows):
+        for start in range(0, rows, block_rows):
+            stop = min(start + block_rows, rows)
+            positions = store["positions"][start:stop] if mode == "by_position" else None
+            block = score_values(
+                store["attributes"][start:stop].astype("float64"), all_attributes, role_weights, positions
+            ).astype(np.float32)
+            scores[start:stop] = block
+
+            block_rows_in_upload = np.arange(start, stop)
+            block_top = top_k_rows(block, block_rows_in_upload, TOP_K_MAX)
+            top_rows, top_scores = merge_top_k(
+                top_rows, top_scores, start + block_top,
+                np.take_along_axis(block, block_top, axis=0), TOP_K_MAX
+            )
+
+            valid = ~np.isnan(block)
+            valid_counts += valid.sum(axis=0)
+            cents = score_cents(block)
+            if cents.max(initial=0) >= score_counts.shape[1]:
+                score_counts = np.pad(score_counts, ((0, 0), (0, cents.max() + 1 - score_counts.shape[1])))
+            flat = (cents + np.arange(role_count) * score_counts.shape[1])[valid]
+            score_counts += np.bincount(flat, minlength=score_counts.size).reshape(score_counts.shape)
+
+            if progress is not None:
+                progress(stop, rows)
+
+        if isinstance(scores, np.memmap):
+            scores.flush()
+
+    summary.update(top_rows=top_rows, top_scores=top_scores, valid_counts=valid_counts, score_counts=score_counts)
+    np.savez(summary_path, top_rows=top_rows, top_scores=top_scores, valid_counts=valid_counts, score_counts=score_counts)
+    summary["scores"] = mapped(scores_path, np.float32, shape)
+    return summary
+
+
+def store_at_or_below(summary, scores, columns):
+    # Number of players scoring at or below each score (rows x columns), as
+    # scoring.scores_at_or_below does from the sorted matrix.
+    cumulative = np.cumsum(summary["score_counts"][columns], axis=1)
+    cents = np.minimum(score_cents(scores), cumulative.shape[1] - 1)
+    counts = np.take_along_axis(cumulative.T, cents, axis=0).astype(np.float32)
+    counts[np.isnan(scores)] = np.nan
+    return counts
+
+
+def store_ranks(summary, scores, columns):
+    return summary["valid_counts"][columns] - store_at_or_below(summary, scores, columns) + 1
+
+
+def store_percentiles(summary, scores, columns):
+    return store_at_or_below(summary, scores, columns) / summary["valid_counts"][columns] * 100
+
+
+def store_score_range(summary, columns):
+    # Lowest and highest score in the columns, from the per-score counts.
+    scored = np.flatnonzero(summary["score_counts"][columns].sum(axis=0))
+    if len(scored) == 0:
+        return None
+    return scored[0] / 100, scored[-1] / 100
+
+
+def scan_score_range(summary, columns, low, high, page=0, page_size=50, block_rows=STORE_BLOCK_ROWS):
+    # Rows (upload order) of one page of players with a score in range in
+    # any of the columns, scanning the scores a block at a time. Returns the
+    # page and the number of matching rows.
+    scores = summary["scores"]
+    first = page * page_size
+    page_rows = []
+    match_count = 0
+    with stage("scan_score_range", rows=len(scores)):
+        for start in range(0, len(scores), block_rows):
+            matches = start + np.flatnonzero(players_in_score_range(scores[start:start + block_rows, columns], low, high))
+            wanted = matches[max(first - match_count, 0):max(first + page_size - match_count, 0)]
+            page_rows.extend(wanted)
+            match_count += len(matches)
+    return np.array(page_rows, dtype=np.int64), match_count
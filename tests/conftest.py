@@ -0,0 +1,23 @@
+import os
+import sys
+
+# The modules live at the repository root and the synthetic export
+# generator in benchmarks/, neither of which is a package.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import pytest  # noqa: E402
+
+from synthetic import to_csv  # noqa: E402
+
+from loading import prepare_attributes, read_upload  # noqa: E402
+
+
+@pytest.fixture
+def load_export():
+    # Parses and prepares an export frame (e.g. synthetic_export) the way
+    # the app does: CSV bytes through read_upload, then prepare_attributes.
+    def load(export):
+        return prepare_attributes(read_upload(to_csv(export), "export.csv"))[0]
+    return load
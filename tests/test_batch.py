@@ -0,0 +1,23 @@
+import os
+
+import pandas as pd
+
+from synthetic import synthetic_export, to_csv, to_fm_html
+
+from batch import main
+
+
+def test_exports_with_the_same_stem_write_separate_results(tmp_path):
+    csv_export = synthetic_export(300, seed=1)
+    html_export = synthetic_export(200, seed=2)
+    (tmp_path / "save.csv").write_bytes(to_csv(csv_export))
+    (tmp_path / "save.html").write_bytes(to_fm_html(html_export))
+    output_dir = tmp_path / "scores"
+
+    assert main([str(tmp_path), "--output-dir", str(output_dir), "--format", "csv", "--workers", "2"]) == 0
+
+    assert sorted(os.listdir(output_dir)) == ["save_csv_scores.csv", "save_html_scores.csv"]
+    csv_results = pd.read_csv(output_dir / "save_csv_scores.csv")
+    html_results = pd.read_csv(output_dir / "save_html_scores.csv")
+    assert len(csv_results) == (csv_export["Best Pos"] != "GK").sum()
+    assert len(html_results) == (html_export["Best Pos"] != "GK").sum()
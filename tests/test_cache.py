@@ -0,0 +1,56 @@
+import numpy as np
+
+from cache import ResultCache
+
+
+def frame(kb):
+    return np.zeros(kb * 1024, dtype=np.uint8)
+
+
+def test_held_results_survive_other_entries():
+    cache = ResultCache(max_bytes=3 * 1024)
+    cache.put("parsed", frame(1), holder=("a", "parsed"))
+    cache.put("scores", frame(1), holder=("a", "scores"))
+    cache.put("export 1", frame(1))
+    cache.put("export 2", frame(1))
+
+    assert cache.get("parsed") is not None and cache.get("scores") is not None
+    assert cache.get("export 1") is None and cache.get("export 2") is not None
+    assert cache.total_bytes <= cache.max_bytes
+
+
+def test_sessions_share_the_budget():
+    cache = ResultCache(max_bytes=4 * 1024)
+    cache.put("a parsed", frame(2), holder=("a", "parsed"))
+    cache.put("a scores", frame(1), holder=("a", "scores"))
+
+    # Another session's results evict the idle session's, least recently
+    # used first, but never its own.
+    cache.put("b parsed", frame(2), holder=("b", "parsed"))
+    assert cache.get("a parsed") is None and cache.get("a scores") is not None
+    assert cache.total_bytes <= cache.max_bytes
+
+    # One session's own results are kept even beyond the budget.
+    cache.put("b scores", frame(3), holder=("b", "scores"))
+    assert cache.get("b parsed") is not None and cache.get("b scores") is not None
+    assert cache.get("a scores") is None
+    assert cache.total_bytes == 5 * 1024
+
+    # A slot holds one key, so its previous result can be evicted.
+    cache.put("b scores 2", frame(1), holder=("b", "scores"))
+    assert cache.get("b scores") is None
+    assert cache.total_bytes <= cache.max_bytes
+
+
+def test_released_results_are_evicted_first():
+    cache = ResultCache(max_bytes=2 * 1024)
+    cache.put("a parsed", frame(1), holder=("a", "parsed"))
+    cache.put("b parsed", frame(1), holder=("b", "parsed"))
+    cache.release("b")
+
+    # Without a holder nothing held is evicted, and what does not fit is
+    # not cached.
+    cache.put("export", frame(1))
+    assert cache.get("a parsed") is not None and cache.get("b parsed") is None
+    cache.put("too large", frame(2))
+    assert cache.get("too large") is None and cache.get("export") is not None
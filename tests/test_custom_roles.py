@@ -0,0 +1,36 @@
+import pytest
+
+from custom_roles import load_role_definitions, validate_role_definitions
+
+
+def test_role_names_are_unique_across_phases():
+    with pytest.raises(ValueError, match="Out of Possession / Winger: the name is already a role in In Possession"):
+        validate_role_definitions({
+            "Out of Possession": {"Winger": {"key": ["Tck", "Mar"], "preferred": []}},
+        })
+    with pytest.raises(ValueError, match="In Possession / Outlet: the name is already a role in Out of Possession"):
+        validate_role_definitions({
+            "In Possession": {"Outlet": {"key": ["OtB", "Pac"]}},
+            "Out of Possession": {"Outlet": {"key": ["Wor", "Sta"]}},
+        })
+
+    # Overriding a built-in role in its own phase is fine.
+    assert validate_role_definitions({"In Possession": {"Winger": {"key_weight": 0.6}}})
+
+
+def test_malformed_yaml_raises_value_error():
+    pytest.importorskip("yaml")
+    with pytest.raises(ValueError, match="Invalid YAML"):
+        load_role_definitions(b"In Possession: {Winger: [unclosed", "roles.yaml")
+
+
+def test_fields_that_are_not_name_lists_raise_value_error():
+    with pytest.raises(ValueError) as error:
+        validate_role_definitions({
+            "In Possession": {
+                "Winger": {"key": 5},
+                "Wide Creator": {"key": ["Cro", "Pas"], "preferred": "Dri", "positions": [3]},
+            },
+        })
+    assert "In Possession / Winger: key must be a list of names" in str(error.value)
+    assert "In Possession / Wide Creator: preferred, positions must be a list of names" in str(error.value)
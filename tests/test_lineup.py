@@ -0,0 +1,42 @@
+import numpy as np
+
+from synthetic import synthetic_export
+
+from lineup import assign_slots, formations
+from loading import player_positions
+from scoring import score_players
+
+
+def test_pruned_lineup_matches_optimal_total(load_export):
+    df = load_export(synthetic_export(3000, seed=7))
+    role_scores = score_players(df, positions=player_positions(df))
+
+    for slot_roles in formations.values():
+        for depth in [1, 2, 3]:
+            optimal = assign_slots(role_scores, slot_roles, depth=depth, method="optimal")
+            pruned = assign_slots(role_scores, slot_roles, depth=depth, method="pruned")
+            for level in range(1, depth + 1):
+                np.testing.assert_allclose(
+                    pruned.loc[pruned["Depth"] == level, "Score"].sum(),
+                    optimal.loc[optimal["Depth"] == level, "Score"].sum(),
+                    rtol=1e-6
+                )
+
+
+def test_every_slot_has_a_row_when_players_run_out(load_export):
+    df = load_export(synthetic_export(30, seed=9))
+    role_scores = score_players(df)
+    slot_roles = formations["4-2-3-1"]
+    player_count = len(role_scores["players"])
+    assert player_count < len(slot_roles) * 3
+
+    for method in ["optimal", "pruned", "greedy"]:
+        lineup = assign_slots(role_scores, slot_roles, depth=3, method=method)
+
+        assert len(lineup) == len(slot_roles) * 3
+        assert lineup[["Slot", "Depth"]].values.tolist() == [
+            [slot, level] for slot in range(1, len(slot_roles) + 1) for level in [1, 2, 3]
+        ]
+        assert lineup["Player"].notna().sum() == player_count
+        assert lineup["Player"].dropna().is_unique
+        assert lineup["Score"].isna().equals(lineup["Player"].isna())
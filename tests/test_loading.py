@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from synthetic import synthetic_export, to_fm_html
+
+from loading import (
+    ATTRIBUTE_MAX,
+    ATTRIBUTE_MIN,
+    HTML_CHUNK_ROWS,
+    attribute_bounds,
+    bound_columns,
+    parse_attribute_cells,
+    player_positions,
+    position_mask,
+    prepare_attributes,
+    read_upload,
+    upload_chunks,
+)
+from roles import all_attributes, all_positions_mask, position_bits, role_attributes, role_positions
+
+
+@pytest.mark.parametrize("rows", [HTML_CHUNK_ROWS - 1, HTML_CHUNK_ROWS, 2 * HTML_CHUNK_ROWS + 1])
+def test_html_export_matches_csv(rows, load_export):
+    export = synthetic_export(rows, seed=4, masked=0.05)
+    csv_df = load_export(export)
+    html_df = prepare_attributes(read_upload(to_fm_html(export), "export.html"))[0]
+
+    # The bound columns depend on how rows fall into chunks (a chunk with no
+    # masked cell in a column has NaN bounds), so they are compared through
+    # attribute_bounds.
+    bounds = {column for attr in all_attributes for column in bound_columns(attr)}
+    assert set(html_df.columns) - bounds == set(csv_df.columns) - bounds
+    columns = [column for column in csv_df.columns if column not in bounds]
+    pd.testing.assert_frame_equal(html_df[columns], csv_df[columns])
+    for html_bounds, csv_bounds in zip(attribute_bounds(html_df), attribute_bounds(csv_df)):
+        np.testing.assert_array_equal(html_bounds, csv_bounds)
+
+
+def test_parse_attribute_cells():
+    values = np.array([
+        ["14", "12-15", "-", " 9 "],
+        ["", None, "Injured", 7],
+    ], dtype=object)
+
+    low, high = parse_attribute_cells(values)
+
+    # Blank, missing and non-numeric cells count as 0.
+    np.testing.assert_array_equal(low, [[14, 12, ATTRIBUTE_MIN, 9], [0, 0, 0, 7]])
+    np.testing.assert_array_equal(high, [[14, 15, ATTRIBUTE_MAX, 9], [0, 0, 0, 7]])
+
+
+def test_bounds_of_a_column_masked_in_one_chunk_only():
+    csv_bytes = (
+        "Player,Best Pos,Acc,Pac\n"
+        "A,ST (C),12-15,10\n"
+        "B,ST (C),-,11\n"
+        "C,ST (C),14,12\n"
+        "D,ST (C),9,13\n"
+    ).encode("utf-8")
+
+    chunks = list(upload_chunks(csv_bytes, "export.csv", chunk_rows=2))
+    assert bound_columns("Acc")[0] in chunks[0].columns
+    assert bound_columns("Acc")[0] not in chunks[1].columns
+    df = pd.concat(chunks, ignore_index=True)
+
+    # The second chunk's rows have NaN bounds after concat, which count as
+    # exact values.
+    np.testing.assert_array_equal(df["Acc"], [13.5, 10.5, 14, 9])
+    low, high = attribute_bounds(df, attributes=["Acc", "Pac"])
+    np.testing.assert_array_equal(low, [[12, 10], [ATTRIBUTE_MIN, 11], [14, 12], [9, 13]])
+    np.testing.assert_array_equal(high, [[15, 10], [ATTRIBUTE_MAX, 11], [14, 12], [9, 13]])
+
+
+def bits(*names):
+    return sum(position_bits[name] for name in names)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("D/WB (R), DM, M (LC)", bits("D (R)", "WB (R)", "DM", "M (L)", "M (C)")),
+    ("AM (RLC)", bits("AM (R)", "AM (L)", "AM (C)")),
+    ("ST (C)", bits("ST (C)")),
+    ("st (c)", bits("ST (C)")),
+    ("GK", bits("GK")),
+    ("DM, ST", bits("DM", "ST (C)")),
+    ("Unknown", all_positions_mask),
+    ("", all_positions_mask),
+    (None, all_positions_mask),
+])
+def test_position_mask(text, expected):
+    assert position_mask(text) == expected
+
+
+def test_player_positions_prefers_position_over_best_pos():
+    df = pd.DataFrame({
+        "Name": ["A", "B", "C"],
+        "Best Pos": ["ST (C)", "ST (C)", "ST (C)"],
+        "Position": ["AM (C), ST (C)", None, "DM"],
+    })
+
+    np.testing.assert_array_equal(
+        player_positions(df), [bits("AM (C)", "ST (C)"), all_positions_mask, bits("DM")]
+    )
+    np.testing.assert_array_equal(player_positions(df.drop(columns="Position")), [bits("ST (C)")] * 3)
+    assert player_positions(df.drop(columns=["Position", "Best Pos"])) is None
+
+
+def test_every_role_has_positions():
+    roles = {role for phase_roles in role_attributes.values() for role in phase_roles}
+    assert roles <= set(role_positions)
+    assert all(set(allowed) <= set(position_bits) for allowed in role_positions.values())
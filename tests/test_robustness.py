@@ -0,0 +1,51 @@
+import numpy as np
+
+from synthetic import synthetic_export
+
+import robustness
+from loading import player_positions
+from robustness import ATTRIBUTE_NOISE, column_weights, simulate_top_n
+from scoring import score_players
+
+
+def probability_matrix(role_scores, result):
+    # Probabilities for every player (role_scores order), 0 for players
+    # that were not simulated.
+    probabilities = np.where(np.isnan(role_scores["scores"]), np.nan, 0.0)
+    probabilities[result["rows"]] = result["probabilities"]
+    return probabilities
+
+
+def test_probabilities_sum_to_top_n(load_export):
+    df = load_export(synthetic_export(300, seed=5, masked=0.05))
+    role_scores = score_players(df, positions=player_positions(df))
+    linear = column_weights(role_scores)
+
+    for top_n in [1, 5]:
+        result = simulate_top_n(df, role_scores, linear, top_n=top_n, draws=200)
+        eligible_counts = (~np.isnan(role_scores["scores"])).sum(axis=0)
+        np.testing.assert_allclose(
+            np.nansum(result["probabilities"], axis=0), np.minimum(eligible_counts, top_n), rtol=1e-5
+        )
+
+
+def test_pruned_candidates_match_simulating_everyone(load_export, monkeypatch):
+    df = load_export(synthetic_export(300, seed=5, masked=0.05))
+    role_scores = score_players(df, positions=player_positions(df))
+    linear = column_weights(role_scores)
+    pruned = probability_matrix(role_scores, simulate_top_n(df, role_scores, linear, top_n=3, draws=4000))
+    rows, candidates = robustness.top_n_candidates(df, role_scores, linear, 3, ATTRIBUTE_NOISE)
+    simulated = np.zeros(role_scores["scores"].shape, dtype=bool)
+    simulated[rows] = candidates
+
+    def every_player(df, role_scores, linear, top_n, noise):
+        return np.arange(len(role_scores["rows"])), ~np.isnan(role_scores["scores"])
+
+    monkeypatch.setattr(robustness, "top_n_candidates", every_player)
+    full = probability_matrix(role_scores, simulate_top_n(df, role_scores, linear, top_n=3, draws=4000, seed=1))
+
+    # Pruned players never reach the top N, and the rest agree within
+    # sampling error (the standard error is at most 0.008 at 4,000 draws).
+    np.testing.assert_array_equal(np.isnan(pruned), np.isnan(full))
+    assert (full[~simulated & ~np.isnan(full)] == 0).all()
+    np.testing.assert_allclose(pruned, full, atol=0.05)
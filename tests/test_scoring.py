@@ -0,0 +1,127 @@
+import copy
+
+import numpy as np
+import pandas as pd
+
+from synthetic import synthetic_export
+
+from custom_roles import single_role_definitions, validate_role_definitions
+from loading import player_positions
+from roles import all_attributes, role_area_groups, role_attributes
+from scoring import (
+    build_role_index,
+    calculate_role_scores,
+    compile_role_weights,
+    highlight_row_max,
+    merge_role_columns,
+    role_ranks,
+    role_table,
+    score_matrix,
+    score_players,
+    score_role_columns,
+)
+
+
+def avg_attrs(df, attrs):
+    existing = [attr for attr in attrs if attr in df.columns]
+    if not existing:
+        return pd.Series(0, index=df.index)
+    return df[existing].mean(axis=1)
+
+
+def loop_role_scores(df):
+    # The original per-role loop that the matrix product replaced.
+    results = []
+    for phase, roles in role_attributes.items():
+        for role, attrs in roles.items():
+            key_score = avg_attrs(df, attrs["key"])
+            if attrs["preferred"]:
+                preferred_score = avg_attrs(df, attrs["preferred"])
+                score_series = (key_score * 0.8) + (preferred_score * 0.2)
+            else:
+                score_series = key_score
+            for player, score in zip(df["Name"], score_series.round(2)):
+                results.append({
+                    "Player": player,
+                    "Phase": phase,
+                    "Area": role_area_groups.get(role, "Midfield"),
+                    "Role": role,
+                    "Score": score,
+                })
+    return pd.DataFrame(results)
+
+
+def test_matrix_scores_match_per_role_loop(load_export):
+    df = load_export(synthetic_export(500, seed=1))
+    role_scores = calculate_role_scores(df)
+
+    expected = loop_role_scores(df)
+    expected_matrix = expected.pivot_table(
+        index="Player", columns=["Phase", "Role"], values="Score", sort=False
+    ).reindex(role_scores["players"])
+    columns = pd.MultiIndex.from_arrays([role_scores["phases"], role_scores["roles"]])
+
+    np.testing.assert_array_equal(
+        role_scores["scores"],
+        expected_matrix[columns].to_numpy(dtype=np.float32)
+    )
+    assert list(role_scores["areas"]) == list(expected.drop_duplicates(["Phase", "Role"])["Area"])
+
+
+def test_unscouted_player_scores_at_range_midpoint(load_export):
+    df = load_export(pd.DataFrame({"Name": ["Unscouted", "Scouted"], **{attr: ["-", "12-14"] for attr in all_attributes}}))
+    role_scores = score_players(df)
+    row = np.flatnonzero(role_scores["players"] == "Unscouted")[0]
+
+    assert (role_scores["scores"][row] == 10.5).all()
+    assert (role_scores["score_low"][row] == 1).all() and (role_scores["score_high"][row] == 20).all()
+    assert not np.isnan(role_scores["ranks"]).any()
+
+
+def test_merged_role_columns_match_full_rescore(load_export):
+    df = load_export(synthetic_export(1000, seed=6, masked=0.05))
+    positions = player_positions(df)
+    role_scores = score_players(df, positions=positions)
+    custom_roles = validate_role_definitions({
+        "In Possession": {
+            "Winger": {"key_weight": 0.6},
+            "Wide Creator": {"key": ["Cro", "Pas", "Vis"], "preferred": ["Dri"], "area": "Attacking", "positions": ["M (R)"]},
+        },
+    })
+
+    merged = merge_role_columns(role_scores, [
+        score_role_columns(df, role_scores, role_def) for role_def in single_role_definitions(custom_roles)
+    ])
+
+    definitions = copy.deepcopy(role_attributes)
+    for phase, roles in custom_roles.items():
+        definitions[phase].update(roles)
+    weights = compile_role_weights(definitions)
+    expected = {
+        "rows": role_scores["rows"],
+        "scores": score_matrix(df, weights, positions)[role_scores["rows"]].astype(np.float32),
+    }
+    expected.update(build_role_index(expected))
+    columns = np.arange(len(weights["roles"]))
+    expected_ranks = role_ranks(expected, columns=columns)
+
+    merged_columns = {(phase, role): col for col, (phase, role) in enumerate(zip(merged["phases"], merged["roles"]))}
+    order = [merged_columns[(phase, role)] for phase, role in zip(weights["phases"], weights["roles"])]
+    assert len(order) == len(merged["roles"])
+    np.testing.assert_array_equal(merged["scores"][:, order], expected["scores"])
+    np.testing.assert_array_equal(merged["ranks"][:, order], expected_ranks)
+    assert list(merged["areas"][order]) == weights["areas"]
+
+
+def test_highlighted_table_with_duplicate_names(load_export):
+    export = synthetic_export(60, seed=2)
+    export["Player"] = "John Smith"
+    role_scores = score_players(load_export(export))
+    columns = np.arange(len(role_scores["roles"]))
+    table = role_table(role_scores, columns, rows=np.arange(40))
+
+    styler = highlight_row_max(table)
+
+    assert "John Smith" in styler.to_html()
+    assert list(styler.data.columns) == ["Player"] + list(role_scores["roles"])
+    assert (styler.data["Player"] == "John Smith").all()
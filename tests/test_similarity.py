@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from synthetic import synthetic_export
+
+from loading import player_positions
+from scoring import score_players
+from similarity import build_similarity_index, similar_players, similarity_columns
+
+
+def brute_force(index, row, k, metric, columns):
+    features = index["features"].astype("float64")
+    if columns is not None:
+        features = features[:, columns]
+    query = features[row]
+    if metric == "cosine":
+        norms = np.linalg.norm(features, axis=1) * np.linalg.norm(query)
+        distances = 1 - features @ query / np.where(norms > 0, norms, np.nan)
+        distances = np.nan_to_num(distances, nan=1.0)
+    else:
+        distances = np.linalg.norm(features - query, axis=1)
+    distances[row] = np.inf
+    order = np.argsort(distances, kind="stable")[:k]
+    return order, distances[order]
+
+
+@pytest.mark.parametrize("metric", ["cosine", "euclidean"])
+@pytest.mark.parametrize("phase", ["All", "Out of Possession"])
+def test_blocked_search_matches_brute_force(metric, phase, load_export):
+    df = load_export(synthetic_export(1000, seed=11, masked=0.05))
+    role_scores = score_players(df, positions=player_positions(df))
+    index = build_similarity_index(df, role_scores)
+    columns = similarity_columns(role_scores, phase=phase)
+
+    for row in [0, 137, len(role_scores["rows"]) - 1]:
+        rows, distances = similar_players(index, row, k=10, metric=metric, columns=columns, block_rows=64)
+        expected_rows, expected_distances = brute_force(index, row, 10, metric, columns)
+
+        assert row not in rows
+        np.testing.assert_array_equal(rows, expected_rows)
+        np.testing.assert_allclose(distances, expected_distances, rtol=1e-4, atol=1e-4)
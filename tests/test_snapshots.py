@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+
+from synthetic import synthetic_export
+
+from loading import player_positions
+from scoring import score_players
+from snapshots import score_snapshot
+
+
+def test_reused_scores_match_full_rescore(load_export):
+    first = synthetic_export(1500, seed=4, masked=0.05)
+    # The next export drops 100 players, changes an attribute of 100 more
+    # and adds 100 new ones.
+    second = first.iloc[100:].copy()
+    second.iloc[:100, second.columns.get_loc("Passing")] = "20"
+    new_players = synthetic_export(100, seed=9, masked=0.05)
+    new_players["Player"] = [f"New {i}" for i in range(len(new_players))]
+    second = pd.concat([second, new_players], ignore_index=True)
+
+    previous_df = load_export(first)
+    previous = score_snapshot(previous_df, positions=player_positions(previous_df))
+    df = load_export(second)
+    positions = player_positions(df)
+    current = score_snapshot(df, previous, positions)
+    expected = score_players(df, positions=positions)
+
+    for key in ["scores", "ranks", "score_low", "score_high", "top_rows"]:
+        np.testing.assert_array_equal(current[key], expected[key])
+    unchanged = set(first["Player"].iloc[200:])
+    assert current["reused_count"] == df["Name"].isin(unchanged).sum()
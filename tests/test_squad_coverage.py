@@ -0,0 +1,32 @@
+import numpy as np
+
+from synthetic import synthetic_export
+
+from loading import player_positions
+from scoring import score_players
+from squad_coverage import area_coverage, build_coverage_index, role_coverage, visible_groups
+
+
+def test_coverage_matches_full_scan(load_export):
+    df = load_export(synthetic_export(2000, seed=3))
+    role_scores = score_players(df, positions=player_positions(df))
+    index = build_coverage_index(role_scores)
+    columns = np.arange(len(role_scores["roles"]))
+    scores = role_scores["scores"]
+    ranks = role_scores["ranks"]
+
+    for top_n in [1, 3, 10, 50]:
+        coverage = role_coverage(role_scores, columns, top_n, cover_score=12.0)
+        keys = np.where(np.isnan(scores), -np.inf, scores)
+        order = np.lexsort((role_scores["rows"][:, None].repeat(len(columns), axis=1), -keys), axis=0)
+
+        np.testing.assert_array_equal(coverage["First Score"], scores[order[0], columns])
+        np.testing.assert_array_equal(coverage["Second Score"], scores[order[1], columns])
+        np.testing.assert_array_equal(coverage[f"Within Top {top_n}"], (ranks <= top_n).sum(axis=0))
+        np.testing.assert_array_equal(coverage["Cover"], (scores >= 12.0).sum(axis=0))
+
+        groups = visible_groups(index)
+        areas = area_coverage(index, groups, coverage, top_n)
+        for group, players in zip(groups, areas[f"Players In A Top {top_n}"]):
+            group_columns = (role_scores["phases"] == index["phases"][group]) & (role_scores["areas"] == index["areas"][group])
+            assert players == (ranks[:, group_columns] <= top_n).any(axis=1).sum()
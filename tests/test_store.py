@@ -0,0 +1,97 @@
+import os
+
+import numpy as np
+import pytest
+
+from synthetic import synthetic_export, to_csv
+
+from loading import player_positions, upload_chunks
+from scoring import role_percentiles, score_players
+from store import (
+    open_store,
+    prune_stores,
+    score_store,
+    store_in_use,
+    store_percentiles,
+    store_ranks,
+    write_store,
+)
+
+
+def test_store_matches_in_memory_scores(tmp_path, load_export):
+    export = synthetic_export(3000, seed=2, masked=0.05)
+    csv_bytes = to_csv(export)
+    df = load_export(export)
+    role_scores = score_players(df, positions=player_positions(df))
+
+    # Small chunks and blocks so the merge across blocks is exercised.
+    store = write_store(upload_chunks(csv_bytes, "export.csv", chunk_rows=700), str(tmp_path))
+    summary = score_store(store, block_rows=500)
+    columns = np.arange(len(summary["roles"]))
+    scores = summary["scores"][role_scores["rows"]]
+
+    assert store["rows"] == len(df)
+    np.testing.assert_array_equal(scores, role_scores["scores"])
+    np.testing.assert_array_equal(store_ranks(summary, scores, columns), role_scores["ranks"])
+    np.testing.assert_array_equal(store_percentiles(summary, scores, columns), role_percentiles(role_scores))
+
+    top_k = len(summary["top_rows"])
+    expected_rows = role_scores["rows"][role_scores["top_rows"][:top_k]]
+    expected_scores = role_scores["scores"][role_scores["top_rows"][:top_k], columns]
+    scored = ~np.isnan(expected_scores)
+    np.testing.assert_array_equal(summary["top_rows"][scored], expected_rows[scored])
+    np.testing.assert_array_equal(summary["top_scores"], expected_scores)
+
+    # A store that is already converted and scored is reopened as is.
+    np.testing.assert_array_equal(score_store(open_store(str(tmp_path)))["scores"], summary["scores"])
+
+
+def fake_store(root, name, size, opened, complete=True):
+    directory = os.path.join(root, name)
+    os.makedirs(directory)
+    with open(os.path.join(directory, "attributes.f32"), "wb") as f:
+        f.write(b"\0" * size)
+    if complete:
+        meta_path = os.path.join(directory, "meta.json")
+        with open(meta_path, "w") as f:
+            f.write("{}")
+        os.utime(meta_path, (opened, opened))
+    return directory
+
+
+def test_prune_stores_deletes_least_recently_opened(tmp_path):
+    root = str(tmp_path)
+    oldest = fake_store(root, "oldest", 1000, opened=100)
+    older = fake_store(root, "older", 1000, opened=200)
+    current = fake_store(root, "current", 1000, opened=50)
+    writing = fake_store(root, "writing", 1000, opened=0, complete=False)
+
+    deleted = prune_stores(keep=current, max_bytes=2500, root=root)
+
+    assert deleted == [oldest, older]
+    assert os.path.exists(current) and os.path.exists(writing)
+
+
+def test_prune_stores_skips_stores_in_use(tmp_path):
+    root = str(tmp_path)
+    scoring = fake_store(root, "scoring", 1000, opened=100)
+    older = fake_store(root, "older", 1000, opened=200)
+
+    with store_in_use(scoring):
+        deleted = prune_stores(max_bytes=500, root=root)
+
+    assert deleted == [older]
+    assert os.path.exists(scoring)
+
+
+def test_failed_conversion_deletes_the_store(tmp_path):
+    csv_bytes = to_csv(synthetic_export(300, seed=3))
+    directory = str(tmp_path / "store")
+
+    def failing_chunks():
+        yield from upload_chunks(csv_bytes, "export.csv", chunk_rows=100)
+        raise ValueError("truncated upload")
+
+    with pytest.raises(ValueError):
+        write_store(failing_chunks(), directory)
+    assert not os.path.exists(directory)